@@ -1,32 +1,119 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
-from tools import query_neo4j_database, get_adverse_events, read_financial_report
+from tools import (
+    query_neo4j_database,
+    get_adverse_events,
+    get_adverse_event_statistics,
+    read_financial_report,
+)
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.message import add_messages
+from resources import get_llm
+from checkpointer import get_checkpointer
+from history import compact_history
+from token_ledger import (
+    LEDGER,
+    attribute,
+    current_component,
+    count_tokens,
+    message_tokens,
+)
+from context_budget import fit_to_budget
+from tracing import span, traced
 from typing import TypedDict, Annotated, List
-import operator
+from langchain_core.runnables import RunnableLambda
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import asyncio
+import contextvars
+import os
+import threading
+import time
+
+# Tool calls run on one pool shared by every session; size it for the
+# concurrent turns times the tool calls a turn makes
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "16"))
+
+# Seconds a tool may run before its call is answered with a timeout error,
+# counted from when the call starts running. TOOL_TIMEOUT_<TOOL NAME> (e.g.
+# TOOL_TIMEOUT_READ_FINANCIAL_REPORT) sets one tool; otherwise TOOL_TIMEOUT,
+# if set, applies to every tool, else the defaults below. The first PDF
+# call may have to ingest the whole data/ folder.
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))
+_DEFAULT_TOOL_TIMEOUTS = {
+    "query_neo4j_database": 45,
+    "get_adverse_events": 30,
+    "get_adverse_event_statistics": 30,
+    "read_financial_report": 120,
+}
+TOOL_TIMEOUTS = {
+    name: float(
+        os.getenv(f"TOOL_TIMEOUT_{name.upper()}")
+        or (TOOL_TIMEOUT if os.getenv("TOOL_TIMEOUT") else default)
+    )
+    for name, default in _DEFAULT_TOOL_TIMEOUTS.items()
+}
+
+# Relative share of the turn's context budget each tool's output gets when
+# the outputs don't all fit (see context_budget.allocate_budget)
+TOOL_PRIORITY = 1.0
+TOOL_PRIORITIES = {
+    "query_neo4j_database": 2.0,
+    "get_adverse_event_statistics": 2.0,
+    "get_adverse_events": 1.5,
+    "read_financial_report": 1.0,
+}
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
 
 
 def get_agent_executor():
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0)
-    tools = [query_neo4j_database, get_adverse_events, read_financial_report]
+    llm = get_llm()
+    tools = [
+        query_neo4j_database,
+        get_adverse_events,
+        get_adverse_event_statistics,
+        read_financial_report,
+    ]
 
     agent = create_agent(llm, tools)
+    tools_by_name = {t.name: t for t in tools}
+
+    async def run_agent(state):
+        return await aagent_node(state, agent, "agent")
+
+    async def run_tools(state):
+        return await atool_node(state, tools_by_name)
+
+    # Each node has a sync and an async implementation, so the graph works
+    # with invoke() as well as ainvoke()/astream_events()
     graph = StateGraph(AgentState)
-    graph.add_node("agent", lambda state: agent_node(state, agent, "agent"))
-    graph.add_node("tools", lambda state: tool_node(state, tools))
-    graph.set_entry_point("agent")
+    # Each turn starts by fitting the checkpointed history into its budget
+    graph.add_node("history", compact_history)
+    graph.add_node(
+        "agent",
+        RunnableLambda(lambda state: agent_node(state, agent, "agent"), run_agent),
+    )
+    graph.add_node(
+        "tools",
+        RunnableLambda(lambda state: tool_node(state, tools_by_name), run_tools),
+    )
+    graph.set_entry_point("history")
+    graph.add_edge("history", "agent")
     graph.add_conditional_edges("agent", should_continue)
     graph.add_edge("tools", "agent")
 
-    memory = MemorySaver()
-    agent_executor = graph.compile(checkpointer=memory)
+    # Conversations live in SQLite, size-capped and evicted when idle
+    agent_executor = graph.compile(checkpointer=get_checkpointer())
     return agent_executor
 
 
 class AgentState(TypedDict):
-    messages: Annotated[list, operator.add]
+    # The checkpointer keeps the conversation per thread_id, so each turn
+    # only sends its new HumanMessage. add_messages also lets the history
+    # node replace (by id) or remove messages.
+    messages: Annotated[list, add_messages]
+    summary: str  # Rolling summary of the exchanges folded out of messages
+    history_stats: dict  # Token counts of the last compaction
 
 
 def create_agent(llm, tools):
@@ -34,7 +121,7 @@ def create_agent(llm, tools):
         [
             (
                 "system",
-                "You are a helpful assistant. You have access to a set of tools. Use them to answer the user's questions accurately.",
+                "You are a helpful assistant. You have access to a set of tools. Use them to answer the user's questions accurately.{summary}",
             ),
             ("placeholder", "{messages}"),
         ]
@@ -42,22 +129,164 @@ def create_agent(llm, tools):
     return prompt | llm.bind_tools(tools)
 
 
+@traced("node.agent")
 def agent_node(state, agent, name):
-    result = agent.invoke(state)
+    result = agent.invoke(prompt_inputs(state))
     return {"messages": [result]}
 
 
-def tool_node(state, tools):
+@traced("node.agent")
+async def aagent_node(state, agent, name):
+    result = await agent.ainvoke(prompt_inputs(state))
+    return {"messages": [result]}
+
+
+def prompt_inputs(state):
+    summary = state.get("summary")
+    return {
+        "messages": state["messages"],
+        "summary": (
+            f"\n\nSummary of the earlier conversation:\n{summary}" if summary else ""
+        ),
+    }
+
+
+@traced("node.tools")
+def tool_node(state, tools_by_name):
+    """Run the last message's tool calls concurrently.
+
+    Results come back in tool-call order. A call that fails or runs past its
+    timeout gets an error ToolMessage of its own; the other calls are not
+    affected. A timed-out tool keeps running in the background, but its
+    result is dropped.
+
+    The timeout counts from when a worker picks the call up, so time spent
+    queued behind other sessions' tools doesn't use it up; a call still
+    waiting for a worker after its timeout is cancelled instead.
+    """
     tool_calls = state["messages"][-1].tool_calls
-    messages = []
-    for tool_call in tool_calls:
+    submitted = time.monotonic()
+    calls = [_submit_tool(tools_by_name, tool_call) for tool_call in tool_calls]
+
+    results = []
+    for tool_call, (future, running) in zip(tool_calls, calls):
         tool_name = tool_call["name"]
-        tool = {t.name: t for t in tools}[tool_name]
-        tool_output = tool.invoke(tool_call["args"])
+        timeout = TOOL_TIMEOUTS.get(tool_name, TOOL_TIMEOUT)
+        if not running.wait(max(0.0, submitted + timeout - time.monotonic())):
+            if future.cancel():
+                results.append(
+                    (
+                        f"Error: {tool_name} did not start within {timeout:g} "
+                        "seconds (all tool workers busy)",
+                        "error",
+                    )
+                )
+                continue
+            running.wait()  # A worker picked it up just now
+        try:
+            remaining = max(0.0, running.at + timeout - time.monotonic())
+            results.append(future.result(timeout=remaining))
+        except TimeoutError:
+            results.append(
+                (
+                    f"Error: {tool_name} did not finish within {timeout:g} seconds",
+                    "error",
+                )
+            )
+    return {"messages": tool_messages(state, tool_calls, results)}
+
+
+def _submit_tool(tools_by_name, tool_call):
+    """Queue one call on the tool pool. Returns ``(future, running)``;
+    ``running`` is set, with the start time in ``running.at``, once a
+    worker begins the call."""
+    running = threading.Event()
+
+    def run():
+        running.at = time.monotonic()
+        running.set()
+        return _run_tool(tools_by_name, tool_call)
+
+    # copy_context: each call keeps the caller's context variables
+    # (LangChain callbacks, tracing) inside the worker thread
+    return _tool_executor.submit(contextvars.copy_context().run, run), running
+
+
+def tool_messages(state, tool_calls, results):
+    """ToolMessages for ``results`` (``(content, status)`` per call), fitted
+    together into what is left of the context budget by tool priority."""
+    with span("tokens.fit_to_budget", outputs=len(results)):
+        used = sum(message_tokens(m) for m in state["messages"]) + count_tokens(
+            state.get("summary") or ""
+        )
+        contents = fit_to_budget(
+            [content for content, _ in results],
+            [TOOL_PRIORITIES.get(call["name"], TOOL_PRIORITY) for call in tool_calls],
+            used,
+        )
+    messages = []
+    for tool_call, content, (_, status) in zip(tool_calls, contents, results):
+        LEDGER.record_tool(tool_call["name"], content)
         messages.append(
-            ToolMessage(content=str(tool_output), tool_call_id=tool_call["id"])
+            ToolMessage(
+                content=content,
+                tool_call_id=tool_call["id"],
+                name=tool_call["name"],
+                status=status,
+            )
+        )
+    return messages
+
+
+def _run_tool(tools_by_name, tool_call):
+    """Invoke one tool call; returns ``(content, status)`` and never raises."""
+    tool = tools_by_name.get(tool_call["name"])
+    if tool is None:
+        return f"Error: unknown tool '{tool_call['name']}'", "error"
+    try:
+        # LLM calls inside the tool (Cypher generation) are booked to it
+        with attribute(component=tool_call["name"]), span(
+            f"tool.{tool_call['name']}"
+        ) as tool_span:
+            output = str(tool.invoke(tool_call["args"]))
+            tool_span.set("chars", len(output))
+            return output, "success"
+    except Exception as e:
+        return f"Error running {tool_call['name']}: {e}", "error"
+
+
+@traced("node.tools")
+async def atool_node(state, tools_by_name):
+    """Async tool_node: all calls are awaited together, with the same
+    ordering, timeouts and error isolation."""
+    tool_calls = state["messages"][-1].tool_calls
+    results = await asyncio.gather(
+        *(_arun_tool(tools_by_name, tool_call) for tool_call in tool_calls)
+    )
+    return {"messages": tool_messages(state, tool_calls, results)}
+
+
+async def _arun_tool(tools_by_name, tool_call):
+    tool = tools_by_name.get(tool_call["name"])
+    if tool is None:
+        return f"Error: unknown tool '{tool_call['name']}'", "error"
+    timeout = TOOL_TIMEOUTS.get(tool_call["name"], TOOL_TIMEOUT)
+    # gather() runs each call in its own task, so this only affects this call
+    current_component.set(tool_call["name"])
+    try:
+        with span(f"tool.{tool_call['name']}") as tool_span:
+            output = str(
+                await asyncio.wait_for(tool.ainvoke(tool_call["args"]), timeout)
+            )
+            tool_span.set("chars", len(output))
+        return output, "success"
+    except asyncio.TimeoutError:
+        return (
+            f"Error: {tool_call['name']} did not finish within {timeout:g} seconds",
+            "error",
         )
-    return {"messages": messages}
+    except Exception as e:
+        return f"Error running {tool_call['name']}: {e}", "error"
 
 
 def should_continue(state):
@@ -0,0 +1,389 @@
+"""Replay the TOP_10_PROMPTS.md prompts through the agent graph, offline.
+
+The LLM is a scripted chat model that issues recorded tool calls, Neo4j is
+an in-memory synthetic graph (neo4j_stub), openFDA is the local stub
+server (openfda_stub) and the PDF tool reads the bundled data/ folder, so
+what is measured is the agent's own overhead.
+
+Usage (from the repository root):
+    python src/benchmark.py                          # report
+    python src/benchmark.py --save-baseline bench.json
+    python src/benchmark.py --baseline bench.json    # compare; exit 1 on regression
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+PROMPTS_FILE = "TOP_10_PROMPTS.md"
+_PROMPT = re.compile(r'^## \d+\. \*\*"(.+)"\*\*', re.MULTILINE)
+
+MANUFACTURERS_QUERY = {
+    "query": "MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)<-[:REGISTERED]-(m:Manufacturer) WHERE toLower(d.name) CONTAINS $drug_term RETURN DISTINCT m.manufacturerName AS manufacturer, count(c) AS case_count ORDER BY case_count DESC LIMIT 10",
+    "params": {"drug_term": "tramadol"},
+}
+TOP_DRUGS_QUERY = {
+    "query": "MATCH (c:Case)-[:IS_PRIMARY_SUSPECT]->(d:Drug) RETURN d.name AS drug_name, count(c) AS case_count ORDER BY case_count DESC LIMIT 15",
+    "params": {},
+}
+
+# Tool calls the scripted model makes for each prompt (by number in
+# TOP_10_PROMPTS.md), and the Cypher it "generates" for Neo4j questions
+SCRIPT = {
+    1: [("get_adverse_events", {"drug_name": "TRAMADOL", "limit": 10})],
+    2: [("query_neo4j_database", {"query_description": "manufacturers of TRAMADOL"})],
+    3: [("read_financial_report", {"query": "revenue 2023"})],
+    4: [
+        (
+            "read_financial_report",
+            {"query": "Grünenthal is headquartered in Aachen, Germany"},
+        )
+    ],
+    5: [
+        ("query_neo4j_database", {"query_description": "manufacturers of TRAMADOL"}),
+        ("get_adverse_events", {"drug_name": "TRAMADOL", "limit": 10}),
+        ("read_financial_report", {"query": "TRAMADOL financial impact"}),
+    ],
+    6: [
+        (
+            "get_adverse_event_statistics",
+            {"drug_name": "IBUPROFEN", "statistic": "seriousness"},
+        )
+    ],
+    7: [
+        (
+            "query_neo4j_database",
+            {
+                "query_description": "Which drugs are most commonly associated with adverse events?"
+            },
+        )
+    ],
+    8: [("read_financial_report", {"query": "business segments"})],
+    9: [("get_adverse_events", {"drug_name": "METFORMIN", "limit": 10})],
+    10: [("read_financial_report", {"query": "revenue growth previous year"})],
+}
+CYPHER = {
+    "manufacturers of TRAMADOL": MANUFACTURERS_QUERY,
+    "Which drugs are most commonly associated with adverse events?": TOP_DRUGS_QUERY,
+}
+
+
+def load_prompts(path: str = PROMPTS_FILE) -> list:
+    with open(path, encoding="utf-8") as f:
+        return _PROMPT.findall(f.read())
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replays SCRIPT instead of calling an LLM.
+
+    Agent calls get the prompt's recorded tool calls, then an answer built
+    from the tool outputs; Cypher generation gets the recorded query and
+    history summarization a short summary. ``latency`` seconds are added to
+    every call to stand in for the model (0 measures only the agent).
+    """
+
+    prompts: dict
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _reply(self, messages):
+        last = messages[-1]
+        text = str(last.content)
+        if "Response format: Provide ONLY a JSON object" in text:
+            question = re.search(r"^Question: (.*)$", text, re.MULTILINE).group(1)
+            return AIMessage(content=json.dumps(CYPHER.get(question, TOP_DRUGS_QUERY)))
+        if "running summary of a conversation" in text:
+            return AIMessage(
+                content="The user asked about drugs and the annual report."
+            )
+        if isinstance(last, HumanMessage):
+            calls = SCRIPT.get(self.prompts.get(text), [])
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": name, "args": args, "id": uuid.uuid4().hex}
+                    for name, args in calls
+                ],
+            )
+        outputs = [m for m in messages if isinstance(m, ToolMessage)][-3:]
+        return AIMessage(
+            content="Based on the tools: "
+            + " ".join(str(m.content)[:300] for m in outputs)
+        )
+
+
+class TimingCallback(BaseCallbackHandler):
+    """Collects run durations of graph nodes and tools, in milliseconds."""
+
+    run_inline = True
+
+    def __init__(self, nodes):
+        self.nodes = set(nodes)
+        self.timings = {"nodes": {}, "tools": {}}
+        self._started = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        if name in self.nodes and (metadata or {}).get("langgraph_node") == name:
+            self._started[run_id] = ("nodes", name, time.perf_counter())
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        self._started[run_id] = ("tools", name, time.perf_counter())
+
+    def _end(self, run_id):
+        started = self._started.pop(run_id, None)
+        if started:
+            kind, name, at = started
+            elapsed = (time.perf_counter() - at) * 1000
+            self.timings[kind].setdefault(name, []).append(elapsed)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "n": 1}
+    cuts = statistics.quantiles(values, n=20, method="inclusive")
+    return {"p50": statistics.median(values), "p95": cuts[18], "n": len(values)}
+
+
+def setup(workdir: str, llm_latency: float, neo4j_latency: float):
+    """Point every backend at a local stand-in; returns ``(graph, prompts)``.
+
+    Must run before the agent modules are imported, since they read their
+    configuration at import time.
+    """
+    from openfda_stub import start_stub
+
+    server, _ = start_stub()
+    os.environ.update(
+        {
+            "OPENFDA_BACKEND": "api",
+            "OPENFDA_BASE_URL": f"http://127.0.0.1:{server.server_port}",
+            "OPENFDA_CACHE_PATH": "",
+            "CYPHER_CACHE_PATH": "",
+            "PDF_STORE_PATH": os.path.join(workdir, "pdf_store.sqlite"),
+            "PDF_VECTOR_DIR": os.path.join(workdir, "pdf_vectors"),
+            "CHECKPOINT_PATH": os.path.join(workdir, "checkpoints.sqlite"),
+        }
+    )
+
+    import resources
+    import tools
+    from neo4j_stub import StubDriver
+    from token_ledger import LEDGER_CALLBACK
+
+    prompts = load_prompts()
+    resources._llms[(resources.DEFAULT_MODEL, 0.0)] = ScriptedChatModel(
+        prompts={prompt: i for i, prompt in enumerate(prompts, 1)},
+        latency=llm_latency,
+        callbacks=[LEDGER_CALLBACK],
+    )
+    tools.get_session = StubDriver(latency=neo4j_latency).session
+    return resources.get_agent_graph(), prompts
+
+
+def run_turn(graph, prompt: str, callback=None):
+    """One prompt on a fresh thread; returns ``(milliseconds, tokens)``."""
+    from token_ledger import LEDGER, attribute
+
+    thread_id = uuid.uuid4().hex
+    config = {"configurable": {"thread_id": thread_id}}
+    if callback:
+        config["callbacks"] = [callback]
+    started = time.perf_counter()
+    with attribute(session=thread_id):
+        asyncio.run(graph.ainvoke({"messages": [HumanMessage(content=prompt)]}, config))
+    elapsed = (time.perf_counter() - started) * 1000
+    totals = LEDGER.totals(thread_id)
+    LEDGER.forget(thread_id)
+    return elapsed, totals["prompt"] + totals["completion"]
+
+
+def run_benchmark(graph, prompts: list, repeat: int) -> dict:
+    """Latency pass (``repeat`` rounds after a warm-up round), then one
+    tracemalloc pass for allocation peaks, kept separate because tracing
+    slows everything down."""
+    callback = TimingCallback(["history", "agent", "tools"])
+    turns, tokens = [], []
+    for prompt in prompts:  # Warm-up: PDF ingestion, first connections
+        run_turn(graph, prompt)
+    for _ in range(repeat):
+        for prompt in prompts:
+            elapsed, used = run_turn(graph, prompt, callback)
+            turns.append(elapsed)
+            tokens.append(used)
+
+    peaks = []
+    tracemalloc.start()
+    for prompt in prompts:
+        tracemalloc.reset_peak()
+        run_turn(graph, prompt)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+    tracemalloc.stop()
+
+    return {
+        "turn_ms": percentiles(turns),
+        "nodes_ms": {
+            name: percentiles(values)
+            for name, values in sorted(callback.timings["nodes"].items())
+        },
+        "tools_ms": {
+            name: percentiles(values)
+            for name, values in sorted(callback.timings["tools"].items())
+        },
+        "tokens_per_turn": percentiles(tokens),
+        "peak_kib": percentiles(peaks),
+    }
+
+
+def flatten(report: dict) -> dict:
+    """``{"nodes_ms.agent.p95": value, ...}`` for every percentile."""
+    flat = {}
+    for section, value in report.items():
+        if "p50" in value:
+            flat.update({f"{section}.{p}": value[p] for p in ("p50", "p95")})
+        else:
+            for name, stats in value.items():
+                flat.update({f"{section}.{name}.{p}": stats[p] for p in ("p50", "p95")})
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float, floor: float) -> list:
+    """Lines comparing ``report`` to ``baseline``; ``REGRESSION`` marks a
+    metric more than ``tolerance`` (and ``floor`` in absolute terms) worse."""
+    current, previous = flatten(report), flatten(baseline)
+    lines = []
+    for key in sorted(current.keys() & previous.keys()):
+        now, before = current[key], previous[key]
+        change = (now - before) / before if before else 0.0
+        regressed = change > tolerance and now - before > floor
+        lines.append(
+            f"{'REGRESSION' if regressed else 'ok':<11}{key:<48}"
+            f"{before:>10.1f} -> {now:>10.1f}  ({change:+.0%})"
+        )
+    return lines
+
+
+def print_report(report: dict):
+    def row(name, stats, unit):
+        print(
+            f"  {name:<32}p50 {stats['p50']:>9.1f} {unit:<4}"
+            f"p95 {stats['p95']:>9.1f} {unit:<4}n={stats['n']}"
+        )
+
+    print("Turn latency")
+    row("turn", report["turn_ms"], "ms")
+    print("Graph nodes")
+    for name, stats in report["nodes_ms"].items():
+        row(name, stats, "ms")
+    print("Tools")
+    for name, stats in report["tools_ms"].items():
+        row(name, stats, "ms")
+    print("Tokens and memory")
+    row("tokens per turn", report["tokens_per_turn"], "tok")
+    row("allocation peak per turn", report["peak_kib"], "KiB")
+
+    from intent_router import ROUTER_STATS
+
+    router = ROUTER_STATS.stats()
+    if router["questions"]:
+        print("Query router")
+        print(
+            f"  {router['hit_rate']:.0%} of {router['questions']} Neo4j questions "
+            "without LLM Cypher generation ("
+            + ", ".join(
+                f"{path} {count}" for path, count in sorted(router["paths"].items())
+            )
+            + f"), about {router['saved_seconds'] * 1000:.0f} ms saved"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds of all prompts")
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=0.0,
+        help="Seconds added to each scripted LLM call",
+    )
+    parser.add_argument(
+        "--neo4j-latency",
+        type=float,
+        default=0.005,
+        help="Seconds added to each stub Neo4j query",
+    )
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="Write this run's report here")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative slowdown reported as a regression",
+    )
+    parser.add_argument(
+        "--floor",
+        type=float,
+        default=1.0,
+        help="Absolute difference (ms, tokens or KiB) below which changes are noise",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agent-benchmark-") as workdir:
+        graph, prompts = setup(workdir, args.llm_latency, args.neo4j_latency)
+        print(f"{len(prompts)} prompts x {args.repeat} rounds\n")
+        report = run_benchmark(graph, prompts, args.repeat)
+        print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines = compare(report, baseline, args.tolerance, args.floor)
+        print(f"\nCompared with {args.baseline}")
+        print("\n".join(lines))
+        if any(line.startswith("REGRESSION") for line in lines):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
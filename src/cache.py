@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_refresh_executor = None
+_refresh_lock = threading.Lock()
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _refresh_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="cache-refresh"
+                )
+    return _refresh_executor
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and an optional SQLite tier.
+
+    Values must be JSON-serializable when a ``path`` is given, since entries
+    are written through to disk so they survive restarts and can be shared
+    between processes.
+
+    With ``stale_ttl`` set, an expired entry is still served for that many
+    seconds while ``get(..., refresh=loader)`` replaces it in the background
+    (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 3600,
+        path: str = None,
+        stale_ttl: float = 0,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self._refreshing = set()
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str, default=None, refresh=None):
+        """Return the value for ``key``, or ``default`` if absent or expired.
+
+        ``refresh`` is a zero-argument loader used to replace a stale entry
+        in the background; the stale value is returned meanwhile.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if self._db is not None:
+                # Another process may have stored a fresher copy
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if (
+                    row
+                    and row[1] + self.stale_ttl > now
+                    and (entry is None or row[1] > entry[0])
+                ):
+                    entry = (row[1], json.loads(row[0]))
+                    self._remember(key, *entry)
+                    if entry[0] > now:
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return entry[1]
+
+            if entry is not None and entry[0] + self.stale_ttl > now:
+                self.hits += 1
+                self.stale_hits += 1
+                if refresh is not None and key not in self._refreshing:
+                    self._refreshing.add(key)
+                    self.refreshes += 1
+                    _get_refresh_executor().submit(self._refresh, key, refresh)
+                return entry[1]
+
+            self._data.pop(key, None)
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                self._writes += 1
+                # Prune expired rows now and then so the file doesn't grow forever
+                if self._writes % 100 == 0:
+                    self._db.execute(
+                        "DELETE FROM cache WHERE expires_at <= ?",
+                        (time.time() - self.stale_ttl,),
+                    )
+                self._db.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+    def _refresh(self, key, loader):
+        try:
+            self.set(key, loader())
+        except Exception:
+            pass  # Keep serving the stale value until it runs out
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _remember(self, key, expires_at, value):
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
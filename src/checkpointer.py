@@ -0,0 +1,434 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+# Conversations are checkpointed here instead of in process memory, so a
+# long-running server only holds SQLite's page cache ("" = in-memory DB)
+CHECKPOINT_PATH = os.getenv(
+    "CHECKPOINT_PATH", os.path.join("cache", "checkpoints.sqlite")
+)
+# Checkpoints kept per conversation (the latest is always kept); older
+# ones are only needed to rewind, which the app never does
+MAX_CHECKPOINTS = int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "5"))
+# Compressed bytes kept per conversation before older checkpoints go
+MAX_THREAD_BYTES = int(os.getenv("CHECKPOINT_MAX_THREAD_BYTES", str(1024 * 1024)))
+# Conversations untouched for this many seconds are deleted (0 = never)
+THREAD_TTL = float(os.getenv("CHECKPOINT_THREAD_TTL", str(24 * 3600)))
+# Seconds between background compactions (0 = no background job)
+COMPACT_INTERVAL = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL", "600"))
+
+COMPRESSION_LEVEL = 6
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer that keeps conversations in a SQLite file.
+
+    Each checkpoint is stored whole (messages included) with the graph's
+    serializer and zlib-compressed. Writing a checkpoint prunes the
+    conversation's older ones beyond ``max_checkpoints`` or
+    ``max_thread_bytes``; ``compact()`` (run periodically on a background
+    thread) also deletes conversations idle for ``thread_ttl`` seconds and
+    returns the freed pages to the file system.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_PATH,
+        max_checkpoints: int = MAX_CHECKPOINTS,
+        max_thread_bytes: int = MAX_THREAD_BYTES,
+        thread_ttl: float = THREAD_TTL,
+        compact_interval: float = COMPACT_INTERVAL,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.max_checkpoints = max(1, max_checkpoints)
+        self.max_thread_bytes = max_thread_bytes
+        self.thread_ttl = thread_ttl
+        self.counters = dict.fromkeys(
+            ("pruned_checkpoints", "evicted_threads", "deleted_threads", "compactions"),
+            0,
+        )
+        self.last_compaction = None
+        self._lock = threading.Lock()
+
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(
+            path or ":memory:", check_same_thread=False, timeout=10
+        )
+        # Must be set before the first table exists to take effect
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, "
+            "checkpoint_id TEXT NOT NULL, parent_checkpoint_id TEXT, "
+            "type TEXT NOT NULL, checkpoint BLOB NOT NULL, "
+            "metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, "
+            "size INTEGER NOT NULL, raw_size INTEGER NOT NULL, "
+            "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS writes ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, "
+            "checkpoint_id TEXT NOT NULL, task_id TEXT NOT NULL, "
+            "idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT NOT NULL, "
+            "value BLOB NOT NULL, task_path TEXT NOT NULL, "
+            "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS threads ("
+            "thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS threads_last_used ON threads (last_used)"
+        )
+        self._db.commit()
+
+        if compact_interval > 0:
+            threading.Thread(
+                target=self._compact_forever,
+                args=(compact_interval,),
+                name="checkpoint-compaction",
+                daemon=True,
+            ).start()
+
+    # Serialization
+
+    def _dumps(self, value):
+        """``(type, compressed bytes, uncompressed size)``"""
+        type_, data = self.serde.dumps_typed(value)
+        return type_, zlib.compress(data, COMPRESSION_LEVEL), len(data)
+
+    def _loads(self, type_, blob):
+        return self.serde.loads_typed((type_, zlib.decompress(blob)))
+
+    # BaseCheckpointSaver
+
+    def get_tuple(self, config):
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._db.execute(query, params).fetchone()
+        return self._tuple(row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config:
+            configurable = config["configurable"]
+            clauses.append("thread_id = ?")
+            params.append(configurable["thread_id"])
+            if "checkpoint_ns" in configurable:
+                clauses.append("checkpoint_ns = ?")
+                params.append(configurable["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self._loads(row[6], row[7])
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield self._tuple(row)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        type_, blob, raw_size = self._dumps(checkpoint)
+        metadata_type, metadata_blob, metadata_raw_size = self._dumps(
+            get_checkpoint_metadata(config, metadata)
+        )
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, "
+                "checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                "metadata_type, metadata, size, raw_size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    configurable.get("checkpoint_id"),
+                    type_,
+                    blob,
+                    metadata_type,
+                    metadata_blob,
+                    len(blob) + len(metadata_blob),
+                    raw_size + metadata_raw_size,
+                ),
+            )
+            self._touch(thread_id)
+            self._prune(thread_id)
+            self._db.commit()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        configurable = config["configurable"]
+        key = (
+            configurable["thread_id"],
+            configurable.get("checkpoint_ns", ""),
+            configurable["checkpoint_id"],
+        )
+        # Special writes (errors, interrupts...) replace earlier ones; a
+        # task's regular writes are only stored once
+        replace, keep = [], []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            type_, blob, _ = self._dumps(value)
+            row = (*key, task_id, idx, channel, type_, blob, task_path)
+            (replace if idx < 0 else keep).append(row)
+        columns = (
+            "INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, "
+            "channel, type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        with self._lock:
+            self._db.executemany(f"INSERT OR REPLACE {columns}", replace)
+            self._db.executemany(f"INSERT OR IGNORE {columns}", keep)
+            self._db.commit()
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            self._delete_threads([thread_id])
+            self._db.commit()
+            self.counters["deleted_threads"] += 1
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # Size limits
+
+    def compact(self) -> dict:
+        """Delete idle conversations, re-apply the per-thread caps and
+        shrink the file. Returns what was removed."""
+        before = dict(self.counters)
+        with self._lock:
+            if self.thread_ttl > 0:
+                idle = [
+                    row[0]
+                    for row in self._db.execute(
+                        "SELECT thread_id FROM threads WHERE last_used < ?",
+                        (time.time() - self.thread_ttl,),
+                    )
+                ]
+                self._delete_threads(idle)
+                self.counters["evicted_threads"] += len(idle)
+            for (thread_id,) in self._db.execute(
+                "SELECT DISTINCT thread_id FROM checkpoints"
+            ).fetchall():
+                self._prune(thread_id)
+            self._db.commit()
+            # executescript steps the pragma to completion (one page per step)
+            self._db.executescript("PRAGMA incremental_vacuum;")
+            if self.path:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.counters["compactions"] += 1
+            self.last_compaction = time.time()
+        return {
+            key: self.counters[key] - before[key]
+            for key in ("pruned_checkpoints", "evicted_threads")
+        }
+
+    def _compact_forever(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.compact()
+            except sqlite3.Error:
+                pass  # e.g. the file is busy; try again next interval
+
+    def _touch(self, thread_id: str):
+        self._db.execute(
+            "INSERT INTO threads (thread_id, last_used) VALUES (?, ?) "
+            "ON CONFLICT (thread_id) DO UPDATE SET last_used = excluded.last_used",
+            (thread_id, time.time()),
+        )
+
+    def _prune(self, thread_id: str):
+        """Drop a thread's checkpoints (and their writes) beyond the caps,
+        oldest first, keeping the latest of each namespace."""
+        rows = self._db.execute(
+            "SELECT checkpoint_ns, checkpoint_id, size FROM checkpoints "
+            "WHERE thread_id = ? ORDER BY checkpoint_id DESC",
+            (thread_id,),
+        ).fetchall()
+        namespaces, kept, total, drop = set(), 0, 0, []
+        for checkpoint_ns, checkpoint_id, size in rows:
+            if checkpoint_ns not in namespaces:
+                namespaces.add(checkpoint_ns)
+            elif drop or (
+                kept >= self.max_checkpoints or total + size > self.max_thread_bytes
+            ):
+                drop.append((thread_id, checkpoint_ns, checkpoint_id))
+                continue
+            kept += 1
+            total += size
+        for table in ("checkpoints", "writes"):
+            self._db.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id = ?",
+                drop,
+            )
+        self.counters["pruned_checkpoints"] += len(drop)
+
+    def _delete_threads(self, thread_ids: list):
+        for table in ("checkpoints", "writes", "threads"):
+            self._db.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ?",
+                [(thread_id,) for thread_id in thread_ids],
+            )
+
+    def _tuple(self, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id = row[:4]
+        with self._lock:
+            writes = self._db.execute(
+                "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchall()
+        writes.sort(key=lambda write: writes_sort_key(write[5], write[0], write[1]))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self._loads(row[4], row[5]),
+            metadata=self._loads(row[6], row[7]),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self._loads(type_, value))
+                for task_id, _, channel, type_, value, _ in writes
+            ],
+        )
+
+    # Usage
+
+    def stats(self) -> dict:
+        """Stored conversations and their memory/disk footprint."""
+        with self._lock:
+            threads, checkpoints, stored, raw = self._db.execute(
+                "SELECT COUNT(DISTINCT thread_id), COUNT(*), "
+                "COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM checkpoints"
+            ).fetchone()
+            writes = self._db.execute("SELECT COUNT(*) FROM writes").fetchone()[0]
+            page_size = self._db.execute("PRAGMA page_size").fetchone()[0]
+            free_pages = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+        disk = 0
+        for suffix in ("", "-wal"):
+            if self.path and os.path.exists(self.path + suffix):
+                disk += os.path.getsize(self.path + suffix)
+        return {
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "writes": writes,
+            "stored_bytes": stored,
+            "raw_bytes": raw,
+            "compression_ratio": raw / stored if stored else 0.0,
+            "disk_bytes": disk,
+            "free_bytes": free_pages * page_size,
+            "process_rss_bytes": _process_rss(),
+            "last_compaction": self.last_compaction,
+            **self.counters,
+        }
+
+
+def _process_rss():
+    """Resident memory of this process in bytes, or None off Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> SqliteCheckpointSaver:
+    """Return the process-wide checkpointer, opening the database on first use."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SqliteCheckpointSaver()
+    return _checkpointer
@@ -0,0 +1,103 @@
+import os
+from token_ledger import ENCODING_MODEL, get_encoding, count_tokens
+
+# Prompt tokens one agent call may use in total: conversation, summary and
+# this turn's tool outputs. Tool outputs share what the conversation leaves,
+# minus ANSWER_RESERVE_TOKENS kept free for the model's answer.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+ANSWER_RESERVE_TOKENS = int(os.getenv("ANSWER_RESERVE_TOKENS", "1000"))
+# Every tool output keeps at least this many tokens, whatever the budget
+MIN_TOOL_OUTPUT_TOKENS = int(os.getenv("MIN_TOOL_OUTPUT_TOKENS", "200"))
+# Upper bound a tool applies to its own output before the turn's budget
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "4000"))
+
+# A cut may move back to the last record (blank line) or line boundary as
+# long as it keeps at least this share of the tokens allowed
+BOUNDARY_MIN_SHARE = 0.5
+
+
+def _marker(original: int, kept: int) -> str:
+    return f"\n\n[TRUNCATED - Original response was {original} tokens, truncated to {kept} tokens]"
+
+
+def _boundary(text: str, minimum: int) -> int:
+    """Character offset to cut ``text`` at: after its last blank line, else
+    its last line break, provided that is at or beyond ``minimum``."""
+    for separator in ("\n\n", "\n"):
+        position = text.rfind(separator)
+        if position >= minimum:
+            return position
+    return len(text)
+
+
+def truncate_text(text: str, max_tokens: int, model: str = ENCODING_MODEL) -> str:
+    """Cut ``text`` to at most ``max_tokens`` tokens, marker included.
+
+    The text is encoded once; the cut is placed on a token boundary and
+    moved back to the end of the last whole record or line that fits, so
+    no result row or event is split. Without a tokenizer the same is done
+    on the 4-characters-per-token estimate.
+    """
+    text = str(text)
+    encoding = get_encoding(model)
+    if encoding is None:
+        original = len(text) // 4
+        if original <= max_tokens:
+            return text
+        keep = max(0, max_tokens - count_tokens(_marker(original, max_tokens)))
+        head = text[: keep * 4]
+        head = head[: _boundary(head, int(len(head) * BOUNDARY_MIN_SHARE))]
+        return head + _marker(original, len(head) // 4)
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(_marker(len(tokens), max_tokens)))
+    head, offsets = encoding.decode_with_offsets(tokens[:keep])
+    cut = _boundary(head, len(head) * BOUNDARY_MIN_SHARE)
+    # Keep the tokens that end at or before the cut
+    kept = keep
+    while kept and offsets[kept - 1] >= cut:
+        kept -= 1
+    return encoding.decode(tokens[:kept]) + _marker(len(tokens), kept)
+
+
+def allocate_budget(sizes: list, priorities: list, available: int) -> list:
+    """Split ``available`` tokens across outputs of ``sizes`` tokens.
+
+    Shares are proportional to ``priorities``. An output smaller than its
+    share keeps all of it and the rest is shared again among the others,
+    so nothing is cut while the budget covers everything. Each output gets
+    at least MIN_TOOL_OUTPUT_TOKENS (or its full size, if smaller).
+    """
+    limits = [None] * len(sizes)
+    pending = list(range(len(sizes)))
+    remaining = max(0, available)
+    while pending:
+        weight = sum(priorities[i] for i in pending)
+        fits = [i for i in pending if sizes[i] <= remaining * priorities[i] / weight]
+        if not fits:
+            for i in pending:
+                share = int(remaining * priorities[i] / weight)
+                limits[i] = min(sizes[i], max(share, MIN_TOOL_OUTPUT_TOKENS))
+            break
+        for i in fits:
+            limits[i] = sizes[i]
+            remaining -= sizes[i]
+            pending.remove(i)
+    return limits
+
+
+def fit_to_budget(contents: list, priorities: list, used: int) -> list:
+    """Truncate one turn's tool outputs to what is left of the context.
+
+    ``used`` is the number of tokens already in the prompt (conversation
+    and summary). Returns the outputs, truncated where needed.
+    """
+    available = CONTEXT_TOKEN_BUDGET - ANSWER_RESERVE_TOKENS - used
+    sizes = [count_tokens(content) for content in contents]
+    limits = allocate_budget(sizes, priorities, available)
+    return [
+        content if limit >= size else truncate_text(content, limit)
+        for content, size, limit in zip(contents, sizes, limits)
+    ]
@@ -0,0 +1,291 @@
+import json
+import re
+from entities import KNOWN_DRUGS, KNOWN_MANUFACTURERS
+
+# Every query here is fixed text; values travel separately as $parameters so
+# Neo4j can reuse one cached plan for all drugs instead of planning each string.
+
+ALL_SUSPECT_RELS = "IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT"
+SUSPECT_RELS = "IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT"
+
+TOP_PRIMARY_SUSPECTS = "MATCH (c:Case)-[:IS_PRIMARY_SUSPECT]->(d:Drug) RETURN d.name as drug_name, count(c) as cases ORDER BY cases DESC LIMIT 15"
+
+DRUG_MANUFACTURERS = f"MATCH (d:Drug {{name: $drug_name}})<-[:{ALL_SUSPECT_RELS}]-(c:Case)<-[:REGISTERED]-(m:Manufacturer) RETURN DISTINCT m.manufacturerName as manufacturer, count(c) as case_count ORDER BY case_count DESC LIMIT 10"
+
+MANUFACTURER_DRUGS = f"MATCH (d:Drug)<-[:{ALL_SUSPECT_RELS}]-(c:Case)<-[:REGISTERED]-(m:Manufacturer {{manufacturerName: $manufacturer_name}}) RETURN DISTINCT d.name as drug_name, count(c) as case_count ORDER BY case_count DESC LIMIT 10"
+
+TOP_MANUFACTURERS = "MATCH (m:Manufacturer)-[:REGISTERED]->(c:Case) RETURN m.manufacturerName as manufacturer, count(c) as total_cases ORDER BY total_cases DESC LIMIT 10"
+
+DRUG_REACTIONS = f"MATCH (d:Drug)<-[:{SUSPECT_RELS}]-(c:Case)-[:HAS_REACTION]->(r:Reaction) WHERE toLower(d.name) CONTAINS $drug_term RETURN r.description as reaction, count(c) as case_count ORDER BY case_count DESC LIMIT 15"
+
+TOP_REACTIONS = "MATCH (c:Case)-[:HAS_REACTION]->(r:Reaction) RETURN r.description as reaction, count(c) as cases ORDER BY cases DESC LIMIT 15"
+
+DRUG_AGE_GROUPS = f"MATCH (d:Drug {{name: $drug_name}})<-[:{ALL_SUSPECT_RELS}]-(c:Case)-[:FALLS_UNDER]->(a:AgeGroup) RETURN a.ageGroup as age_group, count(c) as case_count ORDER BY case_count DESC"
+
+DRUG_OUTCOMES = f"MATCH (d:Drug {{name: $drug_name}})<-[:{ALL_SUSPECT_RELS}]-(c:Case)-[:RESULTED_IN]->(o:Outcome) RETURN o.outcome as outcome, count(c) as case_count ORDER BY case_count DESC"
+
+TOP_AGE_GROUPS = "MATCH (c:Case)-[:FALLS_UNDER]->(a:AgeGroup) RETURN a.ageGroup as age_group, count(c) as cases ORDER BY cases DESC LIMIT 10"
+
+SAMPLE_DRUGS = "MATCH (d:Drug) RETURN d.name as drug_name LIMIT 10"
+
+_STRING_LITERAL = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"")
+
+
+def _mentioned(question: str, names: list, min_length: int = 0):
+    """Return the first word of ``question`` that is one of ``names``."""
+    for word in question.split():
+        clean_word = word.strip(".,?!:;").upper()
+        if len(clean_word) > min_length and clean_word in names:
+            return clean_word
+    return None
+
+
+TEMPLATES = {
+    "top_primary_suspects": TOP_PRIMARY_SUSPECTS,
+    "drug_manufacturers": DRUG_MANUFACTURERS,
+    "manufacturer_drugs": MANUFACTURER_DRUGS,
+    "top_manufacturers": TOP_MANUFACTURERS,
+    "drug_reactions": DRUG_REACTIONS,
+    "top_reactions": TOP_REACTIONS,
+    "drug_age_groups": DRUG_AGE_GROUPS,
+    "drug_outcomes": DRUG_OUTCOMES,
+    "top_age_groups": TOP_AGE_GROUPS,
+    "sample_drugs": SAMPLE_DRUGS,
+}
+
+
+def classify_question(question: str):
+    """Map ``question`` to one of the TEMPLATES by keyword.
+
+    Returns an ``(intent, params)`` tuple; always picks something, so callers
+    that need precision should check the question further.
+    """
+    query_lower = question.lower()
+
+    if "most" in query_lower and "suspect" in query_lower:
+        return "top_primary_suspects", {}
+    elif (
+        "manufacturer" in query_lower
+        or "company" in query_lower
+        or "companies" in query_lower
+    ):
+        name = _mentioned(question, KNOWN_DRUGS + KNOWN_MANUFACTURERS, min_length=3)
+        if name in KNOWN_MANUFACTURERS:
+            return "manufacturer_drugs", {"manufacturer_name": name}
+        elif name:
+            return "drug_manufacturers", {"drug_name": name}
+        return "top_manufacturers", {}
+    elif (
+        "reaction" in query_lower
+        or "adverse" in query_lower
+        or "side effect" in query_lower
+    ):
+        drug = _mentioned(question, KNOWN_DRUGS, min_length=3)
+        if drug:
+            return "drug_reactions", {"drug_term": drug.lower()}
+        return "top_reactions", {}
+    elif any(word in query_lower for word in ["age group", "outcome", "demographic"]):
+        drug = _mentioned(question, KNOWN_DRUGS)
+        if drug and "age" in query_lower:
+            return "drug_age_groups", {"drug_name": drug}
+        elif drug and "outcome" in query_lower:
+            return "drug_outcomes", {"drug_name": drug}
+        return "top_age_groups", {}
+    else:
+        return "sample_drugs", {}
+
+
+def build_fallback_query(question: str):
+    """Pick a template for ``question`` without the LLM.
+
+    Returns a ``(query, params)`` tuple.
+    """
+    intent, params = classify_question(question)
+    return TEMPLATES[intent], params
+
+
+def parse_generated_query(text: str):
+    """Parse the LLM's reply into ``(query, params)``.
+
+    The prompt asks for ``{"query": ..., "params": {...}}``; a bare Cypher
+    string (optionally in a markdown fence) is accepted as well.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.split("\n")
+        text = "\n".join(lines[1:-1]).strip()
+    for prefix in ("json", "cypher"):
+        if text.startswith(prefix):
+            text = text[len(prefix) :].strip()
+
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict) and "query" in parsed:
+            return parsed["query"].strip(), dict(parsed.get("params") or {})
+    except ValueError:
+        pass
+    return text, {}
+
+
+def parameterize_literals(query: str, params: dict):
+    """Move string literals in ``query`` into ``params``.
+
+    Keeps generated queries in the same shape as the templates so they hit
+    Neo4j's plan cache no matter which drug the question was about.
+    """
+    params = dict(params)
+    by_value = {value: key for key, value in params.items() if isinstance(value, str)}
+
+    def replace(match):
+        raw = match.group(1) if match.group(1) is not None else match.group(2)
+        value = re.sub(r"\\(.)", r"\1", raw)
+        key = by_value.get(value)
+        if key is None:
+            key = f"p{len(params)}"
+            while key in params:
+                key += "_"
+            params[key] = value
+            by_value[value] = key
+        return f"${key}"
+
+    return _STRING_LITERAL.sub(replace, query), params
+
+
+FULLTEXT_INDEX = "drug_name_fulltext"
+
+_CONTAINS_FILTER = re.compile(r"toLower\((\w+)\.name\)\s+CONTAINS\s+\$(\w+)")
+# Terms the index can look up without missing any CONTAINS match: one word,
+# so every match lies inside a single indexed token
+_SINGLE_WORD = re.compile(r"\w+")
+
+
+def lucene_query(term: str):
+    """Build a fulltext query for drug names containing ``term``, or None.
+
+    A single word becomes an infix wildcard query ("codone" finds
+    "HYDROCODONE" and "OXYCODONE HCL"), which matches every name that
+    CONTAINS it. Anything else (several words, punctuation) could match
+    across tokens the index splits apart, so it returns None.
+    """
+    term = term.strip().lower()
+    if not _SINGLE_WORD.fullmatch(term):
+        return None
+    return f"*{term}*"
+
+
+# Clause keywords, to find where the first MATCH's WHERE ends
+_CLAUSE = re.compile(
+    r"\b(?:OPTIONAL\s+MATCH|MATCH|WHERE|WITH|RETURN|UNWIND|CALL|ORDER\s+BY|SKIP|"
+    r"LIMIT|UNION|CREATE|MERGE|SET|DELETE|DETACH|REMOVE|FOREACH)\b",
+    re.IGNORECASE,
+)
+
+
+def _mask_nested(query: str) -> str:
+    """``query`` with string literals and everything inside brackets blanked
+    out, so keyword searches only see the top level. Positions are kept."""
+    masked = []
+    depth = 0
+    quote = None
+    escaped = False
+    for char in query:
+        if quote:
+            masked.append(" ")
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+            masked.append(" ")
+        elif char in "([{":
+            masked.append(" " if depth else char)
+            depth += 1
+        elif char in ")]}":
+            depth = max(0, depth - 1)
+            masked.append(" " if depth else char)
+        else:
+            masked.append(" " if depth else char)
+    return "".join(masked)
+
+
+def _seedable_filter(query: str):
+    """The ``(variable, parameter)`` of a drug-name CONTAINS filter that every
+    result row must pass, or None.
+
+    That is the case only when ``toLower(d.name) CONTAINS $x`` is a plain
+    top-level AND conjunct of the first MATCH's WHERE, ``d`` is a Drug of
+    that MATCH, and no other conjunct mentions ``d``. Under NOT, inside OR,
+    or next to other conditions on ``d``, seeding ``d`` from the index
+    could drop rows.
+    """
+    masked = _mask_nested(query)
+    clauses = list(_CLAUSE.finditer(masked))
+    if (
+        len(clauses) < 2
+        or clauses[0].start() != 0
+        or clauses[0].group().upper() != "MATCH"
+        or clauses[1].group().upper() != "WHERE"
+    ):
+        return None
+    where_start = clauses[1].end()
+    where_end = clauses[2].start() if len(clauses) > 2 else len(query)
+    if re.search(r"\b(?:OR|XOR)\b", masked[where_start:where_end], re.IGNORECASE):
+        return None
+
+    conjuncts = []
+    position = where_start
+    for separator in re.finditer(
+        r"\bAND\b", masked[where_start:where_end], re.IGNORECASE
+    ):
+        conjuncts.append(query[position : where_start + separator.start()].strip())
+        position = where_start + separator.end()
+    conjuncts.append(query[position:where_end].strip())
+
+    matches = [_CONTAINS_FILTER.fullmatch(conjunct) for conjunct in conjuncts]
+    if sum(1 for match in matches if match) != 1:
+        return None
+    match = next(match for match in matches if match)
+    variable = match.group(1)
+    if f"({variable}:Drug" not in query[: clauses[1].start()]:
+        return None
+    if any(
+        re.search(rf"\b{variable}\b", conjunct)
+        for conjunct, other in zip(conjuncts, matches)
+        if other is None
+    ):
+        return None
+    return match.groups()
+
+
+def use_fulltext_index(query: str, params: dict):
+    """Seed a ``toLower(d.name) CONTAINS $x`` query from the drug-name fulltext index.
+
+    The Drug variable is bound by ``db.index.fulltext.queryNodes`` before the
+    first MATCH, so the planner starts from a handful of index hits instead of
+    scanning every Drug. The index hits are a superset of the CONTAINS
+    matches and the original predicate is kept, so results are unchanged.
+    Queries where the filter doesn't bind every row (see ``_seedable_filter``),
+    or whose term ``lucene_query`` can't express, are returned unchanged.
+    """
+    stripped = query.strip()
+    if "CALL" in stripped.upper() or "UNION" in stripped.upper():
+        return query, params
+    seedable = _seedable_filter(stripped)
+    if seedable is None or not isinstance(params.get(seedable[1]), str):
+        return query, params
+
+    variable, term_param = seedable
+    fulltext_query = lucene_query(params[term_param])
+    if fulltext_query is None:
+        return query, params
+    params = dict(params)
+    params["fulltext_index"] = FULLTEXT_INDEX
+    params["fulltext_query"] = fulltext_query
+    query = (
+        "CALL db.index.fulltext.queryNodes($fulltext_index, $fulltext_query) "
+        f"YIELD node AS {variable}\n{stripped}"
+    )
+    return query, params
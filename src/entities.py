@@ -0,0 +1,59 @@
+import re
+
+# Drug names the tools know how to filter on explicitly
+KNOWN_DRUGS = [
+    "TRAMADOL",
+    "ASPIRIN",
+    "IBUPROFEN",
+    "METFORMIN",
+    "REVLIMID",
+    "CUVITRU",
+]
+
+KNOWN_MANUFACTURERS = ["PFIZER", "ROCHE", "NOVARTIS"]
+
+# Salt forms and spellings that refer to the same drug as a known name
+DRUG_ALIASES = {
+    "tramadol hydrochloride": "TRAMADOL",
+    "tramadol hcl": "TRAMADOL",
+    "acetylsalicylic acid": "ASPIRIN",
+    "metformin hydrochloride": "METFORMIN",
+    "metformin hcl": "METFORMIN",
+}
+
+# Comparison operators change what a question asks ("age > 65" vs
+# "age < 65"), so they are kept, spaced out like words
+_PUNCTUATION = re.compile(r"[^\w\s<>=!\u2264\u2265\u2260]|!(?!=)")
+_COMPARISON = re.compile(r"[<>!=]=|<>|[<>=\u2264\u2265\u2260]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def find_drug(text: str):
+    """Return the first known drug mentioned in ``text`` (canonical name) or None."""
+    text_lower = text.lower()
+    for alias, drug in DRUG_ALIASES.items():
+        if alias in text_lower:
+            return drug
+    for drug in KNOWN_DRUGS:
+        if drug.lower() in text_lower:
+            return drug
+    return None
+
+
+def normalize_question(text: str) -> str:
+    """Fold case, punctuation and whitespace and canonicalize drug names.
+
+    "Manufacturers of Tramadol HCl?" and "manufacturers of  TRAMADOL" both
+    normalize to "manufacturers of TRAMADOL". Digits and comparison
+    operators are kept: "age>65?" becomes "age > 65".
+    """
+    text = _PUNCTUATION.sub(" ", text.lower())
+    text = _COMPARISON.sub(r" \g<0> ", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    for alias, drug in DRUG_ALIASES.items():
+        text = re.sub(rf"\b{re.escape(alias)}\b", drug.lower(), text)
+    words = [
+        word.upper() if word.upper() in KNOWN_DRUGS else word
+        for word in text.split(" ")
+    ]
+    return " ".join(words)
@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from evaluation import evaluate_response
+from token_ledger import attribute
+
+# Share of answers that get evaluated (0 turns evaluation off)
+SAMPLE_RATE = float(os.getenv("EVAL_SAMPLE_RATE", "1.0"))
+# Up to EVAL_BATCH_SIZE queued answers are evaluated together; the worker
+# waits up to EVAL_BATCH_WAIT seconds for a batch to fill
+BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "4"))
+BATCH_WAIT = float(os.getenv("EVAL_BATCH_WAIT", "2"))
+# Evaluator LLM calls per minute, shared by all sessions
+RATE_LIMIT = float(os.getenv("EVAL_RATE_LIMIT", "10"))
+# Answers waiting beyond this are dropped rather than queued
+QUEUE_SIZE = int(os.getenv("EVAL_QUEUE_SIZE", "100"))
+RESULTS_PATH = os.getenv(
+    "EVAL_RESULTS_PATH", os.path.join("cache", "evaluations.sqlite")
+)
+# Optional JSONL copy of every finished evaluation, e.g. for offline analysis
+JSONL_PATH = os.getenv("EVAL_JSONL_PATH", "")
+# Pending evaluations older than this (seconds) were left by a process that
+# stopped; younger ones may belong to another process sharing the file
+STALE_AFTER = float(os.getenv("EVAL_STALE_AFTER", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` acquisitions per minute, bursts up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate / 60.0
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EvaluationQueue:
+    """Evaluates answers on a background worker, off the request path.
+
+    ``submit`` records a pending evaluation and returns immediately. The
+    worker collects batches, evaluates each batch's answers concurrently
+    within the rate limit, and stores the results in SQLite (and JSONL, if
+    configured) with their ``thread_id``. ``get`` and ``for_thread`` read
+    them back, so the UI can show each score once it is ready.
+    """
+
+    def __init__(
+        self,
+        path: str = RESULTS_PATH,
+        sample_rate: float = SAMPLE_RATE,
+        batch_size: int = BATCH_SIZE,
+        batch_wait: float = BATCH_WAIT,
+        rate_limit: float = RATE_LIMIT,
+        queue_size: int = QUEUE_SIZE,
+        jsonl_path: str = JSONL_PATH,
+        stale_after: float = STALE_AFTER,
+        evaluate=evaluate_response,
+    ):
+        self.sample_rate = sample_rate
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.jsonl_path = jsonl_path
+        self.evaluate = evaluate
+        self.stats = dict.fromkeys(
+            ("submitted", "sampled_out", "dropped", "completed", "failed"), 0
+        )
+        self._limiter = RateLimiter(rate_limit, burst=self.batch_size)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.batch_size, thread_name_prefix="evaluation"
+        )
+        self._lock = threading.Lock()
+
+        if jsonl_path and os.path.dirname(jsonl_path):
+            os.makedirs(os.path.dirname(jsonl_path), exist_ok=True)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS evaluations ("
+            "id TEXT PRIMARY KEY, thread_id TEXT NOT NULL, query TEXT NOT NULL, "
+            "response TEXT NOT NULL, status TEXT NOT NULL, result TEXT, "
+            "created_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS evaluations_thread "
+            "ON evaluations (thread_id, created_at)"
+        )
+        # Evaluations left pending by a stopped process will never finish
+        self._db.execute(
+            "UPDATE evaluations SET status = 'dropped' "
+            "WHERE status = 'pending' AND created_at < ?",
+            (time.time() - stale_after,),
+        )
+        self._db.commit()
+
+        self._worker = threading.Thread(
+            target=self._run, name="evaluation-queue", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, thread_id: str, query: str, response: str):
+        """Queue ``response`` to ``query`` for evaluation.
+
+        Returns the evaluation id, or None when the answer was not sampled
+        or the queue is full.
+        """
+        with self._lock:
+            self.stats["submitted"] += 1
+            if random.random() >= self.sample_rate:
+                self.stats["sampled_out"] += 1
+                return None
+        evaluation_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO evaluations (id, thread_id, query, response, status, "
+                "created_at) VALUES (?, ?, ?, ?, 'pending', ?)",
+                (evaluation_id, thread_id, query, response, time.time()),
+            )
+            self._db.commit()
+        try:
+            self._queue.put_nowait((evaluation_id, thread_id, query, response))
+        except queue.Full:
+            self._finish(evaluation_id, "dropped", None)
+            with self._lock:
+                self.stats["dropped"] += 1
+            return None
+        return evaluation_id
+
+    def get(self, evaluation_id: str):
+        """``{"status": ..., "result": ...}`` for one evaluation, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, result FROM evaluations WHERE id = ?",
+                (evaluation_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "result": json.loads(row[1]) if row[1] else None}
+
+    def for_thread(self, thread_id: str) -> list:
+        """All evaluations of a conversation, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, query, status, result, created_at, finished_at "
+                "FROM evaluations WHERE thread_id = ? ORDER BY created_at",
+                (thread_id,),
+            ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "query": row[1],
+                "status": row[2],
+                "result": json.loads(row[3]) if row[3] else None,
+                "created_at": row[4],
+                "finished_at": row[5],
+            }
+            for row in rows
+        ]
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                self._run_batch(self._next_batch())
+            except Exception:
+                # Keep the worker alive for the next batch
+                logger.exception("Evaluation batch failed")
+
+    def _run_batch(self, batch: list):
+        futures = []
+        for evaluation_id, *item in batch:
+            try:
+                self._limiter.acquire()
+                futures.append(self._executor.submit(self._evaluate, *item))
+            except Exception as e:
+                futures.append(None)
+                self._fail(evaluation_id, e)
+        for (evaluation_id, *_), future in zip(batch, futures):
+            if future is None:
+                continue
+            try:
+                result, error = future.result()
+                if error is None:
+                    self._finish(evaluation_id, "done", result)
+                else:
+                    self._finish(evaluation_id, "failed", {"error": error})
+                with self._lock:
+                    self.stats["completed" if error is None else "failed"] += 1
+            except Exception as e:
+                self._fail(evaluation_id, e)
+
+    def _fail(self, evaluation_id, error: Exception):
+        """Mark an evaluation failed after an unexpected error; never raises."""
+        logger.exception("Evaluation %s failed", evaluation_id)
+        with self._lock:
+            self.stats["failed"] += 1
+        try:
+            self._finish(evaluation_id, "failed", {"error": str(error)})
+        except Exception:
+            logger.exception("Could not record evaluation %s", evaluation_id)
+
+    def _evaluate(self, thread_id, query, response):
+        """Returns ``(result, error)``; never raises."""
+        try:
+            # Evaluator tokens are booked to the conversation they score
+            with attribute(session=thread_id):
+                return self.evaluate(query, response), None
+        except Exception as e:
+            return None, str(e)
+
+    def _finish(self, evaluation_id, status, result):
+        finished_at = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE evaluations SET status = ?, result = ?, finished_at = ? "
+                "WHERE id = ?",
+                (status, json.dumps(result, default=str), finished_at, evaluation_id),
+            )
+            self._db.commit()
+            row = self._db.execute(
+                "SELECT thread_id, query, response, created_at FROM evaluations "
+                "WHERE id = ?",
+                (evaluation_id,),
+            ).fetchone()
+        if self.jsonl_path and row and status != "dropped":
+            record = {
+                "id": evaluation_id,
+                "thread_id": row[0],
+                "query": row[1],
+                "response": row[2],
+                "status": status,
+                "result": result,
+                "created_at": row[3],
+                "finished_at": finished_at,
+            }
+            with self._lock, open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_evaluation_queue() -> EvaluationQueue:
+    """Return the process-wide evaluation queue, starting it on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = EvaluationQueue()
+    return _queue
@@ -0,0 +1,137 @@
+import os
+from langchain_core.messages import HumanMessage, RemoveMessage, ToolMessage
+from resources import get_llm
+from token_ledger import count_tokens, message_tokens
+from context_budget import truncate_text
+from tracing import traced
+
+# Token budget for the conversation sent to the model each turn (messages
+# plus the rolling summary). Over budget, the oldest exchanges are folded
+# into the summary, never the last HISTORY_KEEP_EXCHANGES.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+HISTORY_KEEP_EXCHANGES = int(os.getenv("HISTORY_KEEP_EXCHANGES", "3"))
+# Tool outputs from earlier turns are cut down to about this many tokens
+HISTORY_TOOL_MESSAGE_TOKENS = int(os.getenv("HISTORY_TOOL_MESSAGE_TOKENS", "300"))
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a user and an assistant that answers questions about drugs, adverse events and financial reports.
+
+Current summary:
+{summary}
+
+Messages to fold into it:
+{transcript}
+
+Write the updated summary in at most 200 words. Keep drug names, figures, findings and any open questions; drop pleasantries."""
+
+
+def split_exchanges(messages: list) -> list:
+    """Group messages into exchanges, each starting at a HumanMessage.
+
+    Removing whole exchanges keeps every AIMessage's tool calls together
+    with their ToolMessages.
+    """
+    exchanges = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(message)
+    return exchanges
+
+
+def trim_tool_message(message: ToolMessage, max_tokens: int) -> ToolMessage:
+    """A copy of ``message`` (same id, so it replaces it) cut to ``max_tokens``."""
+    return ToolMessage(
+        content=truncate_text(message.content, max_tokens),
+        tool_call_id=message.tool_call_id,
+        name=message.name,
+        status=message.status,
+        id=message.id,
+    )
+
+
+def transcript(messages: list) -> str:
+    lines = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            lines.append(f"Tool {message.name or ''} returned: {message.content}")
+        elif message.content:
+            lines.append(f"{message.type.capitalize()}: {message.content}")
+    return "\n".join(lines)
+
+
+def summarize(summary: str, messages: list) -> str:
+    """Fold ``messages`` into ``summary`` with the LLM; falls back to a
+    plain excerpt so a failed call never loses the history outright."""
+    text = transcript(messages)
+    try:
+        response = get_llm().invoke(
+            SUMMARY_PROMPT.format(summary=summary or "(none yet)", transcript=text)
+        )
+        updated = str(response.content).strip()
+        if updated:
+            return updated
+    except Exception:
+        pass
+    excerpt = "\n".join(
+        line[:200] for line in text.split("\n") if not line.startswith("Tool ")
+    )
+    return f"{summary}\n{excerpt}".strip()
+
+
+@traced("node.history")
+def compact_history(
+    state,
+    budget: int = HISTORY_TOKEN_BUDGET,
+    keep_exchanges: int = HISTORY_KEEP_EXCHANGES,
+    tool_message_tokens: int = HISTORY_TOOL_MESSAGE_TOKENS,
+) -> dict:
+    """Graph node run at the start of every turn.
+
+    1. Tool outputs from earlier turns above ``tool_message_tokens`` are
+       trimmed (the answers built from them are still there).
+    2. While the history is over ``budget``, the oldest exchanges beyond
+       the last ``keep_exchanges`` are folded into the rolling summary.
+
+    Returns the state update, including ``history_stats`` with the tokens
+    the turn would have sent without compaction and the tokens it sends.
+    """
+    messages = state["messages"]
+    summary = state.get("summary", "")
+    before = sum(message_tokens(m) for m in messages) + count_tokens(summary)
+
+    exchanges = split_exchanges(messages)
+    updates = []
+
+    # The current exchange (just the new question) is never touched
+    for exchange in exchanges[:-1]:
+        for i, message in enumerate(exchange):
+            if (
+                isinstance(message, ToolMessage)
+                and message_tokens(message) > tool_message_tokens
+            ):
+                exchange[i] = trim_tool_message(message, tool_message_tokens)
+                updates.append(exchange[i])
+
+    def total():
+        return sum(message_tokens(m) for e in exchanges for m in e) + count_tokens(
+            summary
+        )
+
+    folded = []
+    while total() > budget and len(exchanges) > keep_exchanges:
+        folded.extend(exchanges.pop(0))
+    if folded:
+        summary = summarize(summary, folded)
+        updates.extend(RemoveMessage(id=message.id) for message in folded)
+
+    after = total()
+    return {
+        "messages": updates,
+        "summary": summary,
+        "history_stats": {
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": max(0, before - after),
+            "messages_folded": len(folded),
+        },
+    }
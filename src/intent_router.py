@@ -0,0 +1,195 @@
+"""Answer known Neo4j question shapes without asking the LLM for Cypher.
+
+``route_question`` classifies a question onto one of the cypher_templates
+intents, extracts its drug or manufacturer, and scores how sure that is.
+Questions scoring at least ROUTER_MIN_CONFIDENCE are answered from the
+parameterized template (or the precomputed summaries); the rest go to LLM
+Cypher generation as before. ``ROUTER_STATS`` counts how often each path
+is taken and how much LLM time the template answers saved.
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from cypher_templates import TEMPLATES, classify_question
+from entities import KNOWN_DRUGS, KNOWN_MANUFACTURERS, normalize_question
+
+ENABLED = os.getenv("INTENT_ROUTER", "1").lower() not in ("0", "false", "no")
+# Questions scoring at least this are answered without the LLM. Any one
+# issue below drops the score under the default.
+MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.8"))
+
+# Score multipliers for what makes a template answer doubtful
+PENALTIES = {
+    # The question has conditions the template can't express
+    "qualifier": 0.2,
+    # It asks for a different kind of thing than the template lists
+    "target": 0.3,
+    # It names something (a drug, a population...) that wasn't recognized,
+    # so the template would answer a broader question
+    "unknown_entity": 0.3,
+    # It names more than one known drug or manufacturer, or one the
+    # template has no parameter for
+    "extra_entity": 0.3,
+    # A corpus-wide list for a question that doesn't ask for a ranking
+    "no_ranking": 0.5,
+}
+
+# Qualifiers the templates can't express (dates, severity, sex, counts of a
+# specific subset...)
+_UNSUPPORTED_QUALIFIERS = re.compile(
+    r"\b(\d+|how many|count|number of|serious|fatal|death|died|hospitali[sz]\w*|"
+    r"male|female|men|women|gender|sex|year|month|since|before|after|between|"
+    r"during|report(?:ed)? by|source|therapy|interact\w*|concomitant|"
+    r"secondary|not|without|except|excluding|other than|besides|apart from|"
+    r"compare\w*|versus|vs|per|ratio|average)\b"
+)
+
+# What each intent's answer is a list of; the question must ask for the same thing
+INTENT_TARGETS = {
+    "top_primary_suspects": "drugs",
+    "drug_manufacturers": "manufacturers",
+    "manufacturer_drugs": "drugs",
+    "top_manufacturers": "manufacturers",
+    "drug_reactions": "reactions",
+    "top_reactions": "reactions",
+    "drug_age_groups": "age_groups",
+    "drug_outcomes": "outcomes",
+    "top_age_groups": "age_groups",
+}
+
+_TARGET_PATTERNS = {
+    "drugs": r"\b(?:drugs?|medications?|medicines?)\b",
+    "manufacturers": r"\b(?:manufacturers?|compan(?:y|ies))\b",
+    "reactions": r"\b(?:reactions?|side effects?|adverse events?)\b",
+    "age_groups": r"\b(?:age groups?|ages?)\b",
+    "outcomes": r"\boutcomes?\b",
+}
+
+_RANKING_WORDS = re.compile(
+    r"\b(?:most|top|common\w*|frequent\w*|highest|largest|biggest|leading)\b"
+)
+
+# "... of Kisqali", "... for Ozempic": an entity the templates don't know about
+_UNKNOWN_ENTITY = re.compile(
+    r"\b(?:of|for|to|with|by|from|containing|in)\s+"
+    r"(?!(?:the|all|a|an|any|each|every|cases?|reports?|adverse|events?|drugs?|"
+    r"patients?|database|fda|faers)\b)([a-z]\w*)"
+)
+
+
+def _asked_for(question: str):
+    """Which kind of entity ``question`` asks for: the earliest one it mentions."""
+    earliest = None
+    for target, pattern in _TARGET_PATTERNS.items():
+        match = re.search(pattern, question)
+        if match and (earliest is None or match.start() < earliest[0]):
+            earliest = (match.start(), target)
+    return earliest[1] if earliest else None
+
+
+def _named_entities(question: str) -> set:
+    """Known drugs and manufacturers ``question`` names, upper-cased."""
+    known = set(KNOWN_DRUGS) | set(KNOWN_MANUFACTURERS)
+    return {word.upper() for word in question.split() if word.upper() in known}
+
+
+def route_question(question: str):
+    """Classify ``question`` for the templates.
+
+    Returns ``(intent, params, confidence, issues)``: the template intent,
+    its parameters, a score between 0 and 1 and the names of the PENALTIES
+    that applied. Drug spellings and salt forms are canonicalized first, so
+    "Tramadol HCl" and "TRAMADOL" get the same parameters.
+    """
+    normalized = normalize_question(question)
+    question_lower = normalized.lower()
+    intent, params = classify_question(normalized)
+    if intent not in INTENT_TARGETS:
+        # The catch-all sample query is never an answer
+        return intent, params, 0.0, ("no_intent",)
+
+    issues = []
+    if _UNSUPPORTED_QUALIFIERS.search(question_lower):
+        issues.append("qualifier")
+    if _asked_for(question_lower) != INTENT_TARGETS[intent]:
+        issues.append("target")
+    known = {str(value).lower() for value in params.values()}
+    if any(
+        match.group(1) not in known
+        for match in _UNKNOWN_ENTITY.finditer(question_lower)
+    ):
+        issues.append("unknown_entity")
+    named = _named_entities(normalized)
+    if len(named) > 1 or named - {str(value).upper() for value in params.values()}:
+        issues.append("extra_entity")
+    if not params and not _RANKING_WORDS.search(question_lower):
+        issues.append("no_ranking")
+
+    confidence = 1.0
+    for issue in issues:
+        confidence *= PENALTIES[issue]
+    return intent, params, confidence, tuple(issues)
+
+
+def template_for(question: str):
+    """``(intent, query, params)`` when ``question`` can skip the LLM, else None."""
+    if not ENABLED:
+        return None
+    intent, params, confidence, _ = route_question(question)
+    if confidence < MIN_CONFIDENCE:
+        return None
+    return intent, TEMPLATES[intent], params
+
+
+class RouterStats:
+    """How Neo4j questions were answered, and the LLM time the router saved.
+
+    Each question is counted once under the path that answered it:
+    ``summary`` or ``template`` (no LLM), ``cache`` (a reused generated
+    query) or ``llm``. Savings are estimated from the average duration of
+    the LLM Cypher generations this process has made (``record_llm``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.paths = Counter()
+        self.intents = Counter()  # intent -> questions answered without the LLM
+        self.empty_templates = 0  # confident routes whose template found nothing
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+    def record(self, path: str, intent: str = None):
+        with self._lock:
+            self.paths[path] += 1
+            if path in ("summary", "template"):
+                self.intents[intent] += 1
+
+    def record_empty_template(self):
+        with self._lock:
+            self.empty_templates += 1
+
+    def record_llm(self, seconds: float):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.paths.values())
+            routed = self.paths["summary"] + self.paths["template"]
+            average = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+            return {
+                "questions": total,
+                "paths": dict(self.paths),
+                "intents": dict(self.intents),
+                "hit_rate": routed / total if total else 0.0,
+                "empty_templates": self.empty_templates,
+                "llm_calls": self.llm_calls,
+                "average_llm_seconds": average,
+                "saved_seconds": routed * average,
+            }
+
+
+ROUTER_STATS = RouterStats()
@@ -0,0 +1,181 @@
+"""Measure the API server's throughput at N concurrent sessions.
+
+Each session is one conversation that sends the TOP_10_PROMPTS.md prompts
+in turn over streamed /v1/chat requests. By default the server runs in
+this process on the same offline stand-ins as benchmark.py (scripted LLM,
+stub Neo4j and openFDA), so what is measured is the server and the agent,
+not the model.
+
+Usage (from the repository root):
+    python src/load_test.py                            # 1, 4 and 16 sessions
+    python src/load_test.py --sessions 1 8 32 --turns 20 --workers 8
+    python src/load_test.py --url http://127.0.0.1:8080   # a running server
+
+A running server sees every session as one client unless it was started
+with SERVER_TRUST_CLIENT_ID=1 (or --trust-client-id).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from benchmark import load_prompts, percentiles
+
+
+def chat(host: str, port: int, client: str, thread_id: str, message: str):
+    """One streamed turn. Returns ``(status, seconds, seconds to first event)``."""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection(host, port, timeout=300)
+    try:
+        connection.request(
+            "POST",
+            "/v1/chat",
+            body=json.dumps(
+                {"message": message, "thread_id": thread_id, "stream": True}
+            ),
+            headers={"Content-Type": "application/json", "X-Client-Id": client},
+        )
+        response = connection.getresponse()
+        if response.status != 200:
+            response.read()
+            return response.status, time.perf_counter() - started, None
+        first_event = None
+        status = 200
+        for line in response:
+            if first_event is None:
+                first_event = time.perf_counter() - started
+            if json.loads(line).get("event") == "error":
+                status = 500
+        return status, time.perf_counter() - started, first_event
+    finally:
+        connection.close()
+
+
+def run_session(host, port, prompts, turns):
+    client = thread_id = uuid.uuid4().hex
+    return [
+        chat(host, port, client, thread_id, prompts[turn % len(prompts)])
+        for turn in range(turns)
+    ]
+
+
+def run_level(host: str, port: int, prompts: list, sessions: int, turns: int) -> dict:
+    """Run ``sessions`` conversations at once, ``turns`` turns each."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        results = [
+            result
+            for session in executor.map(
+                lambda _: run_session(host, port, prompts, turns), range(sessions)
+            )
+            for result in session
+        ]
+    elapsed = time.perf_counter() - started
+    ok = [result for result in results if result[0] == 200]
+    return {
+        "sessions": sessions,
+        "turns": len(ok),
+        "rejected": sum(1 for result in results if result[0] in (409, 429, 503)),
+        "errors": sum(1 for result in results if result[0] not in (200, 409, 429, 503)),
+        "turns_per_second": len(ok) / elapsed,
+        "latency_ms": percentiles([result[1] * 1000 for result in ok] or [0.0]),
+        "first_event_ms": percentiles(
+            [result[2] * 1000 for result in ok if result[2] is not None] or [0.0]
+        ),
+    }
+
+
+def print_report(levels: list):
+    print(
+        f"{'Sessions':>8}{'Turns':>7}{'Rejected':>10}{'Errors':>8}{'Turns/s':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p50 first event ms':>20}"
+    )
+    for level in levels:
+        print(
+            f"{level['sessions']:>8}{level['turns']:>7}{level['rejected']:>10}"
+            f"{level['errors']:>8}{level['turns_per_second']:>9.2f}"
+            f"{level['latency_ms']['p50']:>9.0f}{level['latency_ms']['p95']:>9.0f}"
+            f"{level['first_event_ms']['p50']:>20.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16],
+        help="Concurrent sessions to measure, one run each",
+    )
+    parser.add_argument("--turns", type=int, default=10, help="Turns per session")
+    parser.add_argument("--url", help="Test a running server instead of one in-process")
+    parser.add_argument(
+        "--workers", type=int, help="Worker slots of the in-process server"
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=0.2,
+        help="Seconds added to each scripted LLM call (in-process server)",
+    )
+    parser.add_argument(
+        "--neo4j-latency",
+        type=float,
+        default=0.005,
+        help="Seconds added to each stub Neo4j query (in-process server)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agent-load-test-") as workdir:
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+            prompts = load_prompts()
+        else:
+            from benchmark import setup
+
+            # Keep evaluations (which need the real LLM) and traces out of
+            # the working tree
+            os.environ.update(
+                {
+                    "EVAL_SAMPLE_RATE": "0",
+                    "EVAL_RESULTS_PATH": os.path.join(workdir, "evaluations.sqlite"),
+                    "TRACE_PATH": os.path.join(workdir, "traces.jsonl"),
+                }
+            )
+            graph, prompts = setup(workdir, args.llm_latency, args.neo4j_latency)
+            # Imported after setup(), which configures the agent modules
+            from server import Admission, AgentServer, start_in_thread
+
+            admission = Admission(
+                **({"workers": args.workers} if args.workers else {}),
+                # Sessions send one turn at a time, so none is refused for
+                # being busy; the load test measures queueing instead
+                queue_size=max(args.sessions),
+            )
+            host = "127.0.0.1"
+            # Every session connects from 127.0.0.1, so tell them apart by
+            # their X-Client-Id
+            port = start_in_thread(
+                AgentServer(graph, admission, trust_client_id=True), host
+            )
+            print(f"In-process server with {admission.workers} workers")
+            # Warm-up: PDF ingestion, first connections
+            run_level(host, port, prompts, 1, len(prompts))
+
+        levels = []
+        for sessions in args.sessions:
+            print(f"{sessions} sessions x {args.turns} turns...")
+            levels.append(run_level(host, port, prompts, sessions, args.turns))
+        print()
+        print_report(levels)
+
+
+if __name__ == "__main__":
+    main()
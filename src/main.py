@@ -1,18 +1,70 @@
 import streamlit as st
-from agent import get_agent_executor
-from evaluation import evaluate_response
+from resources import get_agent_graph, warm_up, warm_up_report
+from evaluation_queue import get_evaluation_queue
+from checkpointer import get_checkpointer
+from tools import cache_stats
+from intent_router import ROUTER_STATS
+from token_ledger import LEDGER, attribute, count_tokens, content_text
+from tracing import start_metrics_server, trace_turn
 from langchain_core.messages import HumanMessage, AIMessage
+import asyncio
+import time
 import uuid
-import tiktoken
 
 
-def count_tokens(text: str) -> int:
-    """Count tokens in text"""
-    try:
-        encoding = tiktoken.encoding_for_model("gpt-4")
-        return len(encoding.encode(str(text)))
-    except:
-        return len(str(text)) // 4  # Rough estimate
+async def stream_agent_response(agent_executor, inputs, config, placeholder, status):
+    """Run the agent via astream_events, rendering the answer as it streams.
+
+    Returns seconds until the first answer token (None if nothing streamed).
+    Only the agent node's own LLM calls are shown; LLM calls made inside
+    tools (e.g. Cypher generation) are not part of the answer.
+    """
+    started = time.perf_counter()
+    first_token = None
+    text = ""
+    async for event in agent_executor.astream_events(
+        inputs, config=config, version="v2"
+    ):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+        if kind == "on_chat_model_start" and node == "agent":
+            text = ""  # Each round trip to the model starts a new answer
+        elif kind == "on_chat_model_stream" and node == "agent":
+            chunk = content_text(event["data"]["chunk"].content)
+            if chunk:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                text += chunk
+                placeholder.markdown(text + "▌")
+        elif kind == "on_tool_start":
+            status.update(label=f"Running {event['name']}...", state="running")
+            status.write(f"🔧 {event['name']} started")
+        elif kind == "on_tool_end":
+            status.write(f"✅ {event['name']} finished")
+    return first_token
+
+
+def show_evaluation(evaluation_id):
+    """Evaluation expander for an answer; evaluations run in the background,
+    so a pending one is polled until its result is stored."""
+    evaluation = get_evaluation_queue().get(evaluation_id)
+    if evaluation is None or evaluation["status"] == "pending":
+        st.fragment(run_every=2)(evaluation_expander)(evaluation_id)
+    else:
+        evaluation_expander(evaluation_id, evaluation)
+
+
+def evaluation_expander(evaluation_id, evaluation=None):
+    evaluation = evaluation or get_evaluation_queue().get(evaluation_id)
+    with st.expander("Evaluation"):
+        if evaluation is None or evaluation["status"] == "pending":
+            st.caption("⏳ Evaluating in the background...")
+        elif evaluation["status"] == "done":
+            st.write(evaluation["result"])
+        else:
+            st.caption(f"Evaluation {evaluation['status']}")
+            if evaluation["result"]:
+                st.write(evaluation["result"])
 
 
 # Initialize session state FIRST - before any UI operations
@@ -30,6 +82,9 @@ st.sidebar.title("Token Monitor")
 if st.sidebar.button("🗑️ Clear Conversation"):
     st.session_state.messages = []
     st.session_state.conversation_history = []
+    LEDGER.forget(st.session_state.thread_id)
+    # Free the old conversation's checkpoints instead of leaving them behind
+    get_checkpointer().delete_thread(st.session_state.thread_id)
     st.session_state.thread_id = str(uuid.uuid4())
     st.rerun()
 
@@ -39,11 +94,17 @@ if st.session_state.conversation_history:
         "Conversation Length", f"{len(st.session_state.conversation_history)} messages"
     )
 
-agent_executor = get_agent_executor()
+# One compiled graph per server process, shared by all sessions; the first
+# run also starts warming up the LLM clients, Neo4j pool and PDF corpus
+warm_up()
+start_metrics_server()
+agent_executor = get_agent_graph()
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("evaluation_id"):
+            show_evaluation(message["evaluation_id"])
 
 if prompt := st.chat_input("Ask a question"):
     # Token monitoring
@@ -60,12 +121,30 @@ if prompt := st.chat_input("Ask a question"):
     with st.chat_message("assistant"):
         config = {"configurable": {"thread_id": st.session_state.thread_id}}
 
-        # Send entire conversation history to the agent
-        response = agent_executor.invoke(
-            {"messages": st.session_state.conversation_history},
-            config=config,
-        )
-        assistant_response = response["messages"][-1].content
+        # The checkpointer holds the conversation for this thread_id, so only
+        # the new question is sent; the answer and tool progress stream into
+        # the bubble as they arrive
+        status = st.status("Thinking...", expanded=False)
+        placeholder = st.empty()
+        started = time.perf_counter()
+        ledger_before = LEDGER.totals(st.session_state.thread_id)
+        with attribute(session=st.session_state.thread_id), trace_turn(
+            st.session_state.thread_id
+        ) as trace:
+            time_to_first_token = asyncio.run(
+                stream_agent_response(
+                    agent_executor,
+                    {"messages": [HumanMessage(content=prompt)]},
+                    config,
+                    placeholder,
+                    status,
+                )
+            )
+        response_time = time.perf_counter() - started
+        status.update(label="Done", state="complete")
+
+        response = agent_executor.get_state(config).values
+        assistant_response = content_text(response["messages"][-1].content)
 
         # Add assistant response to conversation history
         st.session_state.conversation_history.append(
@@ -75,13 +154,28 @@ if prompt := st.chat_input("Ask a question"):
         # Token monitoring for response
         response_tokens = count_tokens(assistant_response)
 
-        # Calculate total conversation tokens
-        total_conversation_tokens = sum(
-            count_tokens(msg.content) for msg in st.session_state.conversation_history
-        )
+        # Tokens of conversation context the model saw this turn, after the
+        # history node trimmed and summarized the older exchanges
+        history_stats = response.get("history_stats", {})
+        total_conversation_tokens = history_stats.get("tokens_after", 0)
 
         st.sidebar.metric("Response Tokens", response_tokens)
+        ledger_after = LEDGER.totals(st.session_state.thread_id)
+        st.sidebar.metric(
+            "LLM Tokens This Turn",
+            f"{ledger_after['prompt'] - ledger_before['prompt']} in / "
+            f"{ledger_after['completion'] - ledger_before['completion']} out",
+        )
+        if time_to_first_token is not None:
+            st.sidebar.metric("Time to First Token", f"{time_to_first_token:.2f} s")
+        st.sidebar.metric("Response Time", f"{response_time:.2f} s")
         st.sidebar.metric("Total Conversation Tokens", total_conversation_tokens)
+        if history_stats.get("tokens_saved"):
+            st.sidebar.metric(
+                "Tokens Saved This Turn",
+                history_stats["tokens_saved"],
+                help=f"{history_stats['messages_folded']} older messages summarized",
+            )
 
         # Warning if tokens are high
         if total_conversation_tokens > 5000:
@@ -93,13 +187,114 @@ if prompt := st.chat_input("Ask a question"):
                 f"Very high conversation token usage: {total_conversation_tokens}"
             )
 
-        st.markdown(assistant_response)
+        placeholder.markdown(assistant_response)
 
-        eval_result = evaluate_response(prompt, assistant_response)
-        with st.expander("Evaluation"):
-            st.write(eval_result)
+        # Where this turn's time went, slowest stage first
+        if trace is not None:
+            with st.sidebar.expander("Turn Breakdown"):
+                for name, calls, ms, sizes in trace.breakdown():
+                    st.caption(
+                        f"{name}: {ms:.0f} ms"
+                        + (f" ({calls} calls)" if calls > 1 else "")
+                        + "".join(f", {key} {value:,}" for key, value in sizes.items())
+                    )
+
+        # Scored in the background (sampled and rate-limited) so the turn
+        # doesn't wait for another LLM call
+        evaluation_id = get_evaluation_queue().submit(
+            st.session_state.thread_id, prompt, assistant_response
+        )
+        if evaluation_id:
+            show_evaluation(evaluation_id)
 
     # Add assistant response to display messages
     st.session_state.messages.append(
-        {"role": "assistant", "content": assistant_response}
+        {
+            "role": "assistant",
+            "content": assistant_response,
+            "evaluation_id": evaluation_id,
+        }
+    )
+
+# Startup warm-up of the shared resources (runs once per server process)
+if warm_up_report:
+    with st.sidebar.expander("Warm-up"):
+        for step, seconds, error in list(warm_up_report):
+            st.caption(
+                f"{step}: {seconds:.2f} s" + (f" (failed: {error})" if error else "")
+            )
+
+# Token totals for this conversation, by component (evaluations are added
+# as the background queue finishes them)
+ledger = LEDGER.totals(st.session_state.thread_id)
+if ledger["components"]:
+    with st.sidebar.expander("Token Ledger"):
+        st.caption(
+            f"Session: {ledger['prompt']} prompt / {ledger['completion']} completion tokens"
+        )
+        for component, totals in sorted(ledger["components"].items()):
+            st.caption(
+                f"{component}: {totals['prompt']} in / {totals['completion']} out "
+                f"over {totals['calls']} calls"
+                + (
+                    f" ({totals['estimated_calls']} estimated)"
+                    if totals["estimated_calls"]
+                    else ""
+                )
+            )
+
+# Background evaluation queue
+evaluation_stats = get_evaluation_queue().stats
+if evaluation_stats["submitted"]:
+    with st.sidebar.expander("Evaluation Queue"):
+        st.caption(
+            f"{evaluation_stats['completed']} evaluated, "
+            f"{get_evaluation_queue().pending()} waiting, "
+            f"{evaluation_stats['sampled_out']} not sampled, "
+            f"{evaluation_stats['dropped']} dropped, {evaluation_stats['failed']} failed"
+        )
+
+# Stored conversations (checkpoints) and what they cost in memory and on disk
+storage = get_checkpointer().stats()
+with st.sidebar.expander("Conversation Storage"):
+    st.caption(
+        f"{storage['threads']} conversations, {storage['checkpoints']} checkpoints: "
+        f"{storage['stored_bytes'] / 1024:.0f} KB compressed "
+        f"({storage['compression_ratio']:.1f}x), {storage['disk_bytes'] / 1024:.0f} KB on disk"
+    )
+    st.caption(
+        f"{storage['pruned_checkpoints']} checkpoints pruned, "
+        f"{storage['evicted_threads']} idle conversations evicted, "
+        f"{storage['deleted_threads']} cleared"
     )
+    if storage["process_rss_bytes"]:
+        st.caption(f"Process memory: {storage['process_rss_bytes'] / 2**20:.0f} MB")
+
+# Neo4j questions answered without LLM Cypher generation
+router = ROUTER_STATS.stats()
+if router["questions"]:
+    with st.sidebar.expander("Query Router"):
+        st.caption(
+            f"{router['hit_rate']:.0%} of {router['questions']} database questions "
+            f"answered without the LLM, saving about {router['saved_seconds']:.1f} s"
+        )
+        st.caption(
+            ", ".join(
+                f"{path}: {count}" for path, count in sorted(router["paths"].items())
+            )
+            + (
+                f" ({router['empty_templates']} templates found nothing)"
+                if router["empty_templates"]
+                else ""
+            )
+        )
+
+# Cache effectiveness (rendered last so it includes this turn)
+with st.sidebar.expander("Cache Statistics"):
+    for cache_name, stats in cache_stats().items():
+        st.caption(
+            f"{cache_name}: {stats['hits']} hits / {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate, {stats['size']} entries"
+            + (f", {stats['stale_hits']} served stale" if stats["stale_hits"] else "")
+            + ")"
+        )
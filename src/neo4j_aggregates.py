@@ -0,0 +1,350 @@
+"""Materialized drug statistics for the common aggregate questions.
+
+The hot questions (top primary suspects, reactions/manufacturers/age groups/
+outcomes per drug) all count Cases through two or three hops. This module
+keeps those counts precomputed, outside the domain graph:
+
+- (:AggregateCount {id, kind, drug, drugLower, key, cases}) per counted
+  (kind, drug, key), e.g. ("reaction", "TRAMADOL", "NAUSEA"); corpus-wide
+  totals use an empty drug
+- (:AggregateCase {caseId, contributions}) per folded Case: the counts it
+  added, so a refold can take them back out
+- (:AggregateState) with the refresh watermarks
+
+These labels aren't in the schema the Cypher prompt describes and are not
+connected to Case, Drug or any other domain node, so generated queries
+don't see them. Domain nodes are never written to.
+
+Refreshes are incremental. New Cases are found by ascending primaryid past
+a watermark. Cases whose relationships change afterwards (an added
+reaction or drug...) are found by ``updatedAt``: whatever changes a Case
+must set ``c.updatedAt = datetime()``. Each Case is folded as the
+difference between what it contributes now and what it contributed last
+time, so refolding is exact and safe to repeat. Run neo4j_bootstrap.py
+first so Case.primaryid is indexed.
+
+Usage:
+    python src/neo4j_aggregates.py              # fold in new and changed Cases
+    python src/neo4j_aggregates.py --rebuild    # recompute from scratch
+    python src/neo4j_aggregates.py --watch 300  # refresh every 5 minutes
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from neo4j_driver import get_session
+from cypher_templates import ALL_SUSPECT_RELS, SUSPECT_RELS
+from intent_router import MIN_CONFIDENCE, route_question
+
+STATE_NAME = "drug_stats"
+# Bumped when the summary layout changes; an older state is rebuilt
+STATE_VERSION = 2
+
+SETUP_STATEMENTS = [
+    "CREATE CONSTRAINT aggregate_count_id IF NOT EXISTS FOR (k:AggregateCount) REQUIRE k.id IS UNIQUE",
+    "CREATE INDEX aggregate_count_kind_drug IF NOT EXISTS FOR (k:AggregateCount) ON (k.kind, k.drug)",
+    "CREATE INDEX aggregate_count_kind_key IF NOT EXISTS FOR (k:AggregateCount) ON (k.kind, k.key)",
+    "CREATE TEXT INDEX aggregate_count_drug_lower IF NOT EXISTS FOR (k:AggregateCount) ON (k.drugLower)",
+    "CREATE CONSTRAINT aggregate_case_id IF NOT EXISTS FOR (a:AggregateCase) REQUIRE a.caseId IS UNIQUE",
+    "CREATE INDEX case_updated_at IF NOT EXISTS FOR (c:Case) ON (c.updatedAt)",
+]
+
+# The first layout kept DrugSummary nodes linked to the domain graph and
+# totalCases on Reaction, Manufacturer and AgeGroup; rebuild() removes them
+LEGACY_STATEMENTS = [
+    "MATCH (s:DrugSummary) CALL { WITH s DETACH DELETE s } IN TRANSACTIONS OF 1000 ROWS",
+    *(
+        f"MATCH (n:{label}) WHERE n.totalCases IS NOT NULL "
+        "CALL { WITH n REMOVE n.totalCases } IN TRANSACTIONS OF 10000 ROWS"
+        for label in ["Reaction", "Manufacturer", "AgeGroup"]
+    ),
+    "DROP CONSTRAINT drug_summary_name IF EXISTS",
+    "DROP INDEX drug_summary_name_lower IF EXISTS",
+    "DROP INDEX drug_summary_primary_suspect IF EXISTS",
+    "DROP INDEX reaction_total_cases IF EXISTS",
+    "DROP INDEX manufacturer_total_cases IF EXISTS",
+    "DROP INDEX age_group_total_cases IF EXISTS",
+]
+
+_BATCH_CASES = "UNWIND $ids AS id MATCH (c:Case) WHERE elementId(c) = id "
+
+# What a batch of Cases contributes to each kind of count: one
+# (id, drug, key) row per match, as the templates would count them
+CONTRIBUTION_QUERIES = {
+    "primary_suspect": _BATCH_CASES
+    + "MATCH (c)-[:IS_PRIMARY_SUSPECT]->(d:Drug) WHERE d.name IS NOT NULL "
+    "RETURN id, d.name AS drug, '' AS key",
+    "reaction": _BATCH_CASES
+    + f"MATCH (d:Drug)<-[:{SUSPECT_RELS}]-(c)-[:HAS_REACTION]->(r:Reaction) "
+    "WHERE d.name IS NOT NULL AND r.description IS NOT NULL "
+    "RETURN id, d.name AS drug, toString(r.description) AS key",
+    "manufacturer": _BATCH_CASES
+    + f"MATCH (d:Drug)<-[:{ALL_SUSPECT_RELS}]-(c)<-[:REGISTERED]-(m:Manufacturer) "
+    "WHERE d.name IS NOT NULL AND m.manufacturerName IS NOT NULL "
+    "RETURN id, d.name AS drug, toString(m.manufacturerName) AS key",
+    "age_group": _BATCH_CASES
+    + f"MATCH (d:Drug)<-[:{ALL_SUSPECT_RELS}]-(c)-[:FALLS_UNDER]->(a:AgeGroup) "
+    "WHERE d.name IS NOT NULL AND a.ageGroup IS NOT NULL "
+    "RETURN id, d.name AS drug, toString(a.ageGroup) AS key",
+    "outcome": _BATCH_CASES
+    + f"MATCH (d:Drug)<-[:{ALL_SUSPECT_RELS}]-(c)-[:RESULTED_IN]->(o:Outcome) "
+    "WHERE d.name IS NOT NULL AND o.outcome IS NOT NULL "
+    "RETURN id, d.name AS drug, toString(o.outcome) AS key",
+    "reaction_total": _BATCH_CASES
+    + "MATCH (c)-[:HAS_REACTION]->(r:Reaction) WHERE r.description IS NOT NULL "
+    "RETURN id, '' AS drug, toString(r.description) AS key",
+    "manufacturer_total": _BATCH_CASES
+    + "MATCH (m:Manufacturer)-[:REGISTERED]->(c) WHERE m.manufacturerName IS NOT NULL "
+    "RETURN id, '' AS drug, toString(m.manufacturerName) AS key",
+    "age_group_total": _BATCH_CASES
+    + "MATCH (c)-[:FALLS_UNDER]->(a:AgeGroup) WHERE a.ageGroup IS NOT NULL "
+    "RETURN id, '' AS drug, toString(a.ageGroup) AS key",
+}
+
+# Summary equivalents of the cypher_templates queries, keyed by intent. Each
+# returns the same columns as the template it replaces.
+SUMMARY_QUERIES = {
+    "top_primary_suspects": "MATCH (k:AggregateCount {kind: 'primary_suspect'}) WHERE k.cases > 0 RETURN k.drug as drug_name, k.cases as cases ORDER BY cases DESC LIMIT 15",
+    "drug_manufacturers": "MATCH (k:AggregateCount {kind: 'manufacturer', drug: $drug_name}) WHERE k.cases > 0 RETURN k.key as manufacturer, k.cases as case_count ORDER BY case_count DESC LIMIT 10",
+    "manufacturer_drugs": "MATCH (k:AggregateCount {kind: 'manufacturer', key: $manufacturer_name}) WHERE k.cases > 0 RETURN k.drug as drug_name, k.cases as case_count ORDER BY case_count DESC LIMIT 10",
+    "top_manufacturers": "MATCH (k:AggregateCount {kind: 'manufacturer_total'}) WHERE k.cases > 0 RETURN k.key as manufacturer, k.cases as total_cases ORDER BY total_cases DESC LIMIT 10",
+    "drug_reactions": "MATCH (k:AggregateCount) WHERE k.drugLower CONTAINS $drug_term AND k.kind = 'reaction' AND k.cases > 0 RETURN k.key as reaction, sum(k.cases) as case_count ORDER BY case_count DESC LIMIT 15",
+    "top_reactions": "MATCH (k:AggregateCount {kind: 'reaction_total'}) WHERE k.cases > 0 RETURN k.key as reaction, k.cases as cases ORDER BY cases DESC LIMIT 15",
+    "drug_age_groups": "MATCH (k:AggregateCount {kind: 'age_group', drug: $drug_name}) WHERE k.cases > 0 RETURN k.key as age_group, k.cases as case_count ORDER BY case_count DESC",
+    "drug_outcomes": "MATCH (k:AggregateCount {kind: 'outcome', drug: $drug_name}) WHERE k.cases > 0 RETURN k.key as outcome, k.cases as case_count ORDER BY case_count DESC",
+    "top_age_groups": "MATCH (k:AggregateCount {kind: 'age_group_total'}) WHERE k.cases > 0 RETURN k.key as age_group, k.cases as cases ORDER BY cases DESC LIMIT 10",
+}
+
+# How long an availability check is trusted before asking again
+STATE_CHECK_TTL = 60
+
+_state = {"refreshed_at": None, "checked_at": 0.0}
+_state_lock = threading.Lock()
+
+
+def setup(session):
+    for statement in SETUP_STATEMENTS:
+        session.run(statement).consume()
+    session.run(
+        "MERGE (s:AggregateState {name: $name}) ON CREATE SET s.watermark = -1, "
+        "s.casesAggregated = 0, s.version = $version",
+        {"name": STATE_NAME, "version": STATE_VERSION},
+    ).consume()
+
+
+def _count_id(kind: str, drug: str, key: str) -> str:
+    return json.dumps([kind, drug, key])
+
+
+def _fold_cases(tx, ids: list, state: dict, new_cases: int = 0):
+    """Bring the counts up to date for the Cases ``ids`` and store ``state``.
+
+    Each Case's previous contribution (from its AggregateCase) is taken out
+    and its current one added, so a Case folded twice is only counted once.
+    """
+    current = {case_id: Counter() for case_id in ids}
+    for kind, query in CONTRIBUTION_QUERIES.items():
+        for record in tx.run(query, {"ids": ids}):
+            current[record["id"]][_count_id(kind, record["drug"], record["key"])] += 1
+    previous = {
+        record["id"]: record["contributions"]
+        for record in tx.run(
+            "UNWIND $ids AS id MATCH (a:AggregateCase {caseId: id}) "
+            "RETURN id, a.contributions AS contributions",
+            {"ids": ids},
+        )
+    }
+
+    delta = Counter()
+    for case_id, counts in current.items():
+        delta.update(counts)
+        delta.subtract(Counter(previous.get(case_id) or []))
+    changes = []
+    for count_id, n in delta.items():
+        if n:
+            kind, drug, key = json.loads(count_id)
+            changes.append(
+                {"id": count_id, "kind": kind, "drug": drug, "key": key, "n": n}
+            )
+
+    tx.run(
+        "UNWIND $changes AS row MERGE (k:AggregateCount {id: row.id}) "
+        "ON CREATE SET k.kind = row.kind, k.drug = row.drug, "
+        "k.drugLower = toLower(row.drug), k.key = row.key, k.cases = 0 "
+        "SET k.cases = k.cases + row.n",
+        {"changes": changes},
+    ).consume()
+    tx.run(
+        "UNWIND $cases AS row MERGE (a:AggregateCase {caseId: row.id}) "
+        "SET a.contributions = row.contributions",
+        {
+            "cases": [
+                {"id": case_id, "contributions": sorted(counts.elements())}
+                for case_id, counts in current.items()
+            ]
+        },
+    ).consume()
+    tx.run(
+        "MATCH (s:AggregateState {name: $name}) SET s += $state, "
+        "s.casesAggregated = s.casesAggregated + $new_cases, s.refreshedAt = datetime()",
+        {"name": STATE_NAME, "state": state, "new_cases": new_cases},
+    ).consume()
+
+
+def _fold_new(tx, watermark, batch_size):
+    """Fold the next batch of Cases past the primaryid watermark."""
+    records = tx.run(
+        "MATCH (c:Case) WHERE c.primaryid > $watermark "
+        "RETURN elementId(c) AS id, c.primaryid AS primaryid "
+        "ORDER BY c.primaryid LIMIT $batch_size",
+        {"watermark": watermark, "batch_size": batch_size},
+    ).data()
+    if not records:
+        return 0, watermark
+    watermark = records[-1]["primaryid"]
+    ids = [record["id"] for record in records]
+    _fold_cases(tx, ids, {"watermark": watermark}, new_cases=len(ids))
+    return len(ids), watermark
+
+
+def _fold_changed(tx, since, since_id, batch_size):
+    """Fold the next batch of Cases updated after ``(since, since_id)``."""
+    records = tx.run(
+        "MATCH (c:Case) WHERE c.updatedAt IS NOT NULL AND ($since IS NULL "
+        "OR c.updatedAt > $since OR (c.updatedAt = $since AND elementId(c) > $since_id)) "
+        "RETURN elementId(c) AS id, c.updatedAt AS updated_at "
+        "ORDER BY updated_at, id LIMIT $batch_size",
+        {"since": since, "since_id": since_id, "batch_size": batch_size},
+    ).data()
+    if not records:
+        return 0, since, since_id
+    since, since_id = records[-1]["updated_at"], records[-1]["id"]
+    _fold_cases(
+        tx,
+        [record["id"] for record in records],
+        {"updatedWatermark": since, "updatedWatermarkId": since_id},
+    )
+    return len(records), since, since_id
+
+
+def refresh(session, batch_size: int = 5000) -> int:
+    """Fold every new Case, and every Case updated since the last refresh,
+    into the summaries.
+
+    Each batch is one transaction that updates the counts and advances its
+    watermark together, so an interrupted refresh resumes where it stopped.
+    Summaries in an older layout are rebuilt. Returns the number of Cases
+    folded.
+    """
+    setup(session)
+    state = session.run(
+        "MATCH (s:AggregateState {name: $name}) RETURN s.version AS version, "
+        "s.watermark AS watermark, s.updatedWatermark AS since, "
+        "s.updatedWatermarkId AS since_id",
+        {"name": STATE_NAME},
+    ).single()
+    if state["version"] != STATE_VERSION:
+        return rebuild(session, batch_size)
+
+    total = 0
+    watermark = state["watermark"]
+    while True:
+        folded, watermark = session.execute_write(_fold_new, watermark, batch_size)
+        if not folded:
+            break
+        total += folded
+
+    since, since_id = state["since"], state["since_id"] or ""
+    while True:
+        folded, since, since_id = session.execute_write(
+            _fold_changed, since, since_id, batch_size
+        )
+        if not folded:
+            break
+        total += folded
+
+    with _state_lock:
+        _state["checked_at"] = 0.0
+    return total
+
+
+def rebuild(session, batch_size: int = 5000) -> int:
+    """Drop all summaries (and the old layout's) and recompute them from every Case."""
+    for label in ["AggregateCount", "AggregateCase"]:
+        session.run(
+            f"MATCH (n:{label}) CALL {{ WITH n DELETE n }} IN TRANSACTIONS OF 10000 ROWS"
+        ).consume()
+    for statement in LEGACY_STATEMENTS:
+        session.run(statement).consume()
+    session.run(
+        "MATCH (s:AggregateState {name: $name}) DETACH DELETE s", {"name": STATE_NAME}
+    ).consume()
+    return refresh(session, batch_size)
+
+
+def summaries_refreshed_at(session):
+    """When the summaries were last refreshed, or None if they don't exist."""
+    now = time.time()
+    with _state_lock:
+        if now - _state["checked_at"] < STATE_CHECK_TTL:
+            return _state["refreshed_at"]
+
+    try:
+        record = session.run(
+            "MATCH (s:AggregateState {name: $name}) WHERE s.version = $version "
+            "RETURN toString(s.refreshedAt) AS refreshed_at",
+            {"name": STATE_NAME, "version": STATE_VERSION},
+        ).single()
+        refreshed_at = record["refreshed_at"] if record else None
+    except Exception:
+        refreshed_at = None
+
+    with _state_lock:
+        _state["refreshed_at"] = refreshed_at
+        _state["checked_at"] = now
+    return refreshed_at
+
+
+def route_to_summary(session, question: str):
+    """Return ``(intent, query, params, refreshed_at)`` if the summaries can
+    answer ``question``.
+
+    Only plain aggregate questions the intent router is confident about are
+    routed; anything with qualifiers the summaries don't track returns None
+    and goes through the templates or Cypher generation.
+    """
+    intent, params, confidence, _ = route_question(question)
+    query = SUMMARY_QUERIES.get(intent)
+    if query is None or confidence < MIN_CONFIDENCE:
+        return None
+
+    refreshed_at = summaries_refreshed_at(session)
+    if refreshed_at is None:
+        return None
+    return intent, query, params, refreshed_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Recompute all summaries from scratch"
+    )
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--watch", type=float, help="Keep refreshing every N seconds")
+    args = parser.parse_args()
+
+    with get_session() as session:
+        if args.rebuild:
+            print(f"Rebuilt summaries from {rebuild(session, args.batch_size)} cases")
+        while True:
+            folded = refresh(session, args.batch_size)
+            print(f"Folded {folded} new or changed cases into the summaries")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
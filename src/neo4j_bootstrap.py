@@ -0,0 +1,273 @@
+"""Create the indexes and constraints the agent's queries rely on.
+
+Usage:
+    python src/neo4j_bootstrap.py                      # create indexes (idempotent)
+    python src/neo4j_bootstrap.py --benchmark --database scratch
+                                                       # before/after timing report
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from neo4j_driver import get_session
+from cypher_templates import (
+    DRUG_MANUFACTURERS,
+    DRUG_REACTIONS,
+    FULLTEXT_INDEX,
+    use_fulltext_index,
+)
+
+CASE_CONSTRAINT = "CREATE CONSTRAINT case_primaryid IF NOT EXISTS FOR (c:Case) REQUIRE c.primaryid IS UNIQUE"
+# Used instead of the constraint if existing data has duplicate primaryids
+CASE_INDEX = "CREATE INDEX case_primaryid IF NOT EXISTS FOR (c:Case) ON (c.primaryid)"
+
+INDEXES = {
+    "drug_name": "CREATE INDEX drug_name IF NOT EXISTS FOR (d:Drug) ON (d.name)",
+    "manufacturer_name": "CREATE INDEX manufacturer_name IF NOT EXISTS FOR (m:Manufacturer) ON (m.manufacturerName)",
+    "reaction_description": "CREATE INDEX reaction_description IF NOT EXISTS FOR (r:Reaction) ON (r.description)",
+    "age_group": "CREATE INDEX age_group IF NOT EXISTS FOR (a:AgeGroup) ON (a.ageGroup)",
+    FULLTEXT_INDEX: f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} IF NOT EXISTS FOR (d:Drug) ON EACH [d.name]",
+}
+
+# How long a fulltext availability check is trusted before asking again
+FULLTEXT_CHECK_TTL = 300
+
+_fulltext_state = {"available": None, "checked_at": 0.0}
+_fulltext_lock = threading.Lock()
+
+
+def bootstrap_schema(session, wait_seconds: int = 300) -> list:
+    """Create all indexes and constraints. Safe to run repeatedly.
+
+    Returns a list of human-readable status lines.
+    """
+    report = []
+    try:
+        session.run(CASE_CONSTRAINT).consume()
+        report.append("Constraint case_primaryid: ok")
+    except Exception as e:
+        session.run(CASE_INDEX).consume()
+        report.append(
+            f"Constraint case_primaryid failed ({e}); created range index instead"
+        )
+
+    for name, statement in INDEXES.items():
+        session.run(statement).consume()
+        report.append(f"Index {name}: ok")
+
+    session.run("CALL db.awaitIndexes($seconds)", {"seconds": wait_seconds}).consume()
+    report.append("All indexes online")
+
+    with _fulltext_lock:
+        _fulltext_state["available"] = None
+    return report
+
+
+def drop_schema(session):
+    """Drop everything bootstrap_schema creates (used by the benchmark)."""
+    session.run("DROP CONSTRAINT case_primaryid IF EXISTS").consume()
+    for name in ["case_primaryid", *INDEXES]:
+        session.run(f"DROP INDEX {name} IF EXISTS").consume()
+    with _fulltext_lock:
+        _fulltext_state["available"] = None
+
+
+def fulltext_index_available(session) -> bool:
+    """Whether the drug-name fulltext index exists and is online.
+
+    The answer is cached for FULLTEXT_CHECK_TTL seconds so the check doesn't
+    add a round trip to every query.
+    """
+    now = time.time()
+    with _fulltext_lock:
+        if (
+            _fulltext_state["available"] is not None
+            and now - _fulltext_state["checked_at"] < FULLTEXT_CHECK_TTL
+        ):
+            return _fulltext_state["available"]
+
+    try:
+        record = session.run(
+            "SHOW FULLTEXT INDEXES YIELD name, state WHERE name = $name RETURN state",
+            {"name": FULLTEXT_INDEX},
+        ).single()
+        available = record is not None and record["state"] == "ONLINE"
+    except Exception:
+        available = False
+
+    with _fulltext_lock:
+        _fulltext_state["available"] = available
+        _fulltext_state["checked_at"] = now
+    return available
+
+
+# Synthetic FAERS-like data for the benchmark. Everything is tagged with
+# `synthetic: true` so it can be removed afterwards.
+SYNTHETIC_DRUGS = [
+    "TRAMADOL",
+    "ASPIRIN",
+    "IBUPROFEN",
+    "METFORMIN",
+    "REVLIMID",
+    "CUVITRU",
+]
+
+
+def create_synthetic_graph(session, drugs: int, cases: int, batch_size: int = 5000):
+    rng = random.Random(42)
+    names = {
+        "Drug": (
+            "name",
+            SYNTHETIC_DRUGS + [f"SYNTHDRUG {i:05d}" for i in range(drugs)],
+        ),
+        "Manufacturer": (
+            "manufacturerName",
+            [f"SYNTH MANUFACTURER {i:03d}" for i in range(200)],
+        ),
+        "Reaction": (
+            "description",
+            [f"Synthetic reaction {i:04d}" for i in range(1000)],
+        ),
+    }
+
+    # Cases link to nodes by elementId so building the graph doesn't itself
+    # depend on the indexes being measured
+    ids = {}
+    for label, (prop, values) in names.items():
+        ids[label] = [
+            record["id"]
+            for record in session.run(
+                f"UNWIND $values AS value CREATE (n:{label} {{{prop}: value, synthetic: true}}) RETURN elementId(n) AS id",
+                {"values": values},
+            )
+        ]
+
+    for start in range(0, cases, batch_size):
+        rows = [
+            {
+                "primaryid": i,
+                "drug": rng.choice(ids["Drug"]),
+                "manufacturer": rng.choice(ids["Manufacturer"]),
+                "reaction": rng.choice(ids["Reaction"]),
+            }
+            for i in range(start, min(start + batch_size, cases))
+        ]
+        session.run(
+            """
+            UNWIND $rows AS row
+            MATCH (d) WHERE elementId(d) = row.drug
+            MATCH (m) WHERE elementId(m) = row.manufacturer
+            MATCH (r) WHERE elementId(r) = row.reaction
+            CREATE (c:Case {primaryid: row.primaryid, synthetic: true})
+            CREATE (c)-[:IS_PRIMARY_SUSPECT]->(d)
+            CREATE (m)-[:REGISTERED]->(c)
+            CREATE (c)-[:HAS_REACTION]->(r)
+            """,
+            {"rows": rows},
+        ).consume()
+
+
+def delete_synthetic_graph(session):
+    session.run(
+        "MATCH (n {synthetic: true}) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS"
+    ).consume()
+
+
+def time_query(session, query: str, params: dict, repeat: int) -> float:
+    """Median wall-clock milliseconds over ``repeat`` runs (after one warm-up)."""
+    session.run(query, params).consume()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.run(query, params).consume()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run_benchmark(database: str, drugs: int, cases: int, repeat: int, keep: bool):
+    benchmark_queries = [
+        (
+            "drug -> manufacturers (exact name)",
+            DRUG_MANUFACTURERS,
+            {"drug_name": "TRAMADOL"},
+        ),
+        ("drug -> reactions (CONTAINS)", DRUG_REACTIONS, {"drug_term": "tramadol"}),
+        (
+            "case lookup by primaryid",
+            "MATCH (c:Case {primaryid: $primaryid}) RETURN c.primaryid",
+            {"primaryid": cases // 2},
+        ),
+    ]
+
+    with get_session(database=database) as session:
+        real_drugs = session.run(
+            "MATCH (d:Drug) WHERE d.synthetic IS NULL RETURN count(d) AS n"
+        ).single()["n"]
+        if real_drugs:
+            raise SystemExit(
+                f"Database '{database}' contains {real_drugs} real Drug nodes; "
+                "run the benchmark against a scratch database."
+            )
+
+        print(f"Creating synthetic graph ({drugs} drugs, {cases} cases)...")
+        drop_schema(session)
+
+        try:
+            create_synthetic_graph(session, drugs, cases)
+            before = {
+                name: time_query(session, query, params, repeat)
+                for name, query, params in benchmark_queries
+            }
+
+            for line in bootstrap_schema(session):
+                print(f"  {line}")
+
+            after = {}
+            for name, query, params in benchmark_queries:
+                query, params = use_fulltext_index(query, params)
+                after[name] = time_query(session, query, params, repeat)
+        finally:
+            if not keep:
+                delete_synthetic_graph(session)
+
+    print(f"\n{'Query':<40}{'Before (ms)':>14}{'After (ms)':>14}{'Speedup':>10}")
+    for name, _, _ in benchmark_queries:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<40}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Run the before/after timing report on a synthetic graph",
+    )
+    parser.add_argument("--database", help="Target database (required for --benchmark)")
+    parser.add_argument("--drugs", type=int, default=20000)
+    parser.add_argument("--cases", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the synthetic graph afterwards"
+    )
+    args = parser.parse_args()
+
+    if args.benchmark:
+        if not args.database:
+            parser.error(
+                "--benchmark needs an explicit --database (it drops and recreates indexes)"
+            )
+        run_benchmark(args.database, args.drugs, args.cases, args.repeat, args.keep)
+        return
+
+    with get_session(
+        **({"database": args.database} if args.database else {})
+    ) as session:
+        for line in bootstrap_schema(session):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import atexit
+import threading
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+
+load_dotenv()
+
+URI = os.getenv("NEO4J_URI")
+AUTH = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
+DB = os.getenv("NEO4J_DATABASE")
+
+# Pool settings (seconds unless stated otherwise)
+MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+CONNECTION_ACQUISITION_TIMEOUT = float(
+    os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "30")
+)
+CONNECTION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "15"))
+# Connections idle for longer than this are pinged before being handed out
+LIVENESS_CHECK_TIMEOUT = float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", "60"))
+
+_driver = None
+_lock = threading.Lock()
+
+
+def get_driver():
+    """Return the process-wide Neo4j driver, creating it on first use.
+
+    The driver owns a connection pool that is shared by every tool call and
+    every Streamlit session in this process. Connectivity is verified once
+    when the driver is created; afterwards stale connections are detected by
+    the pool's liveness check instead of a round trip on every call.
+    """
+    global _driver
+    if _driver is not None:
+        return _driver
+
+    with _lock:
+        if _driver is None:
+            driver = GraphDatabase.driver(
+                URI,
+                auth=AUTH,
+                max_connection_pool_size=MAX_POOL_SIZE,
+                max_connection_lifetime=MAX_CONNECTION_LIFETIME,
+                connection_acquisition_timeout=CONNECTION_ACQUISITION_TIMEOUT,
+                connection_timeout=CONNECTION_TIMEOUT,
+                liveness_check_timeout=LIVENESS_CHECK_TIMEOUT,
+            )
+            try:
+                driver.verify_connectivity()
+            except Exception:
+                # Don't keep a driver that never connected; the next call retries
+                driver.close()
+                raise
+            _driver = driver
+    return _driver
+
+
+def get_session(**kwargs):
+    """Open a session on the configured database using the shared driver."""
+    kwargs.setdefault("database", DB)
+    return get_driver().session(**kwargs)
+
+
+def close_driver():
+    """Close the shared driver and its pool. Safe to call more than once."""
+    global _driver
+    with _lock:
+        if _driver is not None:
+            try:
+                _driver.close()
+            finally:
+                _driver = None
+
+
+atexit.register(close_driver)
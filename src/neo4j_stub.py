@@ -0,0 +1,113 @@
+"""In-memory stand-in for the Neo4j driver, for offline runs and benchmarks.
+
+It holds a synthetic FAERS-like graph (drugs, manufacturers, reactions and
+cases, as in ``neo4j_bootstrap.create_synthetic_graph``) and answers the
+query shapes the agent sends by what they return (manufacturers,
+reactions or drugs) and their drug filter. It is not a Cypher engine.
+"""
+
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from neo4j_bootstrap import SYNTHETIC_DRUGS
+
+_DRUG_TERM = re.compile(r"CONTAINS\s+\$(\w+)")
+
+
+class StubRecord(dict):
+    def data(self):
+        return dict(self)
+
+
+class StubResult:
+    def __init__(self, rows: list):
+        self._rows = [StubRecord(row) for row in rows]
+
+    def data(self):
+        return [row.data() for row in self._rows]
+
+    def single(self):
+        return self._rows[0] if self._rows else None
+
+    def consume(self):
+        return None
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class StubGraph:
+    """Synthetic cases: each links one drug (primary suspect), one
+    manufacturer and one reaction, drawn from skewed distributions so
+    rankings look like real ones."""
+
+    def __init__(self, drugs: int = 200, cases: int = 20000, seed: int = 42):
+        rng = random.Random(seed)
+        self.drugs = SYNTHETIC_DRUGS + [f"SYNTHDRUG {i:05d}" for i in range(drugs)]
+        manufacturers = [f"SYNTH MANUFACTURER {i:03d}" for i in range(200)]
+        reactions = [f"Synthetic reaction {i:04d}" for i in range(1000)]
+        self.cases = [
+            (
+                self.drugs[min(int(rng.paretovariate(1.2)) - 1, len(self.drugs) - 1)],
+                rng.choice(manufacturers),
+                reactions[min(int(rng.paretovariate(1.0)) - 1, len(reactions) - 1)],
+            )
+            for _ in range(cases)
+        ]
+
+    def matching(self, params: dict, query: str):
+        """Cases whose drug passes the query's drug filter, if it has one."""
+        if "drug_name" in (params or {}):
+            name = str(params["drug_name"]).upper()
+            return [case for case in self.cases if case[0] == name]
+        match = _DRUG_TERM.search(query)
+        if match and match.group(1) in (params or {}):
+            term = str(params[match.group(1)]).upper()
+            return [case for case in self.cases if term in case[0]]
+        return self.cases
+
+    def answer(self, query: str, params: dict) -> list:
+        if "SHOW FULLTEXT" in query or "AggregateState" in query:
+            # No fulltext index and no precomputed summaries
+            return []
+        cases = self.matching(params, query)
+        if "Manufacturer" in query:
+            column, field = "manufacturer", 1
+        elif "Reaction" in query:
+            column, field = "reaction", 2
+        else:
+            column, field = "drug_name", 0
+        counts = Counter(case[field] for case in cases)
+        return [
+            {column: value, "case_count": count}
+            for value, count in counts.most_common(15)
+        ]
+
+
+class StubDriver:
+    """Offers ``session()`` like the real driver; every query waits
+    ``latency`` seconds to stand in for the network round trip."""
+
+    def __init__(self, graph: StubGraph = None, latency: float = 0.005):
+        self.graph = graph or StubGraph()
+        self.latency = latency
+        self.queries = []
+
+    @contextmanager
+    def session(self, **kwargs):
+        yield StubSession(self)
+
+    def close(self):
+        pass
+
+
+class StubSession:
+    def __init__(self, driver: StubDriver):
+        self.driver = driver
+
+    def run(self, query: str, params: dict = None, **kwargs):
+        self.driver.queries.append(query)
+        time.sleep(self.driver.latency)
+        return StubResult(self.driver.graph.answer(query, params or kwargs))
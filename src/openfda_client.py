@@ -0,0 +1,287 @@
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from cache import TTLCache
+from tracing import span
+
+load_dotenv()
+
+# Point this at a local stub (see openfda_stub.py) for offline runs
+BASE_URL = os.getenv("OPENFDA_BASE_URL", "https://api.fda.gov").rstrip("/")
+API_KEY = os.getenv("OPENFDA_API_KEY", "")
+TIMEOUT = float(os.getenv("OPENFDA_TIMEOUT", "10"))
+# Connections kept open to the API; more concurrent requests wait for one
+MAX_CONNECTIONS = int(os.getenv("OPENFDA_MAX_CONNECTIONS", "8"))
+MAX_RETRIES = int(os.getenv("OPENFDA_MAX_RETRIES", "3"))
+
+# Statuses worth retrying. openFDA answers 404 when nothing matches, which
+# is a normal miss, not a failure.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+DEFAULT_SORT = "receivedate:desc"
+
+# Slim event records per (search strategy + drug, limit, sort). Misses are
+# cached too (as []), so unknown names don't spend quota on every call. The
+# SQLite tier is shared by every Streamlit process on the machine.
+EVENT_CACHE = TTLCache(
+    maxsize=int(os.getenv("OPENFDA_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("OPENFDA_CACHE_TTL", "21600")),
+    stale_ttl=float(os.getenv("OPENFDA_CACHE_STALE_TTL", "86400")),
+    path=os.getenv("OPENFDA_CACHE_PATH", os.path.join("cache", "openfda_cache.sqlite"))
+    or None,
+)
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+
+def search_strategies(drug_name: str) -> list:
+    """openFDA ``search`` expressions for ``drug_name``, best first."""
+    return [
+        f"patient.drug.medicinalproduct:{drug_name.upper()}",
+        f"patient.drug.medicinalproduct:*{drug_name.upper()}*",
+        f"patient.drug.openfda.generic_name:{drug_name.lower()}",
+        f"patient.drug.openfda.brand_name:*{drug_name.upper()}*",
+    ]
+
+
+def get_http_session() -> requests.Session:
+    """Return the shared session: pooled keep-alive connections plus retries.
+
+    Reusing one session means one TLS handshake per connection instead of
+    one per request. ``pool_block`` caps concurrent connections to the host
+    at MAX_CONNECTIONS. 429/5xx responses are retried with exponential,
+    jittered backoff, honouring ``Retry-After``.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                retry = Retry(
+                    total=MAX_RETRIES,
+                    backoff_factor=0.5,
+                    backoff_jitter=0.5,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=["GET"],
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=MAX_CONNECTIONS,
+                    pool_block=True,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_CONNECTIONS, thread_name_prefix="openfda"
+                )
+    return _executor
+
+
+def fetch_events(search: str, limit: int, sort: str = DEFAULT_SORT, count: str = None):
+    """Run one drug event search. Returns the parsed JSON, or None on no match.
+
+    With ``count`` set, openFDA returns a ranked frequency table of that
+    field over all matching reports instead of the reports themselves.
+    """
+    url = f"{BASE_URL}/drug/event.json?search={search}&limit={limit}"
+    url += f"&count={count}" if count else f"&sort={sort}"
+    if API_KEY:
+        url += f"&api_key={API_KEY}"
+    with span("openfda.http", kind="count" if count else "search") as http_span:
+        response = get_http_session().get(url, timeout=TIMEOUT)
+        http_span.set("status", str(response.status_code))
+        http_span.set("bytes", len(response.content))
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = response.json()
+    return data if data.get("results") else None
+
+
+def slim_event(result: dict) -> dict:
+    """Keep only the fields the tools show from a full openFDA event report."""
+    patient = result.get("patient") or {}
+    reactions = patient.get("reaction")
+    drugs = patient.get("drug")
+    return {
+        "receivedate": result.get("receivedate", "Unknown"),
+        "serious": result.get("serious"),
+        "reactions": [
+            reaction["reactionmeddrapt"]
+            for reaction in (reactions if isinstance(reactions, list) else [])
+            if "reactionmeddrapt" in reaction
+        ],
+        "drugs": [
+            drug["medicinalproduct"]
+            for drug in (drugs if isinstance(drugs, list) else [])
+            if "medicinalproduct" in drug
+        ],
+    }
+
+
+def load_events(search: str, limit: int, sort: str = DEFAULT_SORT) -> list:
+    """Slim event records for one search, ``[]`` if nothing matched."""
+    data = fetch_events(search, limit, sort)
+    return [slim_event(result) for result in data["results"]] if data else []
+
+
+# Statistics get_adverse_event_statistics can show: name -> (count field,
+# title, labels for coded values)
+STATISTICS = {
+    "reactions": (
+        "patient.reaction.reactionmeddrapt.exact",
+        "Most common reactions",
+        {},
+    ),
+    "seriousness": ("serious", "Seriousness", {"1": "Serious", "2": "Non-serious"}),
+    "year": ("receivedate", "Reports per year", {}),
+    "outcome": (
+        "patient.reaction.reactionoutcome",
+        "Reaction outcomes",
+        {
+            "1": "Recovered/resolved",
+            "2": "Recovering/resolving",
+            "3": "Not recovered/not resolved",
+            "4": "Recovered/resolved with sequelae",
+            "5": "Fatal",
+            "6": "Unknown",
+        },
+    ),
+    "sex": (
+        "patient.patientsex",
+        "Patient sex",
+        {"0": "Unknown", "1": "Male", "2": "Female"},
+    ),
+    "country": ("occurcountry.exact", "Reporting countries", {}),
+}
+
+# openFDA caps count tables at 1000 terms
+MAX_COUNT_TERMS = 1000
+
+
+def load_counts(search: str, statistic: str, limit: int) -> list:
+    """``[{"term", "count"}, ...]`` for one search, most frequent first.
+
+    Date counts come back per day; they are summed per year.
+    """
+    field = STATISTICS[statistic][0]
+    if field == "receivedate":
+        data = fetch_events(search, MAX_COUNT_TERMS, count=field)
+        years = {}
+        for row in data["results"] if data else []:
+            years[row["time"][:4]] = years.get(row["time"][:4], 0) + row["count"]
+        return [
+            {"term": year, "count": years[year]} for year in sorted(years, reverse=True)
+        ]
+    data = fetch_events(search, min(limit, MAX_COUNT_TERMS), count=field)
+    return [
+        {"term": str(row["term"]), "count": row["count"]}
+        for row in (data["results"] if data else [])
+    ]
+
+
+def _load_and_cache(key, loader):
+    value = loader()
+    EVENT_CACHE.set(key, value)
+    return value
+
+
+def search_adverse_events(drug_name: str, limit: int = 10, sort: str = DEFAULT_SORT):
+    """Find recent events for ``drug_name`` using the best search strategy.
+
+    Returns ``(search, events)`` with slim event records, or None.
+    """
+    return _best_strategy(
+        drug_name,
+        lambda search: json.dumps(["events", search, limit, sort]),
+        lambda search: load_events(search, limit, sort),
+    )
+
+
+def count_adverse_events(drug_name: str, statistic: str, limit: int = 10):
+    """Frequency table of ``statistic`` over every report for ``drug_name``.
+
+    Returns ``(search, rows)`` with ``[{"term", "count"}, ...]``, or None.
+    One small response, however many reports match.
+    """
+    return _best_strategy(
+        drug_name,
+        lambda search: json.dumps(["count", search, statistic, limit]),
+        lambda search: load_counts(search, statistic, limit),
+    )
+
+
+def _best_strategy(drug_name, cache_key, load):
+    """Run ``load(search)`` for the search strategies of ``drug_name``.
+
+    Returns ``(search, value)`` for the highest-priority strategy whose
+    value is non-empty, or None. Cached answers are used first; strategies
+    that aren't cached all run at once, and a lower-priority hit is only
+    used once every strategy above it has missed. As soon as the answer is
+    known, strategies that haven't started are cancelled and the rest are
+    left to finish unread. If every strategy failed with an error (rather
+    than a miss), the first error is raised.
+    """
+    strategies = search_strategies(drug_name)
+    executor = _get_executor()
+
+    outcomes = []  # (search, value or Future), in priority order
+    for search in strategies:
+        key = cache_key(search)
+        cached = EVENT_CACHE.get(key, refresh=lambda search=search: load(search))
+        if cached is None:
+            # copy_context: the request's spans belong to the caller's trace
+            cached = executor.submit(
+                contextvars.copy_context().run,
+                _load_and_cache,
+                key,
+                lambda search=search: load(search),
+            )
+        outcomes.append((search, cached))
+        if cached and not isinstance(cached, Future):
+            break  # Nothing below a cached hit can win
+
+    futures = [outcome for _, outcome in outcomes if isinstance(outcome, Future)]
+    pending = set(futures)
+    try:
+        while True:
+            errors = []
+            for search, outcome in outcomes:
+                if isinstance(outcome, Future):
+                    if not outcome.done():
+                        break
+                    if outcome.exception() is not None:
+                        errors.append(outcome.exception())
+                        continue
+                    outcome = outcome.result()
+                if outcome:
+                    return search, outcome
+            else:
+                # Every strategy finished without a hit
+                if errors and len(errors) == len(outcomes):
+                    raise errors[0]
+                return None
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+    finally:
+        for future in futures:
+            future.cancel()
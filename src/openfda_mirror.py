@@ -0,0 +1,380 @@
+"""Local mirror of openFDA drug events, built from the bulk download files.
+
+The bulk export (https://open.fda.gov/data/downloads/, drug/event) is a set
+of zip files, each holding one large JSON document. They are stream-parsed
+one report at a time and only the fields get_adverse_events shows are kept:
+
+- events: safetyreportid, receivedate, serious, reactions, drugs
+- products / event_products: medicinalproduct -> events, indexed by
+  (product, receivedate) so "most recent N events for X" is an index walk
+
+Set OPENFDA_BACKEND=mirror (or auto) to serve get_adverse_events from it.
+
+Usage:
+    python src/openfda_mirror.py --ingest downloads/drug-event-*.zip
+    python src/openfda_mirror.py --query TRAMADOL --limit 10
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from dotenv import load_dotenv
+from openfda_client import slim_event
+
+load_dotenv()
+
+MIRROR_PATH = os.getenv(
+    "OPENFDA_MIRROR_PATH", os.path.join("cache", "openfda_mirror.sqlite")
+)
+
+# "api": live api.fda.gov, "mirror": local store only, "auto": the mirror
+# when it has events for the drug, otherwise the API
+BACKEND = os.getenv("OPENFDA_BACKEND", "auto").lower()
+
+_RESULTS_START = re.compile(r'"results"\s*:\s*\[')
+_CHUNK_SIZE = 1 << 20
+
+
+def iter_json_array(stream, pattern=_RESULTS_START):
+    """Yield the items of the JSON array that starts where ``pattern`` matches.
+
+    Only the current item and a read-ahead chunk are held in memory, so a
+    multi-gigabyte export parses in constant space.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while True:
+        match = pattern.search(buffer)
+        if match:
+            buffer = buffer[match.end() :]
+            break
+        chunk = stream.read(_CHUNK_SIZE)
+        if not chunk:
+            return
+        # Keep a tail in case the pattern straddles two chunks
+        buffer = buffer[-64:] + chunk
+
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise ValueError("need more data")
+            item, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            chunk = stream.read(_CHUNK_SIZE)
+            if not chunk:
+                if buffer[pos:].strip():
+                    raise
+                return
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+
+
+def iter_zip_events(zip_path: str):
+    """Yield every event report in a bulk ``drug-event-*.json.zip`` file."""
+    with zipfile.ZipFile(zip_path) as archive:
+        for name in archive.namelist():
+            if name.endswith(".json"):
+                with archive.open(name) as raw:
+                    yield from iter_json_array(io.TextIOWrapper(raw, encoding="utf-8"))
+
+
+class OpenFdaMirror:
+    """SQLite store of slim event records, queried by product name."""
+
+    def __init__(self, path: str = MIRROR_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                event_id INTEGER PRIMARY KEY,
+                safetyreportid TEXT UNIQUE NOT NULL,
+                receivedate TEXT NOT NULL,
+                serious TEXT,
+                reactions TEXT NOT NULL,
+                drugs TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS products (
+                product_id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS event_products (
+                product_id INTEGER NOT NULL,
+                receivedate TEXT NOT NULL,
+                event_id INTEGER NOT NULL,
+                PRIMARY KEY (product_id, receivedate, event_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS event_products_event ON event_products (event_id);
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                events INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            );
+            """)
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._products = {}  # name -> product_id, filled during ingestion
+
+    def event_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM events").fetchone()[0]
+
+    def ingest(self, zip_path: str, batch_size: int = 5000, force: bool = False) -> int:
+        """Load one bulk zip file. Files already loaded (same size and mtime)
+        are skipped unless ``force``. Returns the number of events read."""
+        path = os.path.abspath(zip_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime FROM sources WHERE path = ?", (path,)
+            ).fetchone()
+        if row == (stat.st_size, stat.st_mtime) and not force:
+            return 0
+
+        count = 0
+        batch = []
+        for result in iter_zip_events(path):
+            if not result.get("safetyreportid"):
+                continue
+            batch.append(result)
+            if len(batch) >= batch_size:
+                count += self._write_batch(batch)
+                batch = []
+        count += self._write_batch(batch)
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (path, size, mtime, events, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime, count, time.time()),
+            )
+        return count
+
+    def _write_batch(self, results: list) -> int:
+        if not results:
+            return 0
+        with self._lock, self._db:
+            for result in results:
+                event = slim_event(result)
+                # A newer version of a report replaces the older one
+                event_id = self._db.execute(
+                    "INSERT INTO events (safetyreportid, receivedate, serious, reactions, drugs) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (safetyreportid) DO UPDATE SET receivedate = excluded.receivedate, "
+                    "serious = excluded.serious, reactions = excluded.reactions, drugs = excluded.drugs "
+                    "RETURNING event_id",
+                    (
+                        result["safetyreportid"],
+                        event["receivedate"],
+                        event["serious"],
+                        json.dumps(event["reactions"]),
+                        json.dumps(event["drugs"]),
+                    ),
+                ).fetchone()[0]
+                self._db.execute(
+                    "DELETE FROM event_products WHERE event_id = ?", (event_id,)
+                )
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO event_products (product_id, receivedate, event_id) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (self._product_id(name), event["receivedate"], event_id)
+                        for name in {drug.upper() for drug in event["drugs"]}
+                    ],
+                )
+        return len(results)
+
+    def _product_id(self, name: str) -> int:
+        product_id = self._products.get(name)
+        if product_id is None:
+            self._db.execute(
+                "INSERT OR IGNORE INTO products (name) VALUES (?)", (name,)
+            )
+            product_id = self._db.execute(
+                "SELECT product_id FROM products WHERE name = ?", (name,)
+            ).fetchone()[0]
+            self._products[name] = product_id
+        return product_id
+
+    def recent_events(self, drug_name: str, limit: int = 10):
+        """Most recent events for ``drug_name``, like the API's first two strategies.
+
+        Returns ``(search, events)`` for the exact product name if it has
+        events, otherwise for every product containing the name, or None.
+        """
+        name = drug_name.upper()
+        with self._lock:
+            for search, condition, value in (
+                (f"patient.drug.medicinalproduct:{name}", "name = ?", name),
+                (
+                    f"patient.drug.medicinalproduct:*{name}*",
+                    "instr(name, ?) > 0",
+                    name,
+                ),
+            ):
+                product_ids = [
+                    row[0]
+                    for row in self._db.execute(
+                        f"SELECT product_id FROM products WHERE {condition}", (value,)
+                    )
+                ]
+                if not product_ids:
+                    continue
+                events = self._recent(product_ids, limit)
+                if events:
+                    return search, events
+        return None
+
+    # Statistics the mirror can count from its slim records: name ->
+    # (value expression over events e, join)
+    COUNTABLE = {
+        "reactions": ("r.value", ", json_each(e.reactions) r"),
+        "seriousness": ("e.serious", ""),
+        "year": ("substr(e.receivedate, 1, 4)", ""),
+    }
+
+    def count_events(self, drug_name: str, statistic: str, limit: int = 10):
+        """Frequency table of ``statistic`` for ``drug_name``, like the API's count queries.
+
+        Returns ``(search, rows)`` or None. Statistics outside COUNTABLE
+        (outcome, sex, country) aren't stored and always return None.
+        """
+        if statistic not in self.COUNTABLE:
+            return None
+        value, join = self.COUNTABLE[statistic]
+        # Years are listed newest first, like the API path
+        order = "term DESC" if statistic == "year" else "count DESC, term"
+        name = drug_name.upper()
+        with self._lock:
+            for search, condition in (
+                (f"patient.drug.medicinalproduct:{name}", "p.name = ?"),
+                (f"patient.drug.medicinalproduct:*{name}*", "instr(p.name, ?) > 0"),
+            ):
+                rows = self._db.execute(
+                    f"SELECT {value} AS term, count(*) AS count FROM events e{join} "
+                    "WHERE e.event_id IN (SELECT ep.event_id FROM event_products ep "
+                    f"JOIN products p ON p.product_id = ep.product_id WHERE {condition}) "
+                    f"AND {value} IS NOT NULL GROUP BY term ORDER BY {order} LIMIT ?",
+                    (name, limit if statistic != "year" else -1),
+                ).fetchall()
+                if rows:
+                    return search, [
+                        {"term": str(term), "count": count} for term, count in rows
+                    ]
+        return None
+
+    def _recent(self, product_ids: list, limit: int) -> list:
+        if len(product_ids) == 1:
+            # One product: the (product_id, receivedate) key is already in order
+            rows = self._db.execute(
+                "SELECT e.receivedate, e.serious, e.reactions, e.drugs FROM event_products ep "
+                "JOIN events e ON e.event_id = ep.event_id "
+                "WHERE ep.product_id = ? ORDER BY ep.receivedate DESC LIMIT ?",
+                (product_ids[0], limit),
+            ).fetchall()
+        else:
+            # Top N per product, then the top N of those: never sorts more
+            # than products x N rows
+            candidates = {}
+            for product_id in product_ids:
+                for event_id, receivedate in self._db.execute(
+                    "SELECT event_id, receivedate FROM event_products "
+                    "WHERE product_id = ? ORDER BY receivedate DESC LIMIT ?",
+                    (product_id, limit),
+                ):
+                    candidates[event_id] = receivedate
+            best = sorted(candidates, key=lambda event_id: candidates[event_id])[
+                -limit:
+            ][::-1]
+            rows = []
+            if best:
+                by_id = {
+                    row[0]: row[1:]
+                    for row in self._db.execute(
+                        "SELECT event_id, receivedate, serious, reactions, drugs FROM events "
+                        f"WHERE event_id IN ({','.join('?' * len(best))})",
+                        best,
+                    )
+                }
+                rows = [by_id[event_id] for event_id in best]
+        return [
+            {
+                "receivedate": receivedate,
+                "serious": serious,
+                "reactions": json.loads(reactions),
+                "drugs": json.loads(drugs),
+            }
+            for receivedate, serious, reactions, drugs in rows
+        ]
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror():
+    """Return the process-wide mirror, or None if it hasn't been built."""
+    global _mirror
+    if _mirror is None:
+        if not os.path.exists(MIRROR_PATH):
+            return None
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = OpenFdaMirror()
+    return _mirror
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ingest", nargs="+", metavar="ZIP", help="Bulk files to load")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument(
+        "--force", action="store_true", help="Reload files already ingested"
+    )
+    parser.add_argument("--query", metavar="DRUG", help="Show recent events for a drug")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    mirror = OpenFdaMirror()
+    for zip_path in args.ingest or []:
+        start = time.perf_counter()
+        count = mirror.ingest(zip_path, args.batch_size, args.force)
+        elapsed = time.perf_counter() - start
+        if count:
+            print(f"{zip_path}: {count} events in {elapsed:.1f}s")
+        else:
+            print(f"{zip_path}: already ingested")
+
+    if args.query:
+        start = time.perf_counter()
+        found = mirror.recent_events(args.query, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not found:
+            print(f"No events for {args.query} ({elapsed:.1f} ms)")
+            return
+        search, events = found
+        print(f"{len(events)} events via {search} ({elapsed:.1f} ms)")
+        for event in events:
+            print(f"  {event['receivedate']}  {', '.join(event['reactions'][:3])}")
+    elif not args.ingest:
+        print(f"{mirror.event_count()} events in {MIRROR_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Local stand-in for the openFDA drug event API, for offline runs and checks.
+
+Usage:
+    python src/openfda_stub.py --port 8765    # then OPENFDA_BASE_URL=http://127.0.0.1:8765
+    python src/openfda_stub.py --check        # run the client against it and report
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from entities import KNOWN_DRUGS
+
+_SEARCH = re.compile(r"^([\w.]+):(\*?)([^*]+)(\*?)$")
+
+
+def make_event(drug: str, i: int) -> dict:
+    """A slim synthetic FAERS report shaped like openFDA's."""
+    reactions = ["Nausea", "Dizziness", "Headache", "Fatigue", "Rash", "Vomiting"]
+    return {
+        "safetyreportid": f"STUB-{drug}-{i:04d}",
+        "receivedate": f"2024{(i % 12) + 1:02d}{(i % 28) + 1:02d}",
+        "serious": "1" if i % 3 == 0 else "2",
+        "patient": {
+            "reaction": [
+                {"reactionmeddrapt": reactions[(i + j) % len(reactions)]}
+                for j in range(1 + i % 4)
+            ],
+            "drug": [
+                {
+                    "medicinalproduct": drug if i % 2 else f"{drug} HYDROCHLORIDE",
+                    "openfda": {
+                        "generic_name": [drug.lower()],
+                        "brand_name": [drug],
+                    },
+                },
+                {"medicinalproduct": "PARACETAMOL"},
+            ],
+        },
+    }
+
+
+def count_field(events: list, field: str) -> list:
+    """openFDA ``count=`` over ``events`` for the fields the client asks for."""
+    counts = {}
+    for event in events:
+        if field == "patient.reaction.reactionmeddrapt.exact":
+            values = [r["reactionmeddrapt"] for r in event["patient"]["reaction"]]
+        elif field == "receivedate":
+            values = [event["receivedate"]]
+        else:
+            values = [event.get(field.split(".")[-1])]
+        for value in values:
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+    if field == "receivedate":
+        return [{"time": day, "count": counts[day]} for day in sorted(counts)]
+    ranked = sorted(counts.items(), key=lambda item: -item[1])
+    return [{"term": term, "count": count} for term, count in ranked]
+
+
+class StubState:
+    """Behaviour of the stub, adjustable while it runs.
+
+    ``delays`` maps a search field to seconds of latency, ``misses`` holds
+    fields that always answer 404, and ``fail_next`` makes the next N
+    requests answer ``fail_status`` (e.g. 429 to exercise retries).
+    """
+
+    def __init__(self, drugs=None, events_per_drug: int = 50):
+        self.events = {
+            drug: [make_event(drug, i) for i in range(events_per_drug)]
+            for drug in (drugs or KNOWN_DRUGS)
+        }
+        self.delays = {}
+        self.misses = set()
+        self.fail_next = 0
+        self.fail_status = 503
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.delays, self.misses, self.fail_next = {}, set(), 0
+            self.requests = []
+
+    def search(self, expression: str) -> list:
+        match = _SEARCH.match(expression)
+        if not match:
+            return []
+        field, prefix, value, suffix = match.groups()
+        value = value.upper()
+        if field in self.misses:
+            return []
+        results = []
+        for drug, events in self.events.items():
+            wildcard = bool(prefix or suffix)
+            if (value in drug) if wildcard else (value == drug):
+                results.extend(events)
+        return sorted(results, key=lambda event: event["receivedate"], reverse=True)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        state = self.state
+        with state.lock:
+            state.requests.append((time.time(), params.get("search", "")))
+            failing = state.fail_next > 0
+            if failing:
+                state.fail_next -= 1
+
+        if failing:
+            return self._reply(state.fail_status, {"error": {"code": "STUB_FAILURE"}})
+        if url.path != "/drug/event.json":
+            return self._reply(404, {"error": {"code": "NOT_FOUND"}})
+
+        search = params.get("search", "")
+        field = search.split(":", 1)[0]
+        time.sleep(state.delays.get(field, 0))
+
+        results = state.search(search)
+        if not results:
+            return self._reply(404, {"error": {"code": "NOT_FOUND"}})
+        limit = int(params.get("limit", 1))
+        if "count" in params:
+            return self._reply(
+                200, {"results": count_field(results, params["count"])[:limit]}
+            )
+        skip = int(params.get("skip", 0))
+        self._reply(
+            200,
+            {
+                "meta": {
+                    "results": {"skip": skip, "limit": limit, "total": len(results)}
+                },
+                "results": results[skip : skip + limit],
+            },
+        )
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port: int = 0, state: StubState = None):
+    """Serve the stub on a background thread. Returns ``(server, state)``;
+    the base URL is ``http://127.0.0.1:{server.server_port}``."""
+    state = state or StubState()
+    handler = type("Handler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def run_check():
+    """Exercise the openFDA client against the stub and print what happened."""
+    server, state = start_stub()
+    os.environ["OPENFDA_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    import openfda_client
+    from cache import TTLCache
+
+    openfda_client.BASE_URL = os.environ["OPENFDA_BASE_URL"]
+    # Memory-only cache so the scenarios never touch the real cache file
+    cache = openfda_client.EVENT_CACHE = TTLCache(ttl=60, stale_ttl=60)
+
+    def scenario(name, drug, expect_field, setup=None, keep_cache=False, call=None):
+        state.reset()
+        if not keep_cache:
+            cache.clear()
+        if setup:
+            setup()
+        start = time.perf_counter()
+        try:
+            call = call or (lambda drug: openfda_client.search_adverse_events(drug, 5))
+            result = call(drug)
+        except Exception as e:
+            result = e
+        elapsed = (time.perf_counter() - start) * 1000
+        field = result[0].split(":", 1)[0] if isinstance(result, tuple) else None
+        ok = field == expect_field
+        print(
+            f"{'PASS' if ok else 'FAIL'}  {name:<48}{elapsed:>8.0f} ms  "
+            f"{len(state.requests)} requests  -> {field or result}"
+        )
+        return ok
+
+    def slow_fallbacks():
+        # Lower-priority strategies are slow; the exact match must not wait
+        state.delays.update(
+            {
+                "patient.drug.openfda.generic_name": 1.0,
+                "patient.drug.openfda.brand_name": 1.0,
+            }
+        )
+
+    def exact_miss_slow():
+        state.misses.add("patient.drug.medicinalproduct")
+        state.delays["patient.drug.openfda.generic_name"] = 0.3
+
+    def rate_limited():
+        state.fail_next, state.fail_status = 2, 429
+
+    def server_errors():
+        state.fail_next, state.fail_status = 2, 503
+
+    def expired_entries():
+        cache.ttl = 0
+        openfda_client.search_adverse_events("ASPIRIN", limit=5)
+        cache.ttl = 60
+        state.requests.clear()
+
+    results = [
+        scenario(
+            "exact name found",
+            "TRAMADOL",
+            "patient.drug.medicinalproduct",
+            slow_fallbacks,
+        ),
+        scenario(
+            "exact miss falls through in one round trip",
+            "TRAMADOL",
+            "patient.drug.openfda.generic_name",
+            exact_miss_slow,
+        ),
+        scenario(
+            "429s retried with backoff",
+            "ASPIRIN",
+            "patient.drug.medicinalproduct",
+            rate_limited,
+        ),
+        scenario(
+            "503s retried with backoff",
+            "ASPIRIN",
+            "patient.drug.medicinalproduct",
+            server_errors,
+        ),
+        scenario("unknown drug", "NOTADRUG", None),
+        scenario(
+            "reaction counts in one response",
+            "TRAMADOL",
+            "patient.drug.medicinalproduct",
+            call=lambda drug: openfda_client.count_adverse_events(drug, "reactions", 5),
+        ),
+        scenario(
+            "repeat served from cache",
+            "ASPIRIN",
+            "patient.drug.medicinalproduct",
+            lambda: openfda_client.search_adverse_events("ASPIRIN", limit=5)
+            and state.requests.clear(),
+        ),
+        scenario(
+            "expired entry served stale",
+            "ASPIRIN",
+            "patient.drug.medicinalproduct",
+            expired_entries,
+        ),
+    ]
+    time.sleep(0.2)
+    stats = cache.stats()
+    print(
+        f"Cache: {stats['hits']} hits ({stats['stale_hits']} stale), "
+        f"{stats['misses']} misses, {stats['refreshes']} background refreshes"
+    )
+    server.shutdown()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--check", action="store_true", help="Run the client checks and exit"
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(0 if run_check() else 1)
+
+    server, _ = start_stub(args.port)
+    print(f"openFDA stub on http://127.0.0.1:{server.server_port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import bisect
+import json
+import math
+import re
+import zlib
+from collections import defaultdict
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Lines of context shown on each side of a matching line
+CONTEXT_LINES = 2
+
+_TOKEN = re.compile(r"\w+(?:[.,']\w+)*")
+_PHRASE = re.compile(r'"([^"]+)"')
+
+STOPWORDS = frozenset("""
+    a about above after again against all am an and any are as at be because been
+    before being below between both but by can could did do does doing down during
+    each few for from further had has have having he her here hers herself him
+    himself his how i if in into is it its itself just me more most my myself no
+    nor not now of off on once only or other our ours ourselves out over own same
+    she should so some such than that the their theirs them themselves then there
+    these they this those through to too under until up very was we were what when
+    where which while who whom why will with would you your yours yourself
+    yourselves page
+    """.split())
+
+
+def stem(token: str) -> str:
+    """Fold plurals so "report" finds "reports" and "companies" finds "company"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("es") and token[-3] in "sxz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list:
+    return [stem(token) for token in _TOKEN.findall(text.lower())]
+
+
+class LineIndex:
+    """Positional inverted index over the lines of one document.
+
+    Every line is a BM25 "document". Token positions run continuously through
+    the document, so phrases that wrap onto the next line are still found.
+    """
+
+    def __init__(self, lines, postings):
+        # lines: [page_num, line_in_page, text, first_position, token_count]
+        self.lines = lines
+        # postings: term -> {line_id: [positions]}
+        self.postings = postings
+        self.total_tokens = sum(line[4] for line in lines)
+        self._line_starts = [line[3] for line in lines]
+
+    @classmethod
+    def build(cls, pages):
+        """Build the index from ``[(page_num, text), ...]``."""
+        lines = []
+        postings = defaultdict(lambda: defaultdict(list))
+        position = 0
+        for page_num, page_text in pages:
+            for line_in_page, line in enumerate(page_text.split("\n")):
+                line_id = len(lines)
+                tokens = tokenize(line)
+                lines.append([page_num, line_in_page, line, position, len(tokens)])
+                for offset, token in enumerate(tokens):
+                    if token not in STOPWORDS:
+                        postings[token][line_id].append(position + offset)
+                position += len(tokens)
+        return cls(lines, {term: dict(hits) for term, hits in postings.items()})
+
+    def to_bytes(self) -> bytes:
+        postings = {
+            term: [[line_id, positions] for line_id, positions in hits.items()]
+            for term, hits in self.postings.items()
+        }
+        return zlib.compress(json.dumps([self.lines, postings]).encode())
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        lines, postings = json.loads(zlib.decompress(data))
+        return cls(
+            lines,
+            {
+                term: {line_id: positions for line_id, positions in hits}
+                for term, hits in postings.items()
+            },
+        )
+
+    def document_frequency(self, term: str) -> int:
+        return len(self.postings.get(term, ()))
+
+    def score_lines(self, terms, phrases, idf, avgdl) -> dict:
+        """BM25 score per line for ``terms``, plus a bonus for each phrase hit.
+
+        ``idf`` maps term -> inverse document frequency; passing it in lets a
+        corpus of documents share one set of statistics.
+        """
+        scores = defaultdict(float)
+        for term in terms:
+            for line_id, positions in self.postings.get(term, {}).items():
+                tf = len(positions)
+                length = self.lines[line_id][4] or 1
+                norm = K1 * (1 - B + B * length / avgdl)
+                scores[line_id] += idf[term] * tf * (K1 + 1) / (tf + norm)
+
+        for phrase in phrases:
+            bonus = sum(idf.get(term, 0.0) for term, _ in phrase)
+            for line_id in self._phrase_lines(phrase):
+                scores[line_id] += bonus
+        return scores
+
+    def _phrase_lines(self, phrase):
+        """Lines where ``phrase`` ([(term, offset), ...]) starts."""
+        first_term, first_offset = phrase[0]
+        hits = set()
+        for positions in self.postings.get(first_term, {}).values():
+            for position in positions:
+                start = position - first_offset
+                if all(
+                    self._has_position(term, start + offset)
+                    for term, offset in phrase[1:]
+                ):
+                    hits.add(self._line_of(position))
+        return hits
+
+    def _has_position(self, term, position):
+        line_positions = self.postings.get(term, {}).get(self._line_of(position), ())
+        return position in line_positions
+
+    def _line_of(self, position):
+        return bisect.bisect_right(self._line_starts, position) - 1
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Top-``k`` line windows for ``query`` as ``(score, page_num, context)``."""
+        terms, phrases = parse_query(query)
+        n = len(self.lines)
+        if not terms or not n:
+            return []
+        idf = {term: bm25_idf(n, self.document_frequency(term)) for term in terms}
+        avgdl = self.total_tokens / n or 1
+        return self.windows(self.score_lines(terms, phrases, idf, avgdl), k)
+
+    def windows(self, scores: dict, k: int) -> list:
+        """Turn line scores into the ``k`` best non-overlapping context windows."""
+        results = []
+        taken = set()
+        for line_id, score in sorted(scores.items(), key=lambda item: -item[1]):
+            if line_id in taken:
+                continue
+            page_num = self.lines[line_id][0]
+            window = [
+                other
+                for other in range(line_id - CONTEXT_LINES, line_id + CONTEXT_LINES + 1)
+                if 0 <= other < len(self.lines) and self.lines[other][0] == page_num
+            ]
+            taken.update(window)
+            context = "\n".join(self.lines[other][2] for other in window)
+            results.append((score, page_num, context))
+            if len(results) >= k:
+                break
+        return results
+
+
+def bm25_idf(num_lines: int, df: int) -> float:
+    return math.log(1 + (num_lines - df + 0.5) / (df + 0.5))
+
+
+def parse_query(query: str):
+    """Split ``query`` into BM25 terms and phrases.
+
+    Quoted parts are phrases; an unquoted multi-word query is also tried as a
+    phrase so exact sentence lookups rank first. Phrases are lists of
+    ``(term, offset)`` with stopwords dropped but counted in the offsets.
+    """
+    quoted = _PHRASE.findall(query)
+    phrase_texts = quoted or [query]
+
+    phrases = []
+    for text in phrase_texts:
+        tokens = tokenize(text)
+        phrase = [
+            (token, offset)
+            for offset, token in enumerate(tokens)
+            if token not in STOPWORDS
+        ]
+        if len(tokens) > 1 and phrase:
+            phrases.append(phrase)
+
+    terms = list(dict.fromkeys(t for t in tokenize(query) if t not in STOPWORDS))
+    return terms, phrases
+
+
+def search_corpus(documents, query: str, k: int = 10, boosts=None) -> list:
+    """Top-``k`` windows across several documents, ranked together.
+
+    ``documents`` is ``[(doc, LineIndex), ...]``; results are
+    ``(score, doc, page_num, context)``. IDF and average line length come from
+    the whole corpus so scores are comparable between documents. ``boosts``
+    optionally maps doc -> score multiplier.
+    """
+    terms, phrases = parse_query(query)
+    n = sum(len(index.lines) for _, index in documents)
+    if not terms or not n:
+        return []
+    idf = {
+        term: bm25_idf(n, sum(index.document_frequency(term) for _, index in documents))
+        for term in terms
+    }
+    avgdl = sum(index.total_tokens for _, index in documents) / n or 1
+    boosts = boosts or {}
+
+    results = []
+    for doc, index in documents:
+        boost = boosts.get(doc, 1.0)
+        scores = index.score_lines(terms, phrases, idf, avgdl)
+        results.extend(
+            (score * boost, doc, page_num, context)
+            for score, page_num, context in index.windows(scores, k)
+        )
+    results.sort(key=lambda result: -result[0])
+    return results[:k]
@@ -0,0 +1,366 @@
+import os
+import glob
+import hashlib
+import logging
+import multiprocessing
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+from pdf_index import LineIndex, search_corpus
+from pdf_vectors import VectorStore, fuse_rankings
+
+# Extracted PDF text lives here so each file is parsed once, not per tool call
+STORE_PATH = os.getenv("PDF_STORE_PATH", os.path.join("cache", "pdf_store.sqlite"))
+
+# Worker processes for ingesting a folder of PDFs (0 = one per CPU)
+INGEST_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", "0")) or os.cpu_count() or 1
+
+# How read_financial_report ranks passages: "keyword" (BM25 line index),
+# "semantic" (chunk embeddings) or "hybrid" (both, fused by rank)
+SEARCH_MODE = os.getenv("PDF_SEARCH_MODE", "hybrid").lower()
+
+# Score multiplier for documents whose year is named in the query
+YEAR_BOOST = 1.5
+
+YEAR = re.compile(r"(?<!\d)(?:19[89]\d|20\d\d)(?!\d)")
+
+logger = logging.getLogger(__name__)
+
+
+def extract_pages(pdf_path: str) -> list:
+    """Extract ``[(page_num, text), ...]`` from a PDF (1-based page numbers)."""
+    with fitz.open(pdf_path) as doc:
+        return [(page_num, page.get_text()) for page_num, page in enumerate(doc, 1)]
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def ingest_file(pdf_path: str):
+    """Extract and index one PDF; returns ``(digest, pages, index_bytes)``.
+
+    Top-level so it can run in a worker process during corpus ingestion.
+    """
+    pages = extract_pages(pdf_path)
+    return file_digest(pdf_path), pages, LineIndex.build(pages).to_bytes()
+
+
+def document_year(path: str, pages: list):
+    """Reporting year: from the filename, else the most common year on page 1."""
+    years = YEAR.findall(os.path.basename(path))
+    if years:
+        return int(years[-1])
+    first_page = pages[0][1] if pages else ""
+    counts = Counter(YEAR.findall(first_page))
+    return int(counts.most_common(1)[0][0]) if counts else None
+
+
+class PdfStore:
+    """Per-page text and line index of ingested PDFs, persisted in SQLite.
+
+    A document is identified by its path and validated by size + mtime. If
+    those changed, the content hash decides whether the file really changed
+    (and must be re-extracted) or was only touched.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha256 TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                year INTEGER,
+                ingested_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                doc_id INTEGER NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,
+                page_num INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (doc_id, page_num)
+            );
+            CREATE TABLE IF NOT EXISTS line_indexes (
+                doc_id INTEGER PRIMARY KEY REFERENCES documents(doc_id) ON DELETE CASCADE,
+                data BLOB NOT NULL
+            );
+            """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(documents)")}
+        if "year" not in columns:
+            self._db.execute("ALTER TABLE documents ADD COLUMN year INTEGER")
+        self._db.commit()
+        self._lock = threading.Lock()
+        # path -> lock held while that file is extracted, so it is done once
+        self._ingest_locks = {}
+        # (path, size, mtime) -> (doc_id, pages), so hot files skip SQLite too
+        self._docs = {}
+        self._indexes = {}  # doc_id -> LineIndex
+        self._vector_store = None
+
+    def get_pages(self, pdf_path: str) -> list:
+        """Return ``[(page_num, text), ...]`` for ``pdf_path``, extracting only if needed."""
+        return self._document(pdf_path)[1]
+
+    def get_index(self, pdf_path: str) -> LineIndex:
+        """Return the inverted line index for ``pdf_path`` (built at ingest time)."""
+        doc_id, pages = self._document(pdf_path)
+        with self._lock:
+            index = self._indexes.get(doc_id)
+            if index is None:
+                row = self._db.execute(
+                    "SELECT data FROM line_indexes WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                if row:
+                    index = LineIndex.from_bytes(row[0])
+                else:
+                    # Documents ingested before indexing existed
+                    index = LineIndex.build(pages)
+                    with self._db:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO line_indexes (doc_id, data) VALUES (?, ?)",
+                            (doc_id, index.to_bytes()),
+                        )
+                self._indexes[doc_id] = index
+            return index
+
+    def metadata(self, pdf_path: str) -> dict:
+        """Return ``{"path", "title", "year", "page_count", "sha256"}`` for ``pdf_path``."""
+        doc_id, pages = self._document(pdf_path)
+        with self._lock:
+            path, year, page_count, digest = self._db.execute(
+                "SELECT path, year, page_count, sha256 FROM documents WHERE doc_id = ?",
+                (doc_id,),
+            ).fetchone()
+            if year is None and pages:
+                # Documents ingested before years were recorded
+                year = document_year(path, pages)
+                if year is not None:
+                    with self._db:
+                        self._db.execute(
+                            "UPDATE documents SET year = ? WHERE doc_id = ?",
+                            (year, doc_id),
+                        )
+        return {
+            "path": path,
+            "title": os.path.basename(path),
+            "year": year,
+            "page_count": page_count,
+            "sha256": digest,
+        }
+
+    def ingest_folder(self, folder: str, workers: int = INGEST_WORKERS) -> list:
+        """Make sure every PDF in ``folder`` is ingested and return their paths.
+
+        Only new or changed files are extracted. PyMuPDF extraction and index
+        building are CPU-bound, so several files are handled in parallel
+        worker processes; the results are written here, in this process.
+        Files that can't be read (corrupt, encrypted...) are logged and left
+        out of the returned paths.
+        """
+        paths = sorted(
+            os.path.abspath(path) for path in glob.glob(os.path.join(folder, "*.pdf"))
+        )
+        with self._lock:
+            stats = {path: os.stat(path) for path in paths}
+            stale = [path for path in paths if self._current(path, stats[path]) is None]
+
+        failed = set()
+        if len(stale) > 1 and workers > 1:
+            # spawn: forking a process that runs Streamlit/driver threads isn't safe
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(stale)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                futures = [pool.submit(ingest_file, path) for path in stale]
+                for path, future in zip(stale, futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed.add(path)
+                        logger.warning("Skipping unreadable PDF %s: %s", path, e)
+                        continue
+                    with self._lock:
+                        self._save(path, stats[path], *result)
+                        self._forget(path)
+        else:
+            for path in stale:
+                try:
+                    self._document(path)
+                except Exception as e:
+                    failed.add(path)
+                    logger.warning("Skipping unreadable PDF %s: %s", path, e)
+        return [path for path in paths if path not in failed]
+
+    def search_corpus(
+        self, paths: list, query: str, k: int = 10, mode: str = SEARCH_MODE
+    ) -> list:
+        """Top-``k`` passages for ``query`` across ``paths``, ranked together.
+
+        Returns ``(score, metadata, page_num, context)`` tuples. ``mode`` is
+        "keyword", "semantic" or "hybrid". Documents whose year is named in
+        the query get a boost, so "revenue 2022" prefers the 2022 report over
+        a later one that quotes the same figure.
+        """
+        documents = {path: self.metadata(path) for path in paths}
+        years = {int(year) for year in YEAR.findall(query)}
+        boosts = {
+            path: YEAR_BOOST
+            for path, meta in documents.items()
+            if meta["year"] in years
+        }
+
+        keyword, semantic = [], []
+        if mode != "semantic":
+            keyword = search_corpus(
+                [(path, self.get_index(path)) for path in paths], query, k, boosts
+            )
+        if mode != "keyword":
+            semantic = [
+                (score * boosts.get(path, 1.0), path, page_num, text)
+                for score, path, page_num, text in self.vectors().search(
+                    [
+                        (path, documents[path]["sha256"], self.get_pages(path))
+                        for path in paths
+                    ],
+                    query,
+                    k,
+                )
+            ]
+            semantic.sort(key=lambda result: -result[0])
+
+        if mode == "hybrid":
+            matches = fuse_rankings(keyword, semantic, k)
+        else:
+            matches = keyword or semantic
+        return [
+            (score, documents[path], page_num, context)
+            for score, path, page_num, context in matches
+        ]
+
+    def vectors(self) -> VectorStore:
+        """Chunk embeddings for semantic search, created on first use."""
+        with self._lock:
+            if self._vector_store is None:
+                self._vector_store = VectorStore()
+            return self._vector_store
+
+    def _document(self, pdf_path: str):
+        """Return ``(doc_id, pages)`` for the current version of ``pdf_path``."""
+        path = os.path.abspath(pdf_path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            if key in self._docs:
+                return self._docs[key]
+            ingest_lock = self._ingest_locks.setdefault(path, threading.Lock())
+
+        # The store lock is only held for SQLite work, so searches don't wait
+        # while PyMuPDF extracts a file
+        with ingest_lock:
+            with self._lock:
+                if key in self._docs:
+                    return self._docs[key]
+                doc_id = self._current(path, stat)
+                if doc_id is not None:
+                    pages = self._load(doc_id)
+
+            if doc_id is None:
+                digest, pages, index_data = ingest_file(path)
+                with self._lock:
+                    doc_id = self._save(path, stat, digest, pages, index_data)
+
+            with self._lock:
+                # Only the current version of each file is kept in memory
+                self._forget(path)
+                self._docs[key] = (doc_id, pages)
+            return doc_id, pages
+
+    def _current(self, path, stat):
+        """doc_id of the stored version of ``path`` if it is still current, else None."""
+        row = self._db.execute(
+            "SELECT doc_id, size, mtime, sha256 FROM documents WHERE path = ?",
+            (path,),
+        ).fetchone()
+        if not row:
+            return None
+        if (row[1], row[2]) == (stat.st_size, stat.st_mtime):
+            return row[0]
+        if row[3] != file_digest(path):
+            return None
+        # Touched but unchanged: just record the new size/mtime
+        self._db.execute(
+            "UPDATE documents SET size = ?, mtime = ? WHERE doc_id = ?",
+            (stat.st_size, stat.st_mtime, row[0]),
+        )
+        self._db.commit()
+        return row[0]
+
+    def _forget(self, path):
+        for cached_key in [k for k in self._docs if k[0] == path]:
+            self._indexes.pop(self._docs.pop(cached_key)[0], None)
+
+    def _load(self, doc_id: int) -> list:
+        return self._db.execute(
+            "SELECT page_num, text FROM pages WHERE doc_id = ? ORDER BY page_num",
+            (doc_id,),
+        ).fetchall()
+
+    def _save(self, path, stat, digest, pages, index_data):
+        with self._db:
+            for table in ("pages", "line_indexes"):
+                self._db.execute(
+                    f"DELETE FROM {table} WHERE doc_id IN (SELECT doc_id FROM documents WHERE path = ?)",
+                    (path,),
+                )
+            self._db.execute("DELETE FROM documents WHERE path = ?", (path,))
+            cursor = self._db.execute(
+                "INSERT INTO documents (path, size, mtime, sha256, page_count, year, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path,
+                    stat.st_size,
+                    stat.st_mtime,
+                    digest,
+                    len(pages),
+                    document_year(path, pages),
+                    time.time(),
+                ),
+            )
+            self._db.executemany(
+                "INSERT INTO pages (doc_id, page_num, text) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, page_num, text) for page_num, text in pages],
+            )
+            self._db.execute(
+                "INSERT INTO line_indexes (doc_id, data) VALUES (?, ?)",
+                (cursor.lastrowid, index_data),
+            )
+        return cursor.lastrowid
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_pdf_store() -> PdfStore:
+    """Return the process-wide PDF store, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PdfStore()
+    return _store
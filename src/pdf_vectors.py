@@ -0,0 +1,289 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+import numpy as np
+from pdf_index import STOPWORDS, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Chunk embeddings are stored here as float32 .npy files and memory-mapped
+VECTOR_DIR = os.getenv("PDF_VECTOR_DIR", os.path.join("cache", "pdf_vectors"))
+
+# Optional local sentence-transformers model (e.g. "all-MiniLM-L6-v2"). It
+# must already be downloaded; without it the offline hashing embedder is used.
+EMBEDDING_MODEL = os.getenv("PDF_EMBEDDING_MODEL", "")
+
+# Chunks are windows of CHUNK_WORDS words, each overlapping the previous one
+CHUNK_WORDS = 80
+CHUNK_OVERLAP = 30
+
+# Constant for reciprocal rank fusion in hybrid search
+RRF_K = 60
+
+_WORD = re.compile(r"\S+")
+
+# Words that mean the same thing in a financial report. Each word also
+# emits its group's feature, so "how much money did they make" lands near
+# "revenue" and "sales" even though no word is shared.
+CONCEPTS = {
+    "revenue": "revenue sale turnover income money earn earned make made",
+    "profit": "profit earning ebitda margin profitable profitability",
+    "growth": "growth grow grew increase increased rise rose up",
+    "decline": "decline declined decrease decreased fall fell drop dropped loss",
+    "employee": "employee staff workforce headcount people worker",
+    "location": "headquarter headquartered based located office seat",
+    "leader": "ceo chairman chief executive leader head",
+    "investment": "investment invest invested spend spent spending expenditure",
+    "research": "research r&d development pipeline innovation",
+    "country": "country market region affiliate international",
+}
+_CONCEPT_OF = {
+    word: concept for concept, words in CONCEPTS.items() for word in words.split()
+}
+
+
+def chunk_pages(pages, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP):
+    """Split ``[(page_num, text), ...]`` into overlapping ``(page_num, text)`` windows.
+
+    Windows never cross a page, so every chunk keeps a single page number.
+    The chunk text is sliced from the page, so line breaks survive.
+    """
+    chunks = []
+    step = max(size - overlap, 1)
+    for page_num, page_text in pages:
+        words = list(_WORD.finditer(page_text))
+        for start in range(0, len(words), step):
+            window = words[start : start + size]
+            chunks.append(
+                (page_num, page_text[window[0].start() : window[-1].end()].strip())
+            )
+            if start + size >= len(words):
+                break
+    return chunks
+
+
+class HashingEmbedder:
+    """Offline embedder: word, concept and character n-gram features hashed
+    into a fixed number of dimensions. Needs no model and no network."""
+
+    dim = 4096
+    name = "hashing-4096"
+    uses_idf = True
+
+    # Relative weight of each feature kind
+    WORD, CONCEPT, NGRAM = 1.0, 2.0, 0.25
+
+    def features(self, text: str) -> dict:
+        """Feature -> weight, with sublinear term frequency per feature."""
+        counts = Counter()
+        for token in tokenize(text):
+            if token in STOPWORDS:
+                continue
+            counts[("w", token)] += 1
+            if token in _CONCEPT_OF:
+                counts[("c", _CONCEPT_OF[token])] += 1
+            # Character 4-grams: "headquarters" still overlaps "headquartered"
+            padded = f"<{token}>"
+            for i in range(len(padded) - 3):
+                counts[("g", padded[i : i + 4])] += 1
+        weights = {"w": self.WORD, "c": self.CONCEPT, "g": self.NGRAM}
+        return {
+            f"{kind}:{feature}": weights[kind] * (1.0 + math.log(count))
+            for (kind, feature), count in counts.items()
+        }
+
+    def embed(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text).items():
+                h = zlib.crc32(feature.encode())
+                # The sign bit keeps colliding features from only ever adding up
+                sign = 1.0 if h & 1 else -1.0
+                matrix[row, (h >> 1) % self.dim] += sign * weight
+        return _normalize(matrix)
+
+
+class SentenceEmbedder:
+    """Local sentence-transformers model, run on the CPU."""
+
+    uses_idf = False
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = "st-" + re.sub(r"\W+", "-", model_name)
+
+    def embed(self, texts: list) -> np.ndarray:
+        return self.model.encode(
+            texts, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class ChunkVectors:
+    """Embedded chunks of one document: a (chunks x dim) float32 matrix plus
+    the per-dimension count of chunks that use it (for IDF weighting)."""
+
+    def __init__(self, chunks, matrix, df):
+        self.chunks = chunks
+        self.matrix = matrix
+        self.df = df
+
+    def top_k(self, query_vector: np.ndarray, k: int):
+        """``(score, chunk_id)`` pairs of the ``k`` best chunks, best first."""
+        if not len(self.chunks):
+            return []
+        scores = self.matrix @ query_vector
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), int(i)) for i in best if scores[i] > 0]
+
+
+class VectorStore:
+    """Chunk embeddings on disk, one set per document version and embedder.
+
+    Files are named after the document's content hash, so a changed PDF
+    gets new vectors and the old ones are simply no longer read.
+    """
+
+    def __init__(self, directory: str = VECTOR_DIR, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or get_embedder()
+        self._vectors = {}
+        self._lock = threading.Lock()
+
+    def get(self, digest: str, pages: list) -> ChunkVectors:
+        """Return the chunk vectors for a document, embedding it on first use."""
+        with self._lock:
+            vectors = self._vectors.get(digest)
+            if vectors is None:
+                vectors = self._load(digest) or self._build(digest, pages)
+                self._vectors[digest] = vectors
+            return vectors
+
+    def search(self, documents, query: str, k: int = 10) -> list:
+        """Top-``k`` chunks across ``documents`` as ``(score, doc, page_num, text)``.
+
+        ``documents`` is ``[(doc, digest, pages), ...]``. Each document costs
+        one matrix-vector product against its memory-mapped matrix.
+        """
+        vectors = [(doc, self.get(digest, pages)) for doc, digest, pages in documents]
+        query_vector = self.embedder.embed([query])[0]
+        if self.embedder.uses_idf:
+            # Weight the query by corpus-wide IDF so rare words dominate
+            n = sum(len(v.chunks) for _, v in vectors)
+            df = sum(v.df for _, v in vectors)
+            query_vector = query_vector * (np.log((1 + n) / (1 + df)) + 1)
+            query_vector = _normalize(query_vector[None, :])[0]
+
+        results = []
+        for doc, v in vectors:
+            for score, chunk_id in v.top_k(query_vector, k):
+                page_num, text = v.chunks[chunk_id]
+                results.append((score, doc, page_num, text))
+        results.sort(key=lambda result: -result[0])
+        return results[:k]
+
+    def _paths(self, digest):
+        base = os.path.join(self.directory, f"{digest}-{self.embedder.name}")
+        return base + ".npy", base + ".df.npy", base + ".json"
+
+    def _load(self, digest):
+        matrix_path, df_path, chunks_path = self._paths(digest)
+        try:
+            with open(chunks_path, encoding="utf-8") as f:
+                chunks = [tuple(chunk) for chunk in json.load(f)]
+            matrix = np.load(matrix_path, mmap_mode="r")
+            df = np.load(df_path)
+        except (OSError, ValueError):
+            return None
+        return ChunkVectors(chunks, matrix, df)
+
+    def _build(self, digest, pages):
+        chunks = chunk_pages(pages)
+        if chunks:
+            matrix = self.embedder.embed([text for _, text in chunks])
+        else:
+            matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        df = (matrix != 0).sum(axis=0).astype(np.float32)
+
+        # Write to temp files and rename, so other processes never read a
+        # half-written file
+        os.makedirs(self.directory, exist_ok=True)
+        matrix_path, df_path, chunks_path = self._paths(digest)
+        for path, save in (
+            (matrix_path, lambda f: np.save(f, matrix)),
+            (df_path, lambda f: np.save(f, df)),
+            (chunks_path, lambda f: f.write(json.dumps(chunks).encode("utf-8"))),
+        ):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                save(f)
+            os.replace(tmp_path, path)
+        return self._load(digest)
+
+
+def fuse_rankings(keyword: list, semantic: list, k: int = 10) -> list:
+    """Merge keyword and semantic results with reciprocal rank fusion.
+
+    Both lists hold ``(score, doc, page_num, text)``. Pages are ranked by
+    their fused score; each page shows its keyword windows if it has any,
+    otherwise its best semantic chunk.
+    """
+    fused = defaultdict(float)
+    items = defaultdict(list)
+    for results in (keyword, semantic):
+        seen = set()
+        for rank, (_, doc, page_num, text) in enumerate(results):
+            key = (doc, page_num)
+            if key not in seen:
+                seen.add(key)
+                fused[key] += 1.0 / (RRF_K + rank + 1)
+            items[key].append((results is keyword, text))
+
+    output = []
+    for key in sorted(fused, key=lambda key: -fused[key]):
+        texts = [text for from_keyword, text in items[key] if from_keyword]
+        for text in texts or [items[key][0][1]]:
+            output.append((fused[key], key[0], key[1], text))
+        if len(output) >= k:
+            break
+    return output[:k]
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Return the configured embedder, falling back to hashing when the
+    local model (or sentence-transformers itself) isn't available."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                embedder = None
+                if EMBEDDING_MODEL:
+                    try:
+                        embedder = SentenceEmbedder(EMBEDDING_MODEL)
+                    except Exception as e:
+                        logger.warning(
+                            "Embedding model '%s' unavailable (%s); using hashing embedder",
+                            EMBEDDING_MODEL,
+                            e,
+                        )
+                _embedder = embedder or HashingEmbedder()
+    return _embedder
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+
+# Process-wide objects shared by every Streamlit session. Streamlit reruns
+# main.py on each interaction, but imported modules (and so these
+# registries) live as long as the server process.
+_llms = {}  # (model, temperature) -> chat model
+_evaluators = {}  # (name, model) -> evaluator
+_graph = None
+_lock = threading.RLock()
+
+_warm_up_started = False
+warm_up_report = []  # (step, seconds, error or None), filled by warm_up()
+
+
+def get_llm(model: str = DEFAULT_MODEL, temperature: float = 0.0):
+    """Return the shared chat model for ``(model, temperature)``.
+
+    Chat model clients hold no per-conversation state, so one instance can
+    serve all sessions and threads; creating one per call only repeats the
+    client setup and loses its connection reuse.
+    """
+    key = (model, float(temperature))
+    llm = _llms.get(key)
+    if llm is None:
+        with _lock:
+            llm = _llms.get(key)
+            if llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                from token_ledger import LEDGER_CALLBACK
+
+                # Every call on the shared client is booked in the token ledger
+                llm = ChatGoogleGenerativeAI(
+                    model=model, temperature=temperature, callbacks=[LEDGER_CALLBACK]
+                )
+                _llms[key] = llm
+    return llm
+
+
+def get_evaluator(name: str = "labeled_score_string", model: str = DEFAULT_MODEL):
+    """Return the shared LangChain evaluator ``name`` backed by ``get_llm(model)``."""
+    key = (name, model)
+    evaluator = _evaluators.get(key)
+    if evaluator is None:
+        with _lock:
+            evaluator = _evaluators.get(key)
+            if evaluator is None:
+                from langchain.evaluation import load_evaluator
+
+                evaluator = load_evaluator(name, llm=get_llm(model))
+                _evaluators[key] = evaluator
+    return evaluator
+
+
+def get_agent_graph():
+    """Return the compiled agent graph, built once per process.
+
+    The graph holds no per-session state: conversations are kept apart by
+    the checkpointer's ``thread_id``, so every session can share it.
+    """
+    global _graph
+    if _graph is None:
+        with _lock:
+            if _graph is None:
+                from agent import get_agent_executor
+
+                _graph = get_agent_executor()
+    return _graph
+
+
+def warm_up(background: bool = True):
+    """Create the shared resources ahead of the first question.
+
+    Builds the graph and LLM clients, opens the Neo4j pool and ingests the
+    PDF corpus. Runs once per process; failures are recorded in
+    ``warm_up_report`` and otherwise ignored, since every resource is
+    also created lazily on first use.
+    """
+    global _warm_up_started
+    with _lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+
+    def run():
+        from neo4j_driver import get_driver
+        from pdf_store import get_pdf_store
+
+        steps = [
+            ("agent graph", get_agent_graph),
+            ("LLM client", get_llm),
+            ("evaluator", get_evaluator),
+            ("Neo4j connection pool", get_driver),
+            ("PDF corpus", lambda: get_pdf_store().ingest_folder("data")),
+        ]
+        for step, create in steps:
+            started = time.perf_counter()
+            try:
+                create()
+                error = None
+            except Exception as e:
+                error = str(e)
+            warm_up_report.append((step, time.perf_counter() - started, error))
+
+    if background:
+        threading.Thread(target=run, name="warm-up", daemon=True).start()
+    else:
+        run()
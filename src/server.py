@@ -0,0 +1,455 @@
+"""Headless HTTP API for the agent, for programmatic use without Streamlit.
+
+Usage (from the repository root):
+    python src/server.py                        # http://127.0.0.1:8080
+    python src/server.py --port 9000 --workers 8
+
+Endpoints:
+    POST   /v1/chat               {"message": "...", "thread_id": "...", "stream": true}
+    GET    /v1/evaluations/<id>   background evaluation of an answer
+    DELETE /v1/threads/<id>       forget a conversation
+    GET    /v1/health
+    GET    /v1/stats              admission counters and turn latency
+
+A streamed turn is sent as NDJSON, one event per line: ``token`` (answer
+text as it is generated), ``tool`` (a tool started), then ``done`` with the
+full answer, or ``error``. Omitting ``thread_id`` starts a new conversation;
+the ``done`` event carries its id for the next turn.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from langchain_core.messages import HumanMessage
+from resources import get_agent_graph, warm_up
+from checkpointer import get_checkpointer
+from evaluation_queue import get_evaluation_queue
+from intent_router import ROUTER_STATS
+from token_ledger import LEDGER, attribute, content_text
+from tracing import start_metrics_server, trace_turn
+
+HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+PORT = int(os.getenv("SERVER_PORT", "8080"))
+# Turns running at once; more wait in the queue
+WORKERS = int(os.getenv("SERVER_WORKERS", "4"))
+# Turns allowed to wait for a worker; beyond this requests are shed (503)
+QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "32"))
+# Seconds a turn may wait for a worker before it is shed (503)
+QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "30"))
+# Turns one client (its address) may have running or queued at once; more
+# are refused (429)
+CLIENT_CONCURRENCY = int(os.getenv("SERVER_CLIENT_CONCURRENCY", "2"))
+# Identify clients by their X-Client-Id header instead of their address.
+# Only for a trusted proxy that sets the header itself: anyone else can
+# send a new id per request to get past CLIENT_CONCURRENCY.
+TRUST_CLIENT_ID = os.getenv("SERVER_TRUST_CLIENT_ID", "0").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+# Seconds a turn may run before it is cancelled
+TURN_TIMEOUT = float(os.getenv("SERVER_TURN_TIMEOUT", "120"))
+MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", str(64 * 1024)))
+
+
+class Rejected(Exception):
+    """A request refused with an HTTP status (and optional Retry-After)."""
+
+    def __init__(self, status: int, message: str, retry_after: int = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Admission:
+    """Admission control in front of the graph.
+
+    ``workers`` turns run at once and up to ``queue_size`` more wait for a
+    slot, in arrival order. A request is refused straight away when its
+    client already has ``per_client`` turns in flight (429), when its
+    conversation already has a turn running (409), or when the queue is
+    full (503); a queued turn that waits longer than ``queue_timeout`` is
+    shed (503). Refusals carry a Retry-After estimated from recent turns.
+    """
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        queue_size: int = QUEUE_SIZE,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        per_client: int = CLIENT_CONCURRENCY,
+    ):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.per_client = per_client
+        self.active = 0
+        self.waiting = 0
+        self.stats = dict.fromkeys(
+            (
+                "accepted",
+                "completed",
+                "failed",
+                "rejected_client",
+                "rejected_thread",
+                "shed_queue_full",
+                "shed_timeout",
+            ),
+            0,
+        )
+        self.turn_seconds = deque(maxlen=1000)
+        self.queue_seconds = deque(maxlen=1000)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._clients = Counter()
+        self._threads = set()
+
+    def retry_after(self) -> int:
+        """Seconds until a worker is likely free, from recent turn times."""
+        recent = list(self.turn_seconds)[-50:]
+        average = sum(recent) / len(recent) if recent else 1.0
+        return max(1, round(average * (self.waiting + 1) / self.workers))
+
+    @asynccontextmanager
+    async def slot(self, client: str, thread_id: str):
+        """Hold a worker slot for one turn, or raise ``Rejected``."""
+        if self._clients[client] >= self.per_client:
+            self.stats["rejected_client"] += 1
+            raise Rejected(
+                429, "Too many concurrent requests from this client", self.retry_after()
+            )
+        if thread_id in self._threads:
+            self.stats["rejected_thread"] += 1
+            raise Rejected(409, "A turn is already running for this thread")
+        if self._slots.locked() and self.waiting >= self.queue_size:
+            self.stats["shed_queue_full"] += 1
+            raise Rejected(503, "Server busy", self.retry_after())
+
+        self._clients[client] += 1
+        self._threads.add(thread_id)
+        try:
+            queued = time.perf_counter()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["shed_timeout"] += 1
+                raise Rejected(
+                    503, "Timed out waiting for a worker", self.retry_after()
+                )
+            finally:
+                self.waiting -= 1
+            self.queue_seconds.append(time.perf_counter() - queued)
+
+            self.stats["accepted"] += 1
+            self.active += 1
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self._slots.release()
+                self.turn_seconds.append(time.perf_counter() - started)
+        finally:
+            self._clients[client] -= 1
+            if not self._clients[client]:
+                del self._clients[client]
+            self._threads.discard(thread_id)
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "waiting": self.waiting,
+            "queue_size": self.queue_size,
+            "clients": len(self._clients),
+            **self.stats,
+            "turn_seconds": _percentiles(self.turn_seconds),
+            "queue_seconds": _percentiles(self.queue_seconds),
+        }
+
+
+def _percentiles(values) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"p50": None, "p95": None, "n": 0}
+    return {
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "n": len(values),
+    }
+
+
+async def run_turn(graph, thread_id: str, message: str, emit):
+    """Run one turn, awaiting ``emit(event)`` for each streamed event.
+
+    Returns the ``done`` event. Like the Streamlit app, only the agent
+    node's own tokens are streamed, not LLM calls made inside tools.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    started = time.perf_counter()
+    first_token = None
+    ledger_before = LEDGER.totals(thread_id)
+    with attribute(session=thread_id), trace_turn(thread_id):
+        async for event in graph.astream_events(
+            {"messages": [HumanMessage(content=message)]}, config=config, version="v2"
+        ):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind == "on_chat_model_stream" and node == "agent":
+                text = content_text(event["data"]["chunk"].content)
+                if text:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    await emit({"event": "token", "text": text})
+            elif kind == "on_tool_start":
+                await emit({"event": "tool", "name": event["name"]})
+
+    state = (await graph.aget_state(config)).values
+    answer = content_text(state["messages"][-1].content)
+    ledger_after = LEDGER.totals(thread_id)
+    return {
+        "event": "done",
+        "thread_id": thread_id,
+        "answer": answer,
+        "evaluation_id": get_evaluation_queue().submit(thread_id, message, answer),
+        "seconds": round(time.perf_counter() - started, 3),
+        "time_to_first_token": (
+            round(first_token, 3) if first_token is not None else None
+        ),
+        "tokens": {
+            "prompt": ledger_after["prompt"] - ledger_before["prompt"],
+            "completion": ledger_after["completion"] - ledger_before["completion"],
+        },
+    }
+
+
+class AgentServer:
+    """asyncio HTTP/1.1 server, one request per connection."""
+
+    def __init__(
+        self,
+        graph=None,
+        admission: Admission = None,
+        trust_client_id: bool = TRUST_CLIENT_ID,
+    ):
+        self.graph = graph or get_agent_graph()
+        self.admission = admission or Admission()
+        self.trust_client_id = trust_client_id
+
+    async def serve(self, host: str = HOST, port: int = PORT, ready=None):
+        """Serve until cancelled. ``ready(port)`` is called once listening."""
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, headers, body = await self._read_request(reader)
+            await self._route(writer, method, path, self._client(writer, headers), body)
+        except Rejected as e:
+            await self._send_json(writer, e.status, {"error": str(e)}, e.retry_after)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # Client went away
+        except Exception as e:
+            try:
+                await self._send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    def _client(self, writer, headers) -> str:
+        """Who the per-client limit counts this request against."""
+        if self.trust_client_id and headers.get("x-client-id"):
+            return "id:" + headers["x-client-id"]
+        peer = writer.get_extra_info("peername")
+        return str(peer[0]) if peer else "unknown"
+
+    async def _route(self, writer, method, path, client, body):
+        parts = path.split("?")[0].strip("/").split("/")
+        if method == "GET" and parts == ["v1", "health"]:
+            await self._send_json(writer, 200, {"status": "ok"})
+        elif method == "GET" and parts == ["v1", "stats"]:
+            await self._send_json(
+                writer,
+                200,
+                {**self.admission.snapshot(), "router": ROUTER_STATS.stats()},
+            )
+        elif method == "GET" and parts[:2] == ["v1", "evaluations"] and len(parts) == 3:
+            evaluation = get_evaluation_queue().get(parts[2])
+            if evaluation is None:
+                raise Rejected(404, "Unknown evaluation")
+            await self._send_json(writer, 200, evaluation)
+        elif method == "DELETE" and parts[:2] == ["v1", "threads"] and len(parts) == 3:
+            get_checkpointer().delete_thread(parts[2])
+            LEDGER.forget(parts[2])
+            await self._send_json(writer, 200, {"deleted": parts[2]})
+        elif method == "POST" and parts == ["v1", "chat"]:
+            await self._chat(writer, client, body)
+        else:
+            raise Rejected(404, f"No route for {method} {path}")
+
+    async def _chat(self, writer, client, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise Rejected(400, "Body must be JSON")
+        message = request.get("message") if isinstance(request, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            raise Rejected(400, '"message" must be a non-empty string')
+        thread_id = str(request.get("thread_id") or uuid.uuid4())
+        stream = bool(request.get("stream", True))
+
+        async with self.admission.slot(client, thread_id):
+            if stream:
+                await self._start_stream(writer)
+
+                async def emit(event):
+                    await self._send_chunk(writer, event)
+
+            else:
+
+                async def emit(event):
+                    pass
+
+            try:
+                done = await asyncio.wait_for(
+                    run_turn(self.graph, thread_id, message, emit), TURN_TIMEOUT
+                )
+                self.admission.stats["completed"] += 1
+            except (ConnectionError, asyncio.CancelledError):
+                self.admission.stats["failed"] += 1
+                raise
+            except Exception as e:
+                self.admission.stats["failed"] += 1
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                error = "Turn timed out" if timed_out else str(e)
+                if not stream:
+                    raise Rejected(504 if timed_out else 500, error)
+                done = {"event": "error", "thread_id": thread_id, "error": error}
+
+            if stream:
+                await self._send_chunk(writer, done)
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+            else:
+                await self._send_json(writer, 200, done)
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise Rejected(431, "Request headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise Rejected(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise Rejected(400, "Invalid Content-Length")
+        if length < 0:
+            raise Rejected(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise Rejected(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path, headers, body
+
+    async def _send_json(self, writer, status: int, payload, retry_after: int = None):
+        data = json.dumps(payload, default=str).encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            + (f"Retry-After: {retry_after}\r\n" if retry_after else "")
+            + "Connection: close\r\n\r\n"
+        )
+        writer.write(head.encode() + data)
+        await writer.drain()
+
+    async def _start_stream(self, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+
+    async def _send_chunk(self, writer, event: dict):
+        # drain() waits while the client is slow to read, so a slow reader
+        # holds back its own turn instead of growing the write buffer
+        line = json.dumps(event, default=str).encode() + b"\n"
+        writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        await writer.drain()
+
+
+def start_in_thread(server: AgentServer, host: str = HOST, port: int = 0) -> int:
+    """Run ``server`` on its own event loop in a daemon thread (e.g. for
+    tests and load tests); returns the port it listens on."""
+    ready = threading.Event()
+    bound = []
+
+    def on_ready(actual_port):
+        bound.append(actual_port)
+        ready.set()
+
+    threading.Thread(
+        target=lambda: asyncio.run(server.serve(host, port, on_ready)),
+        name="agent-server",
+        daemon=True,
+    ).start()
+    ready.wait()
+    return bound[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--client-concurrency", type=int, default=CLIENT_CONCURRENCY)
+    parser.add_argument(
+        "--trust-client-id",
+        action="store_true",
+        default=TRUST_CLIENT_ID,
+        help="Limit clients by X-Client-Id (only behind a proxy that sets it)",
+    )
+    args = parser.parse_args()
+
+    warm_up(background=False)
+    start_metrics_server()
+    server = AgentServer(
+        admission=Admission(
+            workers=args.workers,
+            queue_size=args.queue_size,
+            per_client=args.client_concurrency,
+        ),
+        trust_client_id=args.trust_client_id,
+    )
+    print(f"Serving the agent on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Counts are tiktoken estimates with the GPT-4 encoding; LLM calls use the
+# provider's own usage metadata instead whenever the response carries it
+ENCODING_MODEL = "gpt-4"
+MESSAGE_CACHE_SIZE = 10000
+# A session's totals are dropped after this many idle seconds (0 = never);
+# beyond LEDGER_MAX_SESSIONS the least recently active go first. Their
+# tokens still count in the all-sessions totals.
+SESSION_TTL = float(os.getenv("LEDGER_SESSION_TTL", str(24 * 3600)))
+MAX_SESSIONS = int(os.getenv("LEDGER_MAX_SESSIONS", "10000"))
+
+# Who is spending tokens right now: the Streamlit session (thread_id) and
+# the component (tool name, "evaluation", ...). Context variables follow
+# the work into the graph's tasks and the tool threads.
+current_session = contextvars.ContextVar("token_session", default=None)
+current_component = contextvars.ContextVar("token_component", default=None)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """The tiktoken encoding for ``model``, looked up once per process.
+
+    Returns None when tiktoken or its encoding files are unavailable (e.g.
+    offline), in which case counts fall back to an estimate.
+    """
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def count_tokens(text, model: str = ENCODING_MODEL) -> int:
+    """Count tokens in text for a given model"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Fallback: rough estimate (1 token ≈ 4 characters)
+        return len(str(text)) // 4
+    return len(encoding.encode(str(text), disallowed_special=()))
+
+
+def content_text(content) -> str:
+    """Text of a message's content (Gemini may send a list of parts)."""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+_message_counts = OrderedDict()  # (message id, content length) -> tokens
+_message_lock = threading.Lock()
+
+
+def message_tokens(message) -> int:
+    """Token count of a message's content, memoized by message id.
+
+    Checkpointed messages keep their id across turns, so each one is
+    encoded once. The content length is part of the key because a message
+    can be replaced under the same id (e.g. a trimmed tool output).
+    """
+    text = content_text(message.content)
+    if message.id is None:
+        return count_tokens(text)
+    key = (message.id, len(text))
+    with _message_lock:
+        tokens = _message_counts.get(key)
+        if tokens is not None:
+            _message_counts.move_to_end(key)
+            return tokens
+    tokens = count_tokens(text)
+    with _message_lock:
+        _message_counts[key] = tokens
+        if len(_message_counts) > MESSAGE_CACHE_SIZE:
+            _message_counts.popitem(last=False)
+    return tokens
+
+
+class TokenLedger:
+    """Running token totals per session and per component.
+
+    Each entry counts prompt and completion tokens and the number of calls.
+    LLM calls are recorded under their component (``agent``, ``history``,
+    ``query_neo4j_database`` for its Cypher generation, ``evaluation``);
+    tool outputs, which become prompt tokens of the next agent call, are
+    recorded under ``tool:<name>``.
+
+    Sessions idle for ``session_ttl`` seconds, and the least recently
+    active beyond ``max_sessions``, are dropped, so abandoned sessions don't
+    stay in memory; their totals are folded into the all-sessions totals.
+    """
+
+    def __init__(
+        self, session_ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS
+    ):
+        self.session_ttl = session_ttl
+        self.max_sessions = max(1, max_sessions)
+        self._lock = threading.Lock()
+        # session -> component -> totals, least recently active first
+        self._sessions = OrderedDict()
+        self._last_active = {}  # session -> time.monotonic() of its last entry
+        self._evicted = {}  # component -> totals of dropped sessions
+
+    def _add(self, session, component, prompt, completion, exact):
+        now = time.monotonic()
+        with self._lock:
+            components = self._sessions.setdefault(session, {})
+            self._sessions.move_to_end(session)
+            self._last_active[session] = now
+            totals = components.setdefault(
+                component,
+                {"prompt": 0, "completion": 0, "calls": 0, "estimated_calls": 0},
+            )
+            totals["prompt"] += prompt
+            totals["completion"] += completion
+            totals["calls"] += 1
+            if not exact:
+                totals["estimated_calls"] += 1
+            self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop idle sessions and those beyond ``max_sessions``; lock held."""
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            idle = now - self._last_active[oldest]
+            if len(self._sessions) <= self.max_sessions and not (
+                self.session_ttl > 0 and idle > self.session_ttl
+            ):
+                break
+            del self._last_active[oldest]
+            _merge(self._evicted, self._sessions.pop(oldest))
+
+    def record_llm(self, prompt, completion, component=None, session=None, exact=True):
+        self._add(
+            session or current_session.get(),
+            component or current_component.get() or "llm",
+            prompt,
+            completion,
+            exact,
+        )
+
+    def record_tool(self, tool_name: str, output: str, session=None):
+        self._add(
+            session or current_session.get(),
+            f"tool:{tool_name}",
+            count_tokens(output),
+            0,
+            False,
+        )
+
+    def totals(self, session=None) -> dict:
+        """Totals for ``session`` (all sessions when None)::
+
+        {"prompt": ..., "completion": ..., "components": {name: {...}}}
+        """
+        with self._lock:
+            if session is None:
+                sessions = [self._evicted, *self._sessions.values()]
+            else:
+                sessions = [self._sessions.get(session, {})]
+            components = {}
+            for per_session in sessions:
+                _merge(components, per_session)
+        return {
+            "prompt": sum(c["prompt"] for c in components.values()),
+            "completion": sum(c["completion"] for c in components.values()),
+            "components": components,
+        }
+
+    def forget(self, session):
+        with self._lock:
+            self._sessions.pop(session, None)
+            self._last_active.pop(session, None)
+
+
+def _merge(into: dict, components: dict):
+    """Add per-component ``components`` totals to ``into``."""
+    for name, totals in components.items():
+        merged = into.setdefault(name, dict.fromkeys(totals, 0))
+        for field, value in totals.items():
+            merged[field] += value
+
+
+LEDGER = TokenLedger()
+
+
+@contextmanager
+def attribute(session=None, component=None):
+    """Record the tokens spent inside the block under ``session``/``component``
+    (either may be None to keep the surrounding value)."""
+    tokens = []
+    if session is not None:
+        tokens.append((current_session, current_session.set(session)))
+    if component is not None:
+        tokens.append((current_component, current_component.set(component)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class LedgerCallback(BaseCallbackHandler):
+    """Callback on the shared chat models that books every call in LEDGER.
+
+    The attribution is taken when the call starts: explicit
+    ``attribute(component=...)`` first, then the graph node the call runs
+    in. Completion and prompt counts come from the response's
+    ``usage_metadata`` when the provider sends it; otherwise they are
+    estimated with ``count_tokens``.
+    """
+
+    run_inline = True
+
+    def __init__(self, ledger: TokenLedger):
+        self.ledger = ledger
+        self._pending = {}  # run_id -> (session, component, estimated prompt)
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, metadata=None, **kwargs
+    ):
+        metadata = metadata or {}
+        session = current_session.get() or metadata.get("thread_id")
+        component = current_component.get() or metadata.get("langgraph_node") or "llm"
+        prompt = sum(message_tokens(m) for batch in messages for m in batch)
+        with self._lock:
+            self._pending[run_id] = (session, component, prompt)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+        session, component, prompt = pending
+        usage = None
+        completion = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or usage
+                completion += count_tokens(generation.text)
+        if usage:
+            prompt, completion = usage["input_tokens"], usage["output_tokens"]
+        self.ledger.record_llm(prompt, completion, component, session, bool(usage))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._pending.pop(run_id, None)
+
+
+LEDGER_CALLBACK = LedgerCallback(LEDGER)
@@ -1,117 +1,37 @@
 import os
-from neo4j import GraphDatabase
-import requests
-import fitz
 from langchain_community.tools import tool
 from dotenv import load_dotenv
-import tiktoken
 import json
+import hashlib
+import time
+from neo4j_driver import get_session, URI, DB
+from cache import TTLCache
+from entities import find_drug, normalize_question
+from cypher_templates import (
+    build_fallback_query,
+    parameterize_literals,
+    parse_generated_query,
+    use_fulltext_index,
+)
+from neo4j_bootstrap import fulltext_index_available
+from neo4j_aggregates import route_to_summary
+from intent_router import ROUTER_STATS, template_for
+from pdf_store import get_pdf_store
+from resources import get_llm
+from context_budget import TOOL_OUTPUT_MAX_TOKENS, truncate_text
+from tracing import span
+from openfda_client import (
+    EVENT_CACHE,
+    STATISTICS,
+    count_adverse_events,
+    search_adverse_events,
+)
+from openfda_mirror import BACKEND as OPENFDA_BACKEND, get_mirror
 
 load_dotenv()
 
 # Neo4j Tool
-URI = os.getenv("NEO4J_URI")
-AUTH = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
-DB = os.getenv("NEO4J_DATABASE")
-
-
-@tool
-def query_neo4j_database(query_description: str):
-    """Query the Neo4j pharmaceutical database with natural language using AI-generated Cypher queries.
-
-    This tool uses AI to generate appropriate Cypher queries based on the user's question
-    and the database schema. It can answer questions about drugs, manufacturers, adverse
-    events, patient demographics, and relationships between entities.
-
-    Examples:
-    - "Which manufacturers make drugs containing aspirin?"
-    - "What adverse reactions are reported for Kisqali?"
-    - "How many cases involve elderly patients?"
-    - "Which drugs are most commonly primary suspects in cases?"
-    """
-
-    # Import and use the actual LLM to generate queries
-    def get_llm_response(prompt, max_tokens=500):
-        """Generate Cypher query using the LLM."""
-        try:
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            from langchain_core.messages import HumanMessage
-
-            llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0)
-            response = llm.invoke([HumanMessage(content=prompt)])
-            return response.content.strip()
-
-        except Exception as e:
-            # Fallback logic only if LLM fails
-            query_lower = query_description.lower()
-
-            if "most" in query_lower and "suspect" in query_lower:
-                return "MATCH (c:Case)-[:IS_PRIMARY_SUSPECT]->(d:Drug) RETURN d.name as drug_name, count(c) as cases ORDER BY cases DESC LIMIT 15"
-            elif (
-                "manufacturer" in query_lower
-                or "company" in query_lower
-                or "companies" in query_lower
-            ):
-                # Check if a specific drug is mentioned
-                for word in query_description.split():
-                    # Clean the word of punctuation
-                    clean_word = word.strip(".,?!:;").upper()
-                    if len(clean_word) > 3 and clean_word in [
-                        "TRAMADOL",
-                        "ASPIRIN",
-                        "IBUPROFEN",
-                        "METFORMIN",
-                        "PFIZER",
-                        "ROCHE",
-                        "NOVARTIS",
-                    ]:
-                        if clean_word in ["PFIZER", "ROCHE", "NOVARTIS"]:
-                            # Manufacturer to drugs query
-                            return f"MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)<-[:REGISTERED]-(m:Manufacturer {{manufacturerName: '{clean_word}'}}) RETURN DISTINCT d.name as drug_name, count(c) as case_count ORDER BY case_count DESC LIMIT 10"
-                        else:
-                            # Drug to manufacturers query
-                            return f"MATCH (d:Drug {{name: '{clean_word}'}})<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)<-[:REGISTERED]-(m:Manufacturer) RETURN DISTINCT m.manufacturerName as manufacturer, count(c) as case_count ORDER BY case_count DESC LIMIT 10"
-                # Generic manufacturer query if no specific drug mentioned
-                return "MATCH (m:Manufacturer)-[:REGISTERED]->(c:Case) RETURN m.manufacturerName as manufacturer, count(c) as total_cases ORDER BY total_cases DESC LIMIT 10"
-            elif (
-                "reaction" in query_lower
-                or "adverse" in query_lower
-                or "side effect" in query_lower
-            ):
-                # Check for specific drug reactions
-                for word in query_description.split():
-                    clean_word = word.strip(".,?!:;").upper()
-                    if len(clean_word) > 3 and clean_word in [
-                        "TRAMADOL",
-                        "ASPIRIN",
-                        "IBUPROFEN",
-                        "METFORMIN",
-                    ]:
-                        return f"MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT]-(c:Case)-[:HAS_REACTION]->(r:Reaction) WHERE toLower(d.name) CONTAINS '{clean_word.lower()}' RETURN r.description as reaction, count(c) as case_count ORDER BY case_count DESC LIMIT 15"
-                # Generic reaction query
-                return "MATCH (c:Case)-[:HAS_REACTION]->(r:Reaction) RETURN r.description as reaction, count(c) as cases ORDER BY cases DESC LIMIT 15"
-            elif any(
-                word in query_lower for word in ["age group", "outcome", "demographic"]
-            ):
-                # Multi-hop queries
-                for word in query_description.split():
-                    clean_word = word.strip(".,?!:;").upper()
-                    if clean_word in ["TRAMADOL", "ASPIRIN", "IBUPROFEN", "METFORMIN"]:
-                        if "age" in query_lower:
-                            return f"MATCH (d:Drug {{name: '{clean_word}'}})<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)-[:FALLS_UNDER]->(a:AgeGroup) RETURN a.ageGroup as age_group, count(c) as case_count ORDER BY case_count DESC"
-                        elif "outcome" in query_lower:
-                            return f"MATCH (d:Drug {{name: '{clean_word}'}})<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)-[:RESULTED_IN]->(o:Outcome) RETURN o.outcome as outcome, count(c) as case_count ORDER BY case_count DESC"
-                return "MATCH (c:Case)-[:FALLS_UNDER]->(a:AgeGroup) RETURN a.ageGroup as age_group, count(c) as cases ORDER BY cases DESC LIMIT 10"
-            else:
-                return "MATCH (d:Drug) RETURN d.name as drug_name LIMIT 10"
-
-    try:
-        with GraphDatabase.driver(URI, auth=AUTH) as driver:
-            driver.verify_connectivity()
-
-            with driver.session(database=DB) as session:
-                # Get the database schema
-                schema_info = """
+NEO4J_SCHEMA = """
 Neo4j Pharmaceutical Adverse Events Database Schema:
 
 NODES:
@@ -146,28 +66,32 @@ EXAMPLE QUERIES:
    MATCH (c:Case)-[:IS_PRIMARY_SUSPECT]->(d:Drug) RETURN d.name, count(c) ORDER BY count(c) DESC
 
 2. Find manufacturers for a specific drug (exact name) - ALWAYS USE WHEN DRUG NAME MENTIONED:
-   MATCH (d:Drug {name: 'TRAMADOL'})<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)<-[:REGISTERED]-(m:Manufacturer)
+   MATCH (d:Drug {name: $drug_name})<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)<-[:REGISTERED]-(m:Manufacturer)
    RETURN DISTINCT m.manufacturerName, count(c) as case_count ORDER BY case_count DESC
 
 3. Find manufacturers for drugs containing a name (CONTAINS) - USE WHEN DRUG NAME IN QUESTION:
    MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)<-[:REGISTERED]-(m:Manufacturer)
-   WHERE toLower(d.name) CONTAINS 'tramadol'
+   WHERE toLower(d.name) CONTAINS $drug_term
    RETURN DISTINCT m.manufacturerName, count(c) as case_count ORDER BY case_count DESC
 
 4. Find reactions for a drug - ALWAYS FILTER BY DRUG NAME WHEN MENTIONED:
    MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT]-(c:Case)-[:HAS_REACTION]->(r:Reaction) 
-   WHERE toLower(d.name) CONTAINS 'tramadol' RETURN r.description, count(c) ORDER BY count(c) DESC
+   WHERE toLower(d.name) CONTAINS $drug_term RETURN r.description, count(c) ORDER BY count(c) DESC
 
 5. Count cases for a specific drug - ALWAYS INCLUDE DRUG FILTER AND COUNT:
-   MATCH (d:Drug {name: 'TRAMADOL'})<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)
+   MATCH (d:Drug {name: $drug_name})<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)
    RETURN count(DISTINCT c) AS case_count
 
 CRITICAL: When a drug name like TRAMADOL, ASPIRIN, etc. is mentioned in the question, 
 you MUST include a WHERE clause to filter for that specific drug, like:
-WHERE d.name = 'TRAMADOL' OR WHERE toLower(d.name) CONTAINS 'tramadol'
+WHERE d.name = $drug_name OR WHERE toLower(d.name) CONTAINS $drug_term
+
+PARAMETERS: Never write names or other values into the query text. Use $parameters
+(e.g. $drug_name = 'TRAMADOL', $drug_term = 'tramadol', $manufacturer_name = 'PFIZER')
+and supply their values separately.
 """
 
-                prompt = f"""
+CYPHER_PROMPT = """
 Based on the following Neo4j database schema, generate a precise Cypher query to answer this question: "{query_description}"
 
 {schema_info}
@@ -177,82 +101,193 @@ CRITICAL RULES:
 2. Use appropriate relationship types and directions as shown in examples
 3. For relationship alternatives, use the format [:REL1|REL2|REL3] (NO extra colons)
 4. ⚠️ MANDATORY: When ANY drug name is mentioned (like TRAMADOL, ASPIRIN, etc.), you MUST filter for that specific drug using either:
-   - WHERE toLower(d.name) CONTAINS 'drugname' 
-   - OR (d:Drug {{name: 'DRUGNAME'}})
+   - WHERE toLower(d.name) CONTAINS $drug_term 
+   - OR (d:Drug {{name: $drug_name}})
 5. For count/aggregation queries, use count() and return the aggregated result
 6. Include LIMIT clauses (typically 10-20 results)
 7. Use case-insensitive text matching with CONTAINS when searching by name
 8. Order results by relevance (usually count or alphabetically)
 9. Return meaningful aliases for the results
+10. Use $parameters for every name or value; never put string literals in the query
 
 DRUG FILTERING EXAMPLES:
-- "TRAMADOL manufacturers" → MUST include: WHERE toLower(d.name) CONTAINS 'tramadol'
-- "TRAMADOL side effects" → MUST include: WHERE toLower(d.name) CONTAINS 'tramadol'  
-- "reactions to TRAMADOL" → MUST include: WHERE toLower(d.name) CONTAINS 'tramadol'
+- "TRAMADOL manufacturers" → MUST include: WHERE toLower(d.name) CONTAINS $drug_term with drug_term = 'tramadol'
+- "TRAMADOL side effects" → MUST include: WHERE toLower(d.name) CONTAINS $drug_term with drug_term = 'tramadol'  
+- "reactions to TRAMADOL" → MUST include: WHERE toLower(d.name) CONTAINS $drug_term with drug_term = 'tramadol'
 
 SPECIFIC PATTERNS:
 - Drug manufacturers: MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT|IS_CONCOMITANT]-(c:Case)<-[:REGISTERED]-(m:Manufacturer) WHERE condition
 - Drug reactions: MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT|IS_SECONDARY_SUSPECT]-(c:Case)-[:HAS_REACTION]->(r:Reaction) WHERE condition  
 - Count queries: RETURN count(DISTINCT entity) AS count_alias
-- Drug filtering: WHERE d.name = 'EXACT_NAME' OR WHERE toLower(d.name) CONTAINS 'partial_name'
+- Drug filtering: WHERE d.name = $drug_name OR WHERE toLower(d.name) CONTAINS $drug_term
 
 Question: {query_description}
 
-Response format: Provide ONLY the Cypher query, no explanations.
-"""  # Get the generated query from the LLM
-                cypher_query = get_llm_response(prompt, max_tokens=500)
+Response format: Provide ONLY a JSON object with the Cypher query and its parameter values, no explanations:
+{{"query": "MATCH ... WHERE toLower(d.name) CONTAINS $drug_term RETURN ...", "params": {{"drug_term": "tramadol"}}}}
+"""
 
-                # Clean up the query (remove any markdown formatting)
-                cypher_query = cypher_query.strip()
-                if cypher_query.startswith("```"):
-                    lines = cypher_query.split("\n")
-                    cypher_query = "\n".join(lines[1:-1])
-                if cypher_query.startswith("cypher"):
-                    cypher_query = cypher_query[6:].strip()
+# Cache keys include a hash of the prompt so editing the schema/rules invalidates them
+PROMPT_HASH = hashlib.sha256((NEO4J_SCHEMA + CYPHER_PROMPT).encode()).hexdigest()[:16]
+CYPHER_CACHE = TTLCache(
+    maxsize=int(os.getenv("CYPHER_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("CYPHER_CACHE_TTL", "86400")),
+    path=os.getenv("CYPHER_CACHE_PATH") or None,
+)
 
-                # Post-process to fix common issues
-                cypher_query = post_process_query(cypher_query, query_description)
 
-                # Execute the generated query
-                try:
-                    results = session.run(cypher_query).data()
+def cache_stats() -> dict:
+    """Hit/miss counters for the tool caches, for display in the UI."""
+    return {
+        "Cypher generation": CYPHER_CACHE.stats(),
+        "openFDA events": EVENT_CACHE.stats(),
+    }
+
+
+@tool
+def query_neo4j_database(query_description: str):
+    """Query the Neo4j pharmaceutical database with natural language using AI-generated Cypher queries.
+
+    This tool uses AI to generate appropriate Cypher queries based on the user's question
+    and the database schema. It can answer questions about drugs, manufacturers, adverse
+    events, patient demographics, and relationships between entities.
+
+    Examples:
+    - "Which manufacturers make drugs containing aspirin?"
+    - "What adverse reactions are reported for Kisqali?"
+    - "How many cases involve elderly patients?"
+    - "Which drugs are most commonly primary suspects in cases?"
+    """
+
+    # Import and use the actual LLM to generate queries
+    def get_llm_response(prompt, max_tokens=500):
+        """Generate a parameterized Cypher query using the LLM.
 
-                    if results:
-                        formatted_output = f"Results for: '{query_description}'\n\n"
+        Returns a ``(query, params, from_llm)`` tuple; ``from_llm`` is False
+        when the LLM failed and a keyword template was used instead.
+        """
+        try:
+            from langchain_core.messages import HumanMessage
+
+            started = time.perf_counter()
+            with span("cypher.llm", prompt_chars=len(prompt)):
+                response = get_llm().invoke([HumanMessage(content=prompt)])
+            ROUTER_STATS.record_llm(time.perf_counter() - started)
+            return (*parse_generated_query(response.content), True)
 
-                        for i, result in enumerate(results, 1):
-                            formatted_output += f"{i}. "
+        except Exception as e:
+            # Fallback logic only if LLM fails
+            return (*build_fallback_query(query_description), False)
 
-                            # Format the result dynamically based on what keys are present
-                            result_parts = []
-                            for key, value in result.items():
-                                if value is not None:
-                                    if isinstance(value, list):
-                                        if len(value) > 5:
-                                            value = value[:5] + ["..."]
-                                        value = ", ".join(str(v) for v in value)
-                                    result_parts.append(f"{key}: {value}")
+    try:
+        with get_session() as session:
+            # Plain aggregate questions are answered from the precomputed summaries
+            with span("neo4j.route_to_summary"):
+                summary = route_to_summary(session, query_description)
+            if summary:
+                intent, summary_query, summary_params, refreshed_at = summary
+                with span("neo4j.run", source="summary") as run_span:
+                    results = session.run(summary_query, summary_params).data()
+                    run_span.set("rows", len(results))
+                if results:
+                    with span("neo4j.format", rows=len(results)):
+                        formatted_output = format_query_results(
+                            query_description, results, summary_query, summary_params
+                        )
+                    formatted_output += (
+                        f"\nSource: precomputed statistics (refreshed {refreshed_at})"
+                    )
+                    ROUTER_STATS.record("summary", intent)
+                    return truncate_to_token_limit(formatted_output)
+
+            # Known question shapes are answered from their template without
+            # asking the LLM for Cypher
+            with span("router.classify"):
+                routed = template_for(query_description)
+            if routed:
+                intent, template_query, template_params = routed
+                run_query, run_params = template_query, template_params
+                if fulltext_index_available(session):
+                    run_query, run_params = use_fulltext_index(
+                        template_query, template_params
+                    )
+                with span("neo4j.run", source="template") as run_span:
+                    results = session.run(run_query, run_params).data()
+                    run_span.set("rows", len(results))
+                if results:
+                    with span("neo4j.format", rows=len(results)):
+                        formatted_output = format_query_results(
+                            query_description, results, run_query, run_params
+                        )
+                    ROUTER_STATS.record("template", intent)
+                    return truncate_to_token_limit(formatted_output)
+                # e.g. the drug is stored under another name; let the LLM try
+                ROUTER_STATS.record_empty_template()
+
+            # Reuse a previously successful query for the same question
+            cache_key = f"{PROMPT_HASH}:{normalize_question(query_description)}"
+            cached = CYPHER_CACHE.get(cache_key)
+            from_cache = cached is not None
+            ROUTER_STATS.record("cache" if from_cache else "llm")
+
+            from_llm = False
+            if from_cache:
+                cypher_query, params = cached["query"], cached["params"]
+            else:
+                # Get the generated query from the LLM
+                with span("cypher.prompt"):
+                    prompt = CYPHER_PROMPT.format(
+                        query_description=query_description, schema_info=NEO4J_SCHEMA
+                    )
+                cypher_query, params, from_llm = get_llm_response(
+                    prompt, max_tokens=500
+                )
 
-                            formatted_output += " | ".join(result_parts) + "\n"
+                # Post-process to fix common issues
+                with span("cypher.post_process"):
+                    cypher_query, params = post_process_query(
+                        cypher_query, query_description, params
+                    )
 
-                        formatted_output += f"\nGenerated Query: {cypher_query}\n"
-                        formatted_output += f"Total results: {len(results)}"
+            # Seed CONTAINS filters on drug names from the fulltext index. This
+            # happens at execution time so cached queries still work without it.
+            run_query, run_params = cypher_query, params
+            if fulltext_index_available(session):
+                run_query, run_params = use_fulltext_index(cypher_query, params)
+
+            # Execute the generated query
+            try:
+                with span("neo4j.run", source="generated") as run_span:
+                    results = session.run(run_query, run_params).data()
+                    run_span.set("rows", len(results))
+
+                if results:
+                    # Only generated queries that ran and returned rows are
+                    # worth reusing; a fallback template used while the LLM
+                    # was failing would otherwise be pinned for the cache TTL
+                    if from_llm:
+                        CYPHER_CACHE.set(
+                            cache_key, {"query": cypher_query, "params": params}
+                        )
 
-                        return truncate_to_token_limit(
-                            formatted_output, max_tokens=2000
+                    with span("neo4j.format", rows=len(results)):
+                        formatted_output = format_query_results(
+                            query_description, results, run_query, run_params
                         )
+                    return truncate_to_token_limit(formatted_output)
 
-                    else:
-                        return f"No results found for: '{query_description}'\n\nGenerated Query: {cypher_query}\n\nTry rephrasing your question or asking about:\n- Drug manufacturers\n- Adverse reactions\n- Patient demographics\n- Case statistics"
+                else:
+                    return f"No results found for: '{query_description}'\n\nGenerated Query: {run_query}\nParameters: {json.dumps(run_params)}\n\nTry rephrasing your question or asking about:\n- Drug manufacturers\n- Adverse reactions\n- Patient demographics\n- Case statistics"
 
-                except Exception as query_error:
-                    # If the generated query fails, provide debugging info
-                    error_msg = f"Generated query failed: {str(query_error)}\n\n"
-                    error_msg += f"Generated Query: {cypher_query}\n\n"
-                    error_msg += f"Original Question: {query_description}\n\n"
-                    error_msg += "The LLM generated an invalid query. Please try rephrasing your question."
+            except Exception as query_error:
+                # If the generated query fails, provide debugging info
+                error_msg = f"Generated query failed: {str(query_error)}\n\n"
+                error_msg += f"Generated Query: {run_query}\n"
+                error_msg += f"Parameters: {json.dumps(run_params)}\n\n"
+                error_msg += f"Original Question: {query_description}\n\n"
+                error_msg += "The LLM generated an invalid query. Please try rephrasing your question."
 
-                    return error_msg
+                return error_msg
 
     except Exception as e:
         return f"Error querying Neo4j database: {str(e)}\n\nConnection details:\nURI: {URI}\nDatabase: {DB}"
@@ -263,88 +298,58 @@ Response format: Provide ONLY the Cypher query, no explanations.
 def get_adverse_events(drug_name: str, limit: int = 10):
     """What are the top 10 most recent adverse events registered for a drug containing a certain keyword in its name?"""
     try:
-        # Try multiple search strategies for better results
-        search_queries = [
-            f"patient.drug.medicinalproduct:{drug_name.upper()}",
-            f"patient.drug.medicinalproduct:*{drug_name.upper()}*",
-            f"patient.drug.openfda.generic_name:{drug_name.lower()}",
-            f"patient.drug.openfda.brand_name:*{drug_name.upper()}*",
-        ]
-
-        best_result = None
-
-        for search_query in search_queries:
-            url = f"https://api.fda.gov/drug/event.json?search={search_query}&limit={limit}&sort=receivedate:desc"
-
-            response = requests.get(url, timeout=10)
-
-            if response.status_code == 200:
-                data = response.json()
-                if "results" in data and len(data["results"]) > 0:
-                    best_result = data
-                    break
-
-        if not best_result:
+        # The local bulk-export mirror answers in milliseconds when present
+        # (OPENFDA_BACKEND=mirror|auto); otherwise all API search strategies
+        # run concurrently over one pooled session and the best that finds
+        # anything wins. API answers are cached as slim records, so repeated
+        # drugs don't go back to api.fda.gov
+        found = None
+        if OPENFDA_BACKEND != "api":
+            mirror = get_mirror()
+            if mirror is None and OPENFDA_BACKEND == "mirror":
+                return "Error fetching adverse events: the local openFDA mirror has not been built. Run: python src/openfda_mirror.py --ingest <bulk zip files>"
+            if mirror is not None:
+                found = mirror.recent_events(drug_name, limit)
+        if found is None and OPENFDA_BACKEND != "mirror":
+            found = search_adverse_events(drug_name, limit)
+        events = found[1] if found else None
+
+        if not events:
             return f"No recent adverse events found for drugs containing '{drug_name}'. This could mean:\n1. No events reported recently\n2. Drug name not found in FDA database\n3. Try a different spelling or generic name"
 
         # Extract and format the most relevant information
-        formatted_output = f"Top {len(best_result['results'])} most recent adverse events for drugs containing '{drug_name}':\n\n"
+        formatted_output = f"Top {len(events)} most recent adverse events for drugs containing '{drug_name}':\n\n"
 
-        for i, result in enumerate(best_result["results"], 1):
-            report_date = result.get("receivedate", "Unknown")
+        for i, event in enumerate(events, 1):
+            report_date = event["receivedate"]
             serious = (
                 "Serious"
-                if result.get("serious") == "1"
-                else (
-                    "Non-serious"
-                    if result.get("serious") == "2"
-                    else "Unknown severity"
-                )
+                if event["serious"] == "1"
+                else ("Non-serious" if event["serious"] == "2" else "Unknown severity")
             )
 
             # Format date for readability
             if report_date and report_date != "Unknown" and len(report_date) == 8:
-                try:
-                    formatted_date = (
-                        f"{report_date[4:6]}/{report_date[6:8]}/{report_date[:4]}"
-                    )
-                except:
-                    formatted_date = report_date
+                formatted_date = (
+                    f"{report_date[4:6]}/{report_date[6:8]}/{report_date[:4]}"
+                )
             else:
                 formatted_date = report_date
 
-            # Get patient reactions - improved extraction
-            reactions = []
-            if "patient" in result:
-                patient = result["patient"]
-                if "reaction" in patient and isinstance(patient["reaction"], list):
-                    for reaction in patient["reaction"]:
-                        if "reactionmeddrapt" in reaction:
-                            reactions.append(
-                                reaction["reactionmeddrapt"]
-                            )  # Get drug information for this event - find the specific drug that matches our search
+            reactions = list(event["reactions"])
+
+            # Find the specific drug that matches our search
             drug_info = "Unknown drug"
-            matching_drugs = []
-
-            if "patient" in result:
-                patient = result["patient"]
-                if "drug" in patient and isinstance(patient["drug"], list):
-                    # First, try to find drugs that contain our search term
-                    for drug in patient["drug"]:
-                        if "medicinalproduct" in drug:
-                            medicinal_product = drug["medicinalproduct"]
-                            if drug_name.upper() in medicinal_product.upper():
-                                matching_drugs.append(medicinal_product)
-
-                    # If we found matching drugs, use the first one
-                    if matching_drugs:
-                        drug_info = matching_drugs[0]
-                        if len(matching_drugs) > 1:
-                            drug_info += f" (and {len(matching_drugs)-1} other {drug_name.upper()}-containing drugs)"
-                    else:
-                        # Fallback: use the first drug if no specific match found
-                        if patient["drug"] and "medicinalproduct" in patient["drug"][0]:
-                            drug_info = patient["drug"][0]["medicinalproduct"]
+            matching_drugs = [
+                drug for drug in event["drugs"] if drug_name.upper() in drug.upper()
+            ]
+            if matching_drugs:
+                drug_info = matching_drugs[0]
+                if len(matching_drugs) > 1:
+                    drug_info += f" (and {len(matching_drugs)-1} other {drug_name.upper()}-containing drugs)"
+            elif event["drugs"]:
+                # Fallback: use the first drug if no specific match found
+                drug_info = event["drugs"][0]
 
             # Limit reactions to avoid too much data
             if len(reactions) > 3:
@@ -357,12 +362,55 @@ def get_adverse_events(drug_name: str, limit: int = 10):
             formatted_output += f"  Reactions: {', '.join(reactions) if reactions else 'No reactions recorded'}\n\n"
 
         # Apply token limit and return formatted string
-        return truncate_to_token_limit(formatted_output, max_tokens=2000)
+        return truncate_to_token_limit(formatted_output)
 
     except Exception as e:
         return f"Error fetching adverse events: {str(e)}"
 
 
+@tool
+def get_adverse_event_statistics(
+    drug_name: str, statistic: str = "reactions", limit: int = 10
+):
+    """How often do reactions, outcomes, etc. occur across ALL FDA adverse event reports for a drug? Use for "most common reactions to X", "how many serious reports for X", "reports per year for X".
+
+    statistic is one of: "reactions" (most common reactions), "seriousness" (serious vs non-serious), "year" (reports per year), "outcome" (reaction outcomes), "sex" (patient sex), "country" (reporting countries).
+    """
+    try:
+        statistic = statistic.lower().strip()
+        if statistic not in STATISTICS:
+            return f"Unknown statistic '{statistic}'. Choose one of: {', '.join(STATISTICS)}"
+        _, title, labels = STATISTICS[statistic]
+
+        # openFDA's count= aggregation returns one small ranked table instead
+        # of full event documents; the local mirror can count the fields it stores
+        found = None
+        if OPENFDA_BACKEND != "api":
+            mirror = get_mirror()
+            if mirror is not None:
+                found = mirror.count_events(drug_name, statistic, limit)
+        if found is None and OPENFDA_BACKEND != "mirror":
+            found = count_adverse_events(drug_name, statistic, limit)
+
+        if not found:
+            return (
+                f"No adverse event statistics found for drugs containing '{drug_name}'."
+            )
+
+        rows = found[1]
+        total = sum(row["count"] for row in rows)
+        formatted_output = f"{title} in FDA adverse event reports for drugs containing '{drug_name}':\n\n"
+        for i, row in enumerate(rows, 1):
+            term = labels.get(row["term"], row["term"])
+            # Coded statistics come back complete, so shares are meaningful
+            share = f" ({row['count'] / total:.0%})" if labels else ""
+            formatted_output += f"{i}. {term}: {row['count']:,} reports{share}\n"
+        return truncate_to_token_limit(formatted_output)
+
+    except Exception as e:
+        return f"Error fetching adverse event statistics: {str(e)}"
+
+
 # Financial Report Tool
 @tool
 def read_financial_report(query: str = ""):
@@ -371,7 +419,7 @@ def read_financial_report(query: str = ""):
     2. Search for people's names, company details, locations, etc.
     3. Answer questions about financial data, revenue, profits, etc.
     4. Extract specific text passages and their context
-    5. Search across multiple PDF files automatically
+    5. Search all PDF files together, e.g. to compare several years
 
     Examples: 'Grünenthal is headquartered', 'who wrote this report', 'revenue 2023', 'author name', 'headquarters location'
     """
@@ -395,7 +443,32 @@ def read_financial_report(query: str = ""):
             if not pdf_files:
                 return f"No PDF files found in the '{data_folder}' folder. Please place your financial report PDF in this folder.\n\nExample: {data_folder}/grunenthal_annual_report_2024.pdf"
 
-            # If multiple PDFs, try to find the best match or use the first one
+            # Corpus mode: every PDF in the folder is ingested (only new or
+            # changed files are extracted) and searched as one ranked corpus,
+            # by keyword, by meaning or both (PDF_SEARCH_MODE)
+            store = get_pdf_store()
+            with span("pdf.ingest_folder") as ingest_span:
+                corpus = store.ingest_folder(data_folder)
+                ingest_span.set("documents", len(corpus))
+            if not corpus:
+                return f"Error: none of the PDF files in the '{data_folder}' folder could be read"
+            # Readable files only
+            pdf_files = corpus
+            if query:
+                with span("pdf.search_corpus") as search_span:
+                    matches = store.search_corpus(corpus, query, k=10)
+                    search_span.set("matches", len(matches))
+                if matches:
+                    formatted_output = f"Financial Report Summary (from {len(corpus)} document{'s' if len(corpus) != 1 else ''}):\n\n"
+                    formatted_output += "\n\n".join(
+                        f"[{document['title']}"
+                        + (f" ({document['year']})" if document["year"] else "")
+                        + f", PAGE {page_num}] {context}"
+                        for _, document, page_num, context in matches
+                    )
+                    return truncate_to_token_limit(formatted_output)
+
+            # No query or nothing matched: show the most report-like file
             if len(pdf_files) == 1:
                 pdf_path = pdf_files[0]
             else:
@@ -410,134 +483,86 @@ def read_financial_report(query: str = ""):
                 if relevant_files:
                     pdf_path = relevant_files[0]  # Use first relevant file
                 else:
-                    pdf_path = pdf_files[
-                        0
-                    ]  # Fallback to first file        # Read the PDF with page tracking
-        doc = fitz.open(pdf_path)
-        text = ""
-        page_texts = []  # Store text by page for page number tracking
-
-        for page_num, page in enumerate(doc, 1):
-            page_text = page.get_text()
-            page_texts.append((page_num, page_text))
-            text += f"\n--- PAGE {page_num} ---\n" + page_text
-        doc.close()
+                    pdf_path = pdf_files[0]  # Fallback to first file
+
+        # Read the PDF with page tracking. Page text comes from the extraction
+        # store, so the PDF is only parsed the first time or after it changes
+        page_texts = get_pdf_store().get_pages(pdf_path)
+        text = "".join(
+            f"\n--- PAGE {page_num} ---\n" + page_text
+            for page_num, page_text in page_texts
+        )
 
         if not text.strip():
             return (
                 f"Error: PDF file '{pdf_path}' appears to be empty or could not be read"
             )
 
-        # If query is provided, try to find relevant sections with page numbers
-        if query and not query.endswith(".pdf"):
-            # Enhanced search to find exact phrases and provide page numbers
-            query_lower = query.lower()
-            relevant_sections = []
-
-            # Search for exact phrase first
-            for page_num, page_text in page_texts:
-                if query_lower in page_text.lower():
-                    # Find the specific line and context
-                    lines = page_text.split("\n")
-                    for i, line in enumerate(lines):
-                        if query_lower in line.lower():
-                            # Get context around the match
-                            start = max(0, i - 2)
-                            end = min(len(lines), i + 3)
-                            context = "\n".join(lines[start:end])
-                            relevant_sections.append(f"[PAGE {page_num}] {context}")
-
-            # If exact phrase not found, do keyword search
-            if not relevant_sections:
-                query_words = query_lower.split()
-                for page_num, page_text in page_texts:
-                    lines = page_text.split("\n")
-                    for i, line in enumerate(lines):
-                        line_lower = line.lower()
-                        if any(word in line_lower for word in query_words):
-                            start = max(0, i - 2)
-                            end = min(len(lines), i + 3)
-                            context = "\n".join(lines[start:end])
-                            relevant_sections.append(f"[PAGE {page_num}] {context}")
-
-            if relevant_sections:
-                # Remove duplicates and limit results
-                unique_sections = []
-                seen = set()
-                for section in relevant_sections:
-                    if section not in seen:
-                        unique_sections.append(section)
-                        seen.add(section)
-                        if len(unique_sections) >= 10:  # Limit to 10 sections
-                            break
-
-                text = "\n\n".join(unique_sections)
-
         # Format the output nicely
         filename = os.path.basename(pdf_path)
         formatted_output = f"Financial Report Summary (from {filename}):\n\n"
         formatted_output += text
 
-        # Apply token limit (max 1500 tokens for this tool)
-        return truncate_to_token_limit(formatted_output, max_tokens=1500)
+        # Apply token limit
+        return truncate_to_token_limit(formatted_output)
 
     except Exception as e:
         return f"Error reading financial report: {str(e)}\n\nMake sure to place your PDF file in the '{data_folder}' folder."
 
 
 # Token management
-def count_tokens(text: str, model: str = "gpt-4") -> int:
-    """Count tokens in text for a given model"""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(str(text)))
-    except:
-        # Fallback: rough estimate (1 token ≈ 4 characters)
-        return len(str(text)) // 4
-
+def truncate_to_token_limit(data, max_tokens: int = TOOL_OUTPUT_MAX_TOKENS) -> str:
+    """Truncate data to stay within token limits, on a record or line edge.
 
-def truncate_to_token_limit(data, max_tokens: int = 2000, model: str = "gpt-4") -> str:
-    """Truncate data to stay within token limits"""
+    This is only the tool's own ceiling: tool_node fits each turn's outputs
+    into what is left of the context budget.
+    """
     text = json.dumps(data, indent=2) if isinstance(data, (dict, list)) else str(data)
+    return truncate_text(text, max_tokens)
+
+
+def format_query_results(query_description, results, query, params) -> str:
+    """Format Neo4j result rows as numbered lines followed by the query that ran."""
+    formatted_output = f"Results for: '{query_description}'\n\n"
 
-    current_tokens = count_tokens(text, model)
+    for i, result in enumerate(results, 1):
+        formatted_output += f"{i}. "
 
-    if current_tokens <= max_tokens:
-        return text
+        # Format the result dynamically based on what keys are present
+        result_parts = []
+        for key, value in result.items():
+            if value is not None:
+                if isinstance(value, list):
+                    if len(value) > 5:
+                        value = value[:5] + ["..."]
+                    value = ", ".join(str(v) for v in value)
+                result_parts.append(f"{key}: {value}")
 
-    # If it's too long, truncate and add summary
-    truncated_length = int(
-        len(text) * (max_tokens / current_tokens) * 0.8
-    )  # 80% safety margin
-    truncated_text = text[:truncated_length]
+        formatted_output += " | ".join(result_parts) + "\n"
 
-    return f"{truncated_text}...\n\n[TRUNCATED - Original response was {current_tokens} tokens, truncated to ~{max_tokens} tokens]"
+    formatted_output += f"\nGenerated Query: {query}\n"
+    if params:
+        formatted_output += f"Parameters: {json.dumps(params)}\n"
+    formatted_output += f"Total results: {len(results)}"
+    return formatted_output
 
 
-def post_process_query(cypher_query: str, original_question: str) -> str:
-    """Post-process the generated Cypher query to fix common issues."""
+def post_process_query(cypher_query: str, original_question: str, params: dict = None):
+    """Post-process the generated Cypher query to fix common issues.
+
+    Returns a ``(query, params)`` tuple. Any string literals the LLM wrote into
+    the query are lifted into parameters, and a missing drug filter is added as
+    ``$drug_name``/``$drug_term`` rather than spliced into the text.
+    """
 
     # Fix deprecated relationship syntax
     cypher_query = cypher_query.replace("|:", "|")
 
+    cypher_query, params = parameterize_literals(cypher_query, params or {})
+
     # Enhanced drug detection - check for drug names anywhere in the question
     question_lower = original_question.lower()
-    drug_mentioned = None
-
-    # More comprehensive drug list and detection
-    drugs_to_check = [
-        "TRAMADOL",
-        "ASPIRIN",
-        "IBUPROFEN",
-        "METFORMIN",
-        "REVLIMID",
-        "CUVITRU",
-    ]
-
-    for drug in drugs_to_check:
-        if drug.lower() in question_lower:
-            drug_mentioned = drug
-            break
+    drug_mentioned = find_drug(original_question)
 
     # Also check for common drug-related keywords that suggest a specific drug query
     drug_keywords = [
@@ -555,13 +580,12 @@ def post_process_query(cypher_query: str, original_question: str) -> str:
         and has_drug_context
     ):
         # Check if drug filter is missing
-        has_filter = (
-            f"{{name: '{drug_mentioned}'}}" in cypher_query
-            or f"{{name:'{drug_mentioned}'}}" in cypher_query
-            or (
-                f"WHERE" in cypher_query
-                and drug_mentioned.lower() in cypher_query.lower()
-            )
+        has_filter = "WHERE" in cypher_query or "{name:" in cypher_query.replace(
+            " ", ""
+        )
+        has_filter = has_filter and any(
+            isinstance(value, str) and drug_mentioned.lower() in value.lower()
+            for value in params.values()
         )
 
         if not has_filter:
@@ -569,17 +593,23 @@ def post_process_query(cypher_query: str, original_question: str) -> str:
             if "(d:Drug)" in cypher_query:
                 cypher_query = cypher_query.replace(
                     "(d:Drug)",
-                    f"(d:Drug {{name: '{drug_mentioned}'}})",
+                    "(d:Drug {name: $drug_name})",
                     1,  # Only replace first occurrence
                 )
+                params["drug_name"] = drug_mentioned
 
             # Strategy 2: Add WHERE clause systematically
             elif "WHERE" not in cypher_query:
+                drug_filter = "WHERE toLower(d.name) CONTAINS $drug_term"
+
                 # For single-line queries, add WHERE before RETURN
                 if "\n" not in cypher_query and "RETURN" in cypher_query:
                     parts = cypher_query.split("RETURN")
                     if len(parts) == 2:
-                        cypher_query = f"{parts[0].strip()} WHERE toLower(d.name) CONTAINS '{drug_mentioned.lower()}' RETURN{parts[1]}"
+                        cypher_query = (
+                            f"{parts[0].strip()} {drug_filter} RETURN{parts[1]}"
+                        )
+                        params["drug_term"] = drug_mentioned.lower()
 
                 # For multi-line queries
                 else:
@@ -595,9 +625,7 @@ def post_process_query(cypher_query: str, original_question: str) -> str:
                             and line.strip().startswith("MATCH")
                             and "d:Drug" in line
                         ):
-                            new_lines.append(
-                                f"WHERE toLower(d.name) CONTAINS '{drug_mentioned.lower()}'"
-                            )
+                            new_lines.append(drug_filter)
                             inserted_where = True
 
                     # If we couldn't insert after MATCH, try before RETURN
@@ -605,16 +633,16 @@ def post_process_query(cypher_query: str, original_question: str) -> str:
                         final_lines = []
                         for line in new_lines:
                             if line.strip().startswith("RETURN") and not inserted_where:
-                                final_lines.append(
-                                    f"WHERE toLower(d.name) CONTAINS '{drug_mentioned.lower()}'"
-                                )
+                                final_lines.append(drug_filter)
                                 inserted_where = True
                             final_lines.append(line)
                         new_lines = final_lines
 
                     cypher_query = "\n".join(new_lines)
+                    if inserted_where:
+                        params["drug_term"] = drug_mentioned.lower()
 
-    return cypher_query
+    return cypher_query, params
 
 
 # Simple Neo4j test tool
@@ -622,34 +650,29 @@ def post_process_query(cypher_query: str, original_question: str) -> str:
 def test_neo4j_schema():
     """Test what's actually in the Neo4j database"""
     try:
-        with GraphDatabase.driver(URI, auth=AUTH) as driver:
-            driver.verify_connectivity()
-
-            with driver.session(database=DB) as session:
-                # Get basic database info
-                result = "Neo4j Database Schema Analysis:\n\n"
-
-                # Node labels
-                labels = session.run("CALL db.labels()").data()
-                result += f"Node Labels: {[r['label'] for r in labels]}\n\n"
-
-                # Relationship types
-                rels = session.run("CALL db.relationshipTypes()").data()
-                result += (
-                    f"Relationship Types: {[r['relationshipType'] for r in rels]}\n\n"
-                )
-
-                # Sample nodes for each label
-                for label_record in labels[:5]:  # Check first 5 labels
-                    label = label_record["label"]
-                    sample = session.run(f"MATCH (n:{label}) RETURN n LIMIT 3").data()
-                    result += f"Sample {label} nodes:\n"
-                    for i, node in enumerate(sample, 1):
-                        props = dict(node["n"])
-                        result += f"  {i}. {props}\n"
-                    result += "\n"
-
-                return result
+        with get_session() as session:
+            # Get basic database info
+            result = "Neo4j Database Schema Analysis:\n\n"
+
+            # Node labels
+            labels = session.run("CALL db.labels()").data()
+            result += f"Node Labels: {[r['label'] for r in labels]}\n\n"
+
+            # Relationship types
+            rels = session.run("CALL db.relationshipTypes()").data()
+            result += f"Relationship Types: {[r['relationshipType'] for r in rels]}\n\n"
+
+            # Sample nodes for each label
+            for label_record in labels[:5]:  # Check first 5 labels
+                label = label_record["label"]
+                sample = session.run(f"MATCH (n:{label}) RETURN n LIMIT 3").data()
+                result += f"Sample {label} nodes:\n"
+                for i, node in enumerate(sample, 1):
+                    props = dict(node["n"])
+                    result += f"  {i}. {props}\n"
+                result += "\n"
+
+            return result
 
     except Exception as e:
         return f"Error: {str(e)}"
@@ -0,0 +1,309 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Spans time the hot path of a turn (graph nodes, tools, Cypher stages,
+# openFDA requests, PDF search). With TRACING=0 every span is a shared
+# no-op object, so instrumented code pays one attribute check.
+ENABLED = os.getenv("TRACING", "1").lower() not in ("0", "false", "no")
+# Finished turns are appended here as JSON lines ("" = no file), rotated
+# at TRACE_MAX_BYTES with TRACE_BACKUPS old files kept
+TRACE_PATH = os.getenv("TRACE_PATH", os.path.join("cache", "traces.jsonl"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(5 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+# Prometheus text metrics on http://<host>:<port>/metrics; off unless a
+# port is set. Only local scrapers can reach the default host.
+METRICS_PORT = int(os.getenv("TRACING_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("TRACING_METRICS_HOST", "127.0.0.1")
+
+# Histogram buckets for span durations, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+
+
+class Metrics:
+    """Per-span-name duration histograms and error counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}  # name -> [bucket counts..., count, sum, errors]
+
+    def observe(self, name: str, seconds: float, error: bool):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = [0] * (len(BUCKETS) + 3)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats[i] += 1
+            stats[-3] += 1
+            stats[-2] += seconds
+            if error:
+                stats[-1] += 1
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            spans = {name: list(stats) for name, stats in self._spans.items()}
+        lines = [
+            "# HELP agent_span_duration_seconds Duration of traced agent operations.",
+            "# TYPE agent_span_duration_seconds histogram",
+        ]
+        for name, stats in sorted(spans.items()):
+            for bound, count in zip(BUCKETS, stats):
+                lines.append(
+                    f'agent_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}'
+                )
+            lines.append(
+                f'agent_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {stats[-3]}'
+            )
+            lines.append(
+                f'agent_span_duration_seconds_sum{{span="{name}"}} {stats[-2]}'
+            )
+            lines.append(
+                f'agent_span_duration_seconds_count{{span="{name}"}} {stats[-3]}'
+            )
+        lines += [
+            "# HELP agent_span_errors_total Traced agent operations that raised.",
+            "# TYPE agent_span_errors_total counter",
+        ]
+        for name, stats in sorted(spans.items()):
+            lines.append(f'agent_span_errors_total{{span="{name}"}} {stats[-1]}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class Span:
+    """One timed operation. ``set()`` attaches sizes (rows, chars, tokens...)."""
+
+    __slots__ = ("name", "attrs", "parent", "started", "duration", "error", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.error = None
+        self.duration = None
+
+    def set(self, key: str, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent = parent.name if parent else None
+        self._token = _current_span.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        METRICS.observe(self.name, self.duration, self.error is not None)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self)
+        return False
+
+
+class _NullSpan:
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attrs):
+    """Context manager timing the block as ``name``; a no-op when disabled."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def current_span():
+    """The innermost open span (a no-op span outside any), to ``set()`` sizes on."""
+    return (_current_span.get() if ENABLED else None) or _NULL_SPAN
+
+
+def traced(name: str):
+    """Decorator: run every call of the function (sync or async) in a span."""
+
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class Trace:
+    """The spans of one turn, collected from every thread and task it uses."""
+
+    def __init__(self, thread_id: str = None):
+        self.id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, finished: Span):
+        record = {
+            "name": finished.name,
+            "parent": finished.parent,
+            "ms": round(finished.duration * 1000, 3),
+        }
+        if finished.attrs:
+            record["attrs"] = finished.attrs
+        if finished.error:
+            record["error"] = finished.error
+        with self._lock:
+            self.spans.append(record)
+
+    def breakdown(self) -> list:
+        """``[(name, calls, total ms, summed numeric attrs), ...]``, slowest first."""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            name, calls, ms, attrs = totals.get(
+                record["name"], (record["name"], 0, 0.0, {})
+            )
+            for key, value in record.get("attrs", {}).items():
+                if isinstance(value, (int, float)):
+                    attrs[key] = attrs.get(key, 0) + value
+            totals[record["name"]] = (name, calls + 1, ms + record["ms"], attrs)
+        return sorted(totals.values(), key=lambda row: -row[2])
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.id,
+            "thread_id": self.thread_id,
+            "started_at": self.started_at,
+            "ms": round((self.duration or 0) * 1000, 3),
+            "spans": spans,
+        }
+
+
+@contextmanager
+def trace_turn(thread_id: str = None):
+    """Collect the spans of one turn into a ``Trace`` (None when disabled).
+
+    On exit the trace is appended to the JSONL trace file.
+    """
+    if not ENABLED:
+        yield None
+        return
+    trace = Trace(thread_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.duration = time.time() - trace.started_at
+        _current_trace.reset(token)
+        _write(trace)
+
+
+_trace_logger = None
+_setup_lock = threading.Lock()
+
+
+def _write(trace: Trace):
+    global _trace_logger
+    if not TRACE_PATH:
+        return
+    if _trace_logger is None:
+        with _setup_lock:
+            if _trace_logger is None:
+                if os.path.dirname(TRACE_PATH):
+                    os.makedirs(os.path.dirname(TRACE_PATH), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    TRACE_PATH,
+                    maxBytes=TRACE_MAX_BYTES,
+                    backupCount=TRACE_BACKUPS,
+                    encoding="utf-8",
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger = logging.getLogger("agent.traces")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                logger.addHandler(handler)
+                _trace_logger = logger
+    _trace_logger.info(json.dumps(trace.to_dict(), default=str))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+_metrics_started = False
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serve ``/metrics`` on a background thread, once per process.
+
+    Returns the server, or None when disabled or the port is taken (e.g.
+    by another app process); tracing works the same either way.
+    """
+    global _metrics_server, _metrics_started
+    if not ENABLED or not port:
+        return None
+    with _setup_lock:
+        if not _metrics_started:
+            _metrics_started = True
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+                threading.Thread(
+                    target=_metrics_server.serve_forever, name="metrics", daemon=True
+                ).start()
+            except OSError:
+                _metrics_server = None
+    return _metrics_server
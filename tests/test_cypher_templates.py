@@ -0,0 +1,66 @@
+from cypher_templates import DRUG_REACTIONS, lucene_query, use_fulltext_index
+
+
+def seeded(query, params):
+    run_query, run_params = use_fulltext_index(query, params)
+    return run_query != query, run_params
+
+
+def test_lucene_query_matches_infixes():
+    assert lucene_query("Codone") == "*codone*"
+    assert lucene_query("tramadol hcl") is None
+    assert lucene_query("co-codamol") is None
+
+
+def test_template_is_seeded():
+    was_seeded, params = seeded(DRUG_REACTIONS, {"drug_term": "tramadol"})
+    assert was_seeded
+    assert params["fulltext_query"] == "*tramadol*"
+
+
+def test_and_conjunct_is_seeded():
+    query = (
+        "MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT]-(c:Case) "
+        "WHERE c.age > $p1 AND toLower(d.name) CONTAINS $p0 RETURN count(c)"
+    )
+    assert seeded(query, {"p0": "tramadol", "p1": 65})[0]
+
+
+def test_negated_contains_is_not_seeded():
+    query = (
+        "MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT]-(c:Case) "
+        "WHERE NOT toLower(d.name) CONTAINS $p0 RETURN d.name, count(c)"
+    )
+    assert not seeded(query, {"p0": "tramadol"})[0]
+
+
+def test_contains_inside_or_is_not_seeded():
+    query = (
+        "MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT]-(c:Case) "
+        "WHERE toLower(d.name) CONTAINS $p0 OR toLower(d.name) CONTAINS $p1 "
+        "RETURN d.name, count(c)"
+    )
+    assert not seeded(query, {"p0": "tramadol", "p1": "aspirin"})[0]
+    parenthesized = (
+        "MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT]-(c:Case) "
+        "WHERE c.age > 65 AND (toLower(d.name) CONTAINS $p0 "
+        "OR toLower(d.name) CONTAINS $p1) RETURN d.name, count(c)"
+    )
+    assert not seeded(parenthesized, {"p0": "tramadol", "p1": "aspirin"})[0]
+
+
+def test_other_conditions_on_the_drug_are_not_seeded():
+    query = (
+        "MATCH (d:Drug)<-[:IS_PRIMARY_SUSPECT]-(c:Case) "
+        "WHERE toLower(d.name) CONTAINS $p0 AND d.name <> $p1 RETURN count(c)"
+    )
+    assert not seeded(query, {"p0": "tramadol", "p1": "TRAMADOL"})[0]
+
+
+def test_contains_outside_the_first_match_is_not_seeded():
+    query = (
+        "MATCH (c:Case)-[:HAS_REACTION]->(r:Reaction) WITH c "
+        "MATCH (c)-[:IS_PRIMARY_SUSPECT]->(d:Drug) "
+        "WHERE toLower(d.name) CONTAINS $p0 RETURN count(c)"
+    )
+    assert not seeded(query, {"p0": "tramadol"})[0]
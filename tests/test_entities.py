@@ -0,0 +1,15 @@
+from entities import normalize_question
+
+
+def test_spelling_and_punctuation_are_folded():
+    assert normalize_question("Manufacturers of Tramadol HCl?") == (
+        normalize_question("manufacturers of  TRAMADOL")
+    )
+
+
+def test_comparisons_and_numbers_are_kept():
+    assert normalize_question("cases where age > 65") != (
+        normalize_question("cases where age < 65")
+    )
+    assert normalize_question("Cases where age>=65?") == "cases where age >= 65"
+    assert normalize_question("age over 65") != normalize_question("age over 18")
@@ -0,0 +1,49 @@
+import pytest
+from intent_router import MIN_CONFIDENCE, route_question, template_for
+from neo4j_aggregates import route_to_summary
+
+WRONG_IF_ROUTED = [
+    "most common adverse reactions for TRAMADOL and ASPIRIN",
+    "Most common reactions to tramadol excluding nausea",
+    "Top reactions to TRAMADOL other than headache",
+    "Top reactions to tramadol besides headache",
+    "Most common reactions to tramadol apart from nausea",
+    "Which drugs are most commonly primary suspects in cases involving TRAMADOL?",
+]
+
+
+class FakeSession:
+    def run(self, query, params=None):
+        return self
+
+    def single(self):
+        return {"refreshed_at": "2026-01-01T00:00:00Z"}
+
+
+@pytest.mark.parametrize("question", WRONG_IF_ROUTED)
+def test_questions_the_templates_cannot_answer_go_to_the_llm(question):
+    assert route_question(question)[2] < MIN_CONFIDENCE
+    assert template_for(question) is None
+    assert route_to_summary(FakeSession(), question) is None
+
+
+@pytest.mark.parametrize(
+    "question, intent, params",
+    [
+        (
+            "What are the most common reactions to Tramadol HCl?",
+            "drug_reactions",
+            {"drug_term": "tramadol"},
+        ),
+        (
+            "Which manufacturers make tramadol?",
+            "drug_manufacturers",
+            {"drug_name": "TRAMADOL"},
+        ),
+        ("Which drugs are most often primary suspects?", "top_primary_suspects", {}),
+    ],
+)
+def test_plain_questions_are_routed(question, intent, params):
+    assert template_for(question)[0::2] == (intent, params)
+    routed = route_to_summary(FakeSession(), question)
+    assert routed[0] == intent and routed[2] == params
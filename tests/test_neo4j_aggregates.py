@@ -0,0 +1,90 @@
+import neo4j_aggregates
+
+
+class Result(list):
+    def consume(self):
+        pass
+
+
+class FakeTransaction:
+    """Answers _fold_cases' queries from ``graph``: case id -> contributions."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.folded = {}  # caseId -> AggregateCase.contributions
+        self.counts = {}
+
+    def run(self, query, params):
+        if "RETURN id, a.contributions" in query:
+            return Result(
+                {"id": case_id, "contributions": self.folded[case_id]}
+                for case_id in params["ids"]
+                if case_id in self.folded
+            )
+        if query.startswith("UNWIND $changes"):
+            for row in params["changes"]:
+                key = (row["kind"], row["drug"], row["key"])
+                self.counts[key] = self.counts.get(key, 0) + row["n"]
+            return Result()
+        if query.startswith("UNWIND $cases"):
+            for row in params["cases"]:
+                self.folded[row["id"]] = row["contributions"]
+            return Result()
+        if "AggregateState" in query:
+            return Result()
+        kind = next(
+            kind
+            for kind, kind_query in neo4j_aggregates.CONTRIBUTION_QUERIES.items()
+            if kind_query == query
+        )
+        return Result(
+            {"id": case_id, "drug": drug, "key": key}
+            for case_id in params["ids"]
+            for row_kind, drug, key in self.graph.get(case_id, [])
+            if row_kind == kind
+        )
+
+
+def counts(tx):
+    return {key: n for key, n in tx.counts.items() if n}
+
+
+def test_changed_case_is_refolded_exactly():
+    tx = FakeTransaction(
+        {
+            "c1": [
+                ("primary_suspect", "TRAMADOL", ""),
+                ("reaction", "TRAMADOL", "NAUSEA"),
+                ("reaction_total", "", "NAUSEA"),
+            ]
+        }
+    )
+    neo4j_aggregates._fold_cases(tx, ["c1"], {}, new_cases=1)
+
+    # A reaction is added to the case and another drug replaces TRAMADOL
+    tx.graph["c1"] = [
+        ("primary_suspect", "ASPIRIN", ""),
+        ("reaction", "ASPIRIN", "NAUSEA"),
+        ("reaction", "ASPIRIN", "HEADACHE"),
+        ("reaction_total", "", "NAUSEA"),
+        ("reaction_total", "", "HEADACHE"),
+    ]
+    neo4j_aggregates._fold_cases(tx, ["c1"], {})
+    expected = {
+        ("primary_suspect", "ASPIRIN", ""): 1,
+        ("reaction", "ASPIRIN", "NAUSEA"): 1,
+        ("reaction", "ASPIRIN", "HEADACHE"): 1,
+        ("reaction_total", "", "NAUSEA"): 1,
+        ("reaction_total", "", "HEADACHE"): 1,
+    }
+    assert counts(tx) == expected
+
+    # Folding an unchanged case again changes nothing
+    neo4j_aggregates._fold_cases(tx, ["c1"], {})
+    assert counts(tx) == expected
+
+
+def test_summaries_stay_out_of_the_domain_graph():
+    domain = ("Case", "Drug", "Reaction", "Manufacturer", "AgeGroup", "Outcome")
+    for query in neo4j_aggregates.SUMMARY_QUERIES.values():
+        assert not any(f":{label}" in query for label in domain)
@@ -0,0 +1,26 @@
+from token_ledger import TokenLedger
+
+
+def test_least_recently_active_sessions_are_dropped():
+    ledger = TokenLedger(session_ttl=0, max_sessions=2)
+    for session in ["a", "b", "a", "c"]:
+        ledger.record_llm(10, 5, "agent", session)
+
+    assert ledger.totals("b")["prompt"] == 0
+    assert ledger.totals("a")["prompt"] == 20
+    assert ledger.totals("c")["prompt"] == 10
+    # Dropped sessions still count in the all-sessions totals
+    assert ledger.totals()["prompt"] == 40
+
+
+def test_idle_sessions_are_dropped(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("token_ledger.time.monotonic", lambda: clock[0])
+    ledger = TokenLedger(session_ttl=60, max_sessions=100)
+    ledger.record_llm(10, 5, "agent", "idle")
+    clock[0] += 61
+    ledger.record_llm(10, 5, "agent", "active")
+
+    assert ledger.totals("idle")["prompt"] == 0
+    assert ledger.totals("active")["prompt"] == 10
+    assert ledger.totals()["completion"] == 10